@@ -0,0 +1,441 @@
+"""
+Snapshot of the call graph, in compressed sparse row (CSR) form, to evaluate the caller patterns (three, four and
+five) for every phone number at once, with array operations, rather than a query per representative.
+
+Calls are grouped by the number they were made to: the calls to the number at position i are the edges
+`indptr[i]:indptr[i + 1]`, with the caller's number in `indices`, and the call's weekday, hour and timestamp in arrays
+aligned with it. A second CSR index maps numbers to the people they're registered to. The flights and employment of
+people are kept as edge arrays, so the later steps of the patterns are joins on person.
+
+Snapshots are exported from the database with a handful of statements, and can be saved to, and opened from, .npz files.
+They record the database, and the generation of its dataset (see `forensics.utils.cache`), they were exported from, and
+are only opened while it's still the one in the database
+"""
+
+import os.path
+
+import numpy as np
+
+from forensics.utils import cache, config, neo4j, results
+
+# where main.py saves snapshots to, and opens them from
+SNAPSHOT = os.path.join(config.PROJECT_BASE, 'data', 'callgraph.npz')
+
+CALLS = neo4j.statement('callgraph.calls', [
+    'MATCH (source :`PhoneNumber`)-[call :CONTACTED]->(target :`PhoneNumber`)',
+    'RETURN source.number AS source, target.number AS target, call.weekday AS weekday, call.hour AS hour, '
+    'call.timestamp AS timestamp'
+])
+
+OWNERS = neo4j.statement('callgraph.owners', [
+    'MATCH (number :`PhoneNumber`)-[:REGISTERED_TO]->(person :`Person`)',
+    'RETURN number.number AS number, person.id AS id, person.name AS name'
+])
+
+FLIGHTS = neo4j.statement('callgraph.flights', [
+    'MATCH (person :`Person`)-[:TOOK]->(flight :`Flight`)-[:TO]-(:`City`)-[:IN]->(country :`Country`)',
+    'RETURN person.id AS id, flight.timestamp AS timestamp, country.name AS country'
+])
+
+EMPLOYMENT = neo4j.statement('callgraph.employment', [
+    'MATCH (person :`Person`)-[employment :EMPLOYEE_AT]->(company :`Company`)',
+    'RETURN person.id AS id, company.name AS company, employment.since AS since, employment.until AS until'
+])
+
+# types of the exported columns
+TYPES = {
+    'source': str,
+    'target': str,
+    'weekday': np.int8,
+    'hour': np.int8,
+    'timestamp': np.float64,
+    'number': str,
+    'id': str,
+    'name': str,
+    'country': str,
+    'company': str,
+    'since': np.float64,
+    'until': np.float64
+}
+
+# arrays of a snapshot
+ARRAYS = [
+    'numbers', 'indptr', 'indices', 'weekday', 'hour', 'timestamp',
+    'owners_indptr', 'owners', 'ids', 'names',
+    'flights_person', 'flights_timestamp', 'flights_country', 'countries',
+    'employment_person', 'employment_company', 'employment_since', 'employment_until', 'companies'
+]
+
+
+def _codes(values, dictionary):
+    """
+    :param values: array of values
+    :param dictionary: sorted array of distinct values
+    :return: array of the position of each value in the dictionary
+    """
+
+    return np.searchsorted(dictionary, values).astype(np.int64)
+
+
+def _lookup(value, dictionary):
+    """
+    :return: position of the value in the sorted dictionary, or -1
+    """
+
+    i = int(np.searchsorted(dictionary, value))
+
+    return i if i < len(dictionary) and dictionary[i] == value else -1
+
+
+def _index(rows, n):
+    """
+    :param rows: array of the row of each entry
+    :param n: number of rows
+    :return: CSR row pointers, and the order that sorts the entries by row
+    """
+
+    order = np.argsort(rows, kind='stable')
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+
+    return indptr, order
+
+
+def _expand(indptr, rows):
+    """
+    :param indptr: CSR row pointers
+    :param rows: array of rows
+    :return: positions of the entries of the rows, in order, and the position in `rows` of the row of each
+    """
+
+    starts = indptr[rows]
+    counts = indptr[rows + 1] - starts
+    ends = np.cumsum(counts)
+
+    origin = np.repeat(np.arange(len(rows)), counts)
+    positions = np.arange(ends[-1] if len(ends) else 0) - np.repeat(ends - counts - starts, counts)
+
+    return positions, origin
+
+
+class Matrix(object):
+    """
+    Sparse matrix, in CSR form: the columns of the values of row i are `indices[indptr[i]:indptr[i + 1]]`, and the
+    values are `data[indptr[i]:indptr[i + 1]]`
+    """
+
+    def __init__(self, indptr, indices, data, shape):
+
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.shape = shape
+
+    def __len__(self):
+        return len(self.data)
+
+    @classmethod
+    def from_entries(cls, rows, columns, values, shape):
+        """
+        :param rows: array of the row of each entry
+        :param columns: array of the column of each entry
+        :param values: array of the value of each entry. The values of the same row and column are summed
+        :param shape: number of rows, and of columns
+        :return: Matrix
+        """
+
+        width = max(shape[1], 1)
+
+        keys, inverse = np.unique(rows*width + columns, return_inverse=True)
+        data = np.bincount(inverse.reshape(-1), weights=values, minlength=len(keys)).astype(values.dtype)
+
+        indptr, _ = _index(keys // width, shape[0])
+
+        return cls(indptr, keys % width, data, shape)
+
+    def row(self, i):
+        """
+        :return: arrays of the columns, and of the values, of the row
+        """
+
+        return self.indices[self.indptr[i]:self.indptr[i + 1]], self.data[self.indptr[i]:self.indptr[i + 1]]
+
+    def rows(self):
+        """
+        :return: array of the row of each value
+        """
+
+        return np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+
+
+class CallGraph(object):
+    """
+    CSR snapshot of the call graph, with the people, flights and employment the caller patterns join it with
+    """
+
+    def __init__(self, arrays, database=None, generation=None):
+        """
+        :param arrays: dict of the snapshot's arrays, named as in `ARRAYS`
+        :param database: URI of the database the snapshot was exported from
+        :param generation: generation of the database's dataset, when the snapshot was exported
+        """
+
+        self.arrays = arrays
+        self.database = database
+        self.generation = generation
+
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+
+    def __len__(self):
+        return len(self.indices)
+
+    @classmethod
+    def build(cls, calls, owners, flights, employment):
+        """
+        :param calls: Columns of the calls: source, target, weekday, hour and timestamp
+        :param owners: Columns of the people each number is registered to: number, id and name
+        :param flights: Columns of the destination countries of each person's flights: id, timestamp and country
+        :param employment: Columns of the employment of each person: id, company, since and until
+        :return: CallGraph
+        """
+
+        numbers = np.unique(np.concatenate([calls['source'], calls['target'], owners['number']]).astype(str))
+        ids = np.unique(np.concatenate([owners['id'], flights['id'], employment['id']]).astype(str))
+        countries = np.unique(flights['country'].astype(str))
+        companies = np.unique(employment['company'].astype(str))
+
+        targets = _codes(calls['target'], numbers)
+        indptr, order = _index(targets, len(numbers))
+
+        people = _codes(owners['id'], ids)
+        owners_indptr, owners_order = _index(_codes(owners['number'], numbers), len(numbers))
+
+        names = np.zeros(len(ids), dtype=owners['name'].astype(str).dtype)
+        names[people] = owners['name']
+
+        return cls({
+            'numbers': numbers,
+            'indptr': indptr,
+            'indices': _codes(calls['source'], numbers)[order],
+            'weekday': calls['weekday'][order],
+            'hour': calls['hour'][order],
+            'timestamp': calls['timestamp'][order],
+            'owners_indptr': owners_indptr,
+            'owners': people[owners_order],
+            'ids': ids,
+            'names': names,
+            'flights_person': _codes(flights['id'], ids),
+            'flights_timestamp': flights['timestamp'],
+            'flights_country': _codes(flights['country'], countries),
+            'countries': countries,
+            'employment_person': _codes(employment['id'], ids),
+            'employment_company': _codes(employment['company'], companies),
+            'employment_since': employment['since'],
+            'employment_until': employment['until'],
+            'companies': companies
+        })
+
+    @classmethod
+    def export(cls, fetch_size=None):
+        """
+        Exports a snapshot of the graph in the database
+        :param fetch_size: number of records read at a time
+        :return: CallGraph
+        """
+
+        columns = []
+        generation = cache.generation()
+
+        with neo4j.Transaction() as tx:
+            for statement in [CALLS, OWNERS, FLIGHTS, EMPLOYMENT]:
+                columns.append(tx.stream(neo4j.Query(statement), fetch_size=fetch_size, types=TYPES).fetch_columns())
+
+        graph = cls.build(*columns)
+        graph.database = cache.database()
+        graph.generation = generation
+
+        return graph
+
+    @classmethod
+    def open(cls, path, check=True):
+        """
+        :param path: .npz file
+        :param check: refuse a snapshot of another database, or of an earlier dataset than the database's
+        :return: CallGraph
+        """
+
+        with np.load(path) as arrays:
+
+            database = str(arrays['database']) if 'database' in arrays.files else None
+            generation = str(arrays['generation']) if 'generation' in arrays.files else None
+
+            graph = cls(dict((name, arrays[name]) for name in ARRAYS), database, generation)
+
+        current = cache.generation()
+
+        if check and (current is None or (database, generation) != (cache.database(), current)):
+            raise ValueError(
+                'The call graph snapshot in {0} is of {1}, generation {2}, and the database is {3}, generation {4}. '
+                'Export a new one'.format(path, database, generation, cache.database(), current)
+            )
+
+        return graph
+
+    def save(self, path):
+        np.savez(path, database=str(self.database), generation=str(self.generation), **self.arrays)
+
+    def code(self, number):
+        """
+        :return: position of the phone number in the snapshot, or -1
+        """
+
+        return _lookup(number, self.numbers)
+
+    def callers(self, weekday=None, hours=None, start=None, end=None):
+        """
+        Number of calls made to each phone number, by each person
+        :param weekday: weekday of the calls, Monday is 0. Any day, if not given
+        :param hours: first and last hour of the calls, e.g. (18, 22). Any hour, if not given
+        :param start: unix timestamp the calls were made at, or after
+        :param end: unix timestamp the calls were made before
+        :return: Matrix of calls, with a row per number called, and a column per caller
+        """
+
+        mask = np.ones(len(self.indices), dtype=bool)
+
+        if weekday is not None:
+            mask &= self.weekday == weekday
+
+        if hours is not None:
+            mask &= (self.hour >= hours[0]) & (self.hour <= hours[1])
+
+        if start is not None:
+            mask &= self.timestamp >= start
+
+        if end is not None:
+            mask &= self.timestamp < end
+
+        targets = np.repeat(np.arange(len(self.numbers)), np.diff(self.indptr))[mask]
+
+        # a call is made by every person the calling number is registered to
+        positions, origin = _expand(self.owners_indptr, self.indices[mask])
+
+        return Matrix.from_entries(
+            targets[origin], self.owners[positions], np.ones(len(origin), dtype=np.int64),
+            (len(self.numbers), len(self.ids))
+        )
+
+    def flights(self, countries=None, start=None, end=None):
+        """
+        Number of flights of each person, to each country
+        :param countries: names of the destination countries. Any country, if not given
+        :param start: unix timestamp of the earliest departure
+        :param end: unix timestamp the flights departed before
+        :return: Matrix of flights, with a row per person, and a column per country
+        """
+
+        mask = np.ones(len(self.flights_person), dtype=bool)
+
+        if countries is not None:
+            mask &= np.isin(self.flights_country, [self._country(name) for name in countries])
+
+        if start is not None:
+            mask &= self.flights_timestamp >= start
+
+        if end is not None:
+            mask &= self.flights_timestamp < end
+
+        return Matrix.from_entries(
+            self.flights_person[mask], self.flights_country[mask], np.ones(int(mask.sum()), dtype=np.int64),
+            (len(self.ids), len(self.countries))
+        )
+
+    def _country(self, name):
+        return _lookup(name, self.countries)
+
+
+def three(graph, weekday, hours=None):
+    """
+    Pattern three, for every number: the people that called it on the weekday, by name, and their number of calls
+    :return: Columns: representative, subjectName and numberOfCalls
+    """
+
+    calls = graph.callers(weekday=weekday, hours=hours)
+
+    # calls are counted by the callers' names, as the statement does
+    names, codes = np.unique(graph.names, return_inverse=True)
+    counts = Matrix.from_entries(
+        calls.rows(), codes.reshape(-1)[calls.indices], calls.data, (calls.shape[0], len(names))
+    )
+
+    return results.Columns(['representative', 'subjectName', 'numberOfCalls'], {
+        'representative': graph.numbers[counts.rows()],
+        'subjectName': names[counts.indices],
+        'numberOfCalls': counts.data
+    })
+
+
+def _caller_flights(graph, weekday, countries, start, end):
+    """
+    :return: arrays of the number called, the caller, and the position in the flights Matrix of each of the caller's
+    flight counts, and the flights Matrix
+    """
+
+    calls = graph.callers(weekday=weekday)
+    flights = graph.flights(countries=countries, start=start, end=end)
+
+    positions, origin = _expand(flights.indptr, calls.indices)
+
+    return calls.rows()[origin], calls.indices[origin], positions, flights
+
+
+def four(graph, weekday, countries, start, end):
+    """
+    Pattern four, for every number: the people that called it on the weekday, and their number of flights to each of
+    the countries, between `start` and `end`
+    :return: Columns: representative, subjectName, ID, flights and country
+    """
+
+    numbers, people, positions, flights = _caller_flights(graph, weekday, countries, start, end)
+
+    return results.Columns(['representative', 'subjectName', 'ID', 'flights', 'country'], {
+        'representative': graph.numbers[numbers],
+        'subjectName': graph.names[people],
+        'ID': graph.ids[people],
+        'flights': flights.data[positions],
+        'country': graph.countries[flights.indices[positions]]
+    })
+
+
+def five(graph, weekday, countries, start, end, company, period):
+    """
+    Pattern five, for every number: the employment at the company, active before `period`, or after, of the people
+    that called it on the weekday, and flew to one of the countries between `start` and `end`
+    :return: Columns: representative, subjectName, ID, since and until. Times are local times
+    """
+
+    numbers, people, _, _ = _caller_flights(graph, weekday, countries, start, end)
+
+    # a row per number and caller, however many of the countries the caller flew to
+    pairs = np.unique(np.stack([numbers, people], axis=1), axis=0).reshape(-1, 2)
+
+    mask = (graph.employment_company == _lookup(company, graph.companies)) & (
+        (graph.employment_since < period) | (graph.employment_until > period)
+    )
+
+    employment = np.flatnonzero(mask)
+    indptr, order = _index(graph.employment_person[employment], len(graph.ids))
+    employment = employment[order]
+
+    positions, origin = _expand(indptr, pairs[:, 1])
+    people = pairs[origin, 1]
+    employment = employment[positions]
+
+    return results.Columns(['representative', 'subjectName', 'ID', 'since', 'until'], {
+        'representative': graph.numbers[pairs[origin, 0]],
+        'subjectName': graph.names[people],
+        'ID': graph.ids[people],
+        'since': results.local_times(graph.employment_since[employment]),
+        'until': results.local_times(graph.employment_until[employment])
+    })
@@ -0,0 +1,405 @@
+"""
+Binary columnar format for generated datasets.
+
+Each dataset is stored as one file per column. Numeric columns are fixed-width arrays, and text columns are either
+dictionary-encoded, as positions in a dictionary shared between datasets, or stored as offsets into UTF-8 data.
+The reader memory-maps the files, so opening a dataset doesn't read, or parse, any of it
+"""
+
+import collections.abc
+import json
+import os
+import os.path
+
+import numpy as np
+
+from forensics import writer
+from forensics.entities import Dictionary, PersonBatch, CallBatch, FlightBatch, EmploymentBatch, location_key
+
+VERSION = 2
+
+MANIFEST = 'manifest.json'
+
+DATASETS = ['people', 'calls', 'flights', 'employment']
+
+# column name, type, and dictionary of dictionary-encoded columns
+SCHEMA = {
+    'people': [
+        ('id', 'code', 'people'),
+        ('name', 'text', None),
+        ('sex', 'code', 'sexes'),
+        ('number', 'code', 'numbers')
+    ],
+    'calls': [
+        ('id', 'int64', None),
+        ('source', 'code', 'numbers'),
+        ('target', 'code', 'numbers'),
+        ('weekday', 'int8', None),
+        ('hour', 'int8', None),
+        ('timestamp', 'float64', None)
+    ],
+    'flights': [
+        ('person', 'code', 'people'),
+        ('departure', 'code', 'locations'),
+        ('destination', 'code', 'locations'),
+        ('number', 'text', None),
+        ('timestamp', 'float64', None)
+    ],
+    'employment': [
+        ('person', 'code', 'people'),
+        ('company', 'code', 'companies'),
+        ('since', 'float64', None),
+        ('until', 'float64', None)
+    ]
+}
+
+CODE_DTYPE = 'int32'
+
+# dictionaries, and the batch attribute that holds them
+DICTIONARIES = ['people', 'sexes', 'numbers', 'locations', 'companies']
+
+
+def _path(base_dir, *names):
+    return os.path.join(base_dir, '.'.join(names) + '.bin')
+
+
+def _write_strings(base_dir, name, values):
+
+    encoded = [value.encode('utf-8') for value in values]
+
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+
+    with open(_path(base_dir, name, 'offsets'), 'wb') as fp:
+        fp.write(offsets.tobytes())
+
+    with open(_path(base_dir, name, 'data'), 'wb') as fp:
+        fp.write(b''.join(encoded))
+
+
+def _map(path, dtype, size):
+
+    if size == 0:
+        return np.empty(0, dtype=dtype)
+
+    return np.memmap(path, dtype=dtype, mode='r', shape=(size,))
+
+
+class TextColumn(collections.abc.Sequence):
+    """
+    Memory-mapped text column: UTF-8 data, and the offset of each value. Values are decoded when accessed
+    """
+
+    def __init__(self, base_dir, name, size):
+
+        self.offsets = _map(_path(base_dir, name, 'offsets'), np.int64, size + 1)
+        self.data = _map(_path(base_dir, name, 'data'), np.uint8, int(self.offsets[-1]) if size else 0)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+
+        if i < 0:
+            i += len(self)
+
+        return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes().decode('utf-8')
+
+
+class LocationColumn(collections.abc.Sequence):
+    """
+    Locations, as city and country text columns
+    """
+
+    def __init__(self, cities, countries):
+
+        self.cities = cities
+        self.countries = countries
+
+    def __len__(self):
+        return len(self.cities)
+
+    def __getitem__(self, i):
+
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+
+        return {'city': self.cities[i], 'country': self.countries[i]}
+
+
+class ColumnarWriter(object):
+    """
+    Appends batches to a columnar dataset. Dictionary-encoded columns are re-encoded against the dataset's own
+    dictionaries, which are written, along with the manifest, when the writer is closed
+    """
+
+    def __init__(self, base_dir):
+
+        self.base_dir = base_dir
+        self.files = {}
+        self.rows = dict((name, 0) for name in DATASETS)
+        self.dictionaries = dict(
+            (name, Dictionary(key=location_key if name == 'locations' else None)) for name in DICTIONARIES
+        )
+
+        # dictionaries of the batches written so far, and the position of each of their values in ours
+        self._mappings = {}
+
+    def __enter__(self):
+
+        if not os.path.exists(self.base_dir):
+            os.makedirs(self.base_dir)
+
+        for name, columns in SCHEMA.items():
+            for column, type, _ in columns:
+
+                if type == 'text':
+                    self.files[(name, column)] = (
+                        open(_path(self.base_dir, name, column, 'offsets'), 'wb'),
+                        open(_path(self.base_dir, name, column, 'data'), 'wb')
+                    )
+                    self.files[(name, column)][0].write(np.zeros(1, dtype=np.int64).tobytes())
+                else:
+                    self.files[(name, column)] = open(_path(self.base_dir, name, column), 'wb')
+
+        self._text_offsets = collections.defaultdict(int)
+
+        return self
+
+    def __exit__(self, type, value, traceback):
+
+        for fp in self.files.values():
+            if isinstance(fp, tuple):
+                for f in fp:
+                    f.close()
+            else:
+                fp.close()
+
+        if value is None:
+            self._close()
+
+    def _encode(self, dictionary, batch_dictionary, codes):
+        """
+        :return: positions, in our dictionary, of the values at `codes` in the batch's dictionary
+        """
+
+        mapping = self._mappings.get(id(batch_dictionary))
+
+        if mapping is None or mapping[0] is not batch_dictionary:
+            mapping = (batch_dictionary, np.full(len(batch_dictionary), -1, dtype=np.int64))
+            self._mappings[id(batch_dictionary)] = mapping
+
+        _, positions = mapping
+
+        # batch dictionaries can grow between batches
+        if len(positions) < len(batch_dictionary):
+            positions = np.concatenate([positions, np.full(len(batch_dictionary) - len(positions), -1, np.int64)])
+            mapping = (batch_dictionary, positions)
+            self._mappings[id(batch_dictionary)] = mapping
+
+        codes = np.asarray(codes)
+        unknown = np.unique(codes[positions[codes] < 0])
+
+        for code in unknown.tolist():
+            positions[code] = dictionary.intern(batch_dictionary[code])
+
+        return positions[codes]
+
+    def _text(self, name, column, values):
+
+        offsets_fp, data_fp = self.files[(name, column)]
+
+        encoded = [value.encode('utf-8') for value in values]
+
+        offsets = np.cumsum([len(value) for value in encoded], dtype=np.int64) + self._text_offsets[(name, column)]
+
+        if len(offsets):
+            self._text_offsets[(name, column)] = int(offsets[-1])
+
+        offsets_fp.write(offsets.tobytes())
+        data_fp.write(b''.join(encoded))
+
+    def write(self, name, batch):
+        """
+        :param name: dataset: people, calls, flights or employment
+        :param batch: batch of the dataset's records
+        :return:
+        """
+
+        for column, type, dictionary in SCHEMA[name]:
+
+            values = getattr(batch, column)
+
+            if type == 'text':
+                self._text(name, column, values)
+                continue
+
+            if type == 'code':
+
+                if isinstance(values, np.ndarray):
+                    values = self._encode(self.dictionaries[dictionary], getattr(batch, dictionary), values)
+                else:
+                    values = [self.dictionaries[dictionary].intern(value) for value in values]
+
+            self.files[(name, column)].write(np.asarray(values, dtype=CODE_DTYPE if type == 'code' else type).tobytes())
+
+        self.rows[name] += len(batch)
+
+    def _close(self):
+
+        for name, dictionary in self.dictionaries.items():
+
+            if name == 'locations':
+                _write_strings(self.base_dir, 'dictionary.locations.city', [l['city'] for l in dictionary.values])
+                _write_strings(self.base_dir, 'dictionary.locations.country', [l['country'] for l in dictionary.values])
+            else:
+                _write_strings(self.base_dir, 'dictionary.' + name, dictionary.values)
+
+        manifest = {
+            'version': VERSION,
+            'rows': self.rows,
+            'dictionaries': dict((name, len(dictionary)) for name, dictionary in self.dictionaries.items()),
+            'schema': dict(
+                (name, [{'name': c, 'type': t, 'dictionary': d} for c, t, d in columns])
+                for name, columns in SCHEMA.items()
+            )
+        }
+
+        with open(os.path.join(self.base_dir, MANIFEST), 'w') as fp:
+            json.dump(manifest, fp, indent=3)
+
+
+def write_dataset(data, base_dir):
+    """
+    Writes datasets to the columnar format, a batch at a time
+    :param data: dict of iterables of batches, e.g. from `seed.stream_data`
+    :param base_dir: output directory
+    :return: dict with the number of records written, per dataset
+    """
+
+    with ColumnarWriter(base_dir) as columnar:
+
+        for name in DATASETS:
+            for batch in data[name]:
+                columnar.write(name, batch)
+
+    return columnar.rows
+
+
+class ColumnarDataset(object):
+    """
+    Memory-mapped columnar dataset. Columns are mapped when first accessed
+    """
+
+    def __init__(self, base_dir):
+
+        self.base_dir = base_dir
+
+        with open(os.path.join(base_dir, MANIFEST)) as fp:
+            self.manifest = json.load(fp)
+
+        if self.manifest['version'] != VERSION:
+            raise ValueError('Unsupported columnar dataset version: {0}'.format(self.manifest['version']))
+
+        self._columns = {}
+        self._dictionaries = {}
+
+    def __len__(self):
+        return sum(self.manifest['rows'].values())
+
+    def rows(self, name):
+        return self.manifest['rows'][name]
+
+    def dictionary(self, name):
+        """
+        :param name: people, sexes, numbers, locations or companies
+        :return: Dictionary backed by the memory-mapped values
+        """
+
+        if name not in self._dictionaries:
+
+            size = self.manifest['dictionaries'][name]
+
+            if name == 'locations':
+                values = LocationColumn(
+                    TextColumn(self.base_dir, 'dictionary.locations.city', size),
+                    TextColumn(self.base_dir, 'dictionary.locations.country', size)
+                )
+            else:
+                values = TextColumn(self.base_dir, 'dictionary.' + name, size)
+
+            self._dictionaries[name] = Dictionary(values, key=location_key if name == 'locations' else None)
+
+        return self._dictionaries[name]
+
+    def column(self, name, column):
+        """
+        :param name: dataset
+        :param column: column name
+        :return: memory-mapped array, or TextColumn
+        """
+
+        if (name, column) not in self._columns:
+
+            type = dict((c['name'], c['type']) for c in self.manifest['schema'][name])[column]
+            size = self.rows(name)
+
+            if type == 'text':
+                self._columns[(name, column)] = TextColumn(self.base_dir, '{0}.{1}'.format(name, column), size)
+            else:
+                self._columns[(name, column)] = _map(
+                    _path(self.base_dir, name, column), CODE_DTYPE if type == 'code' else type, size
+                )
+
+        return self._columns[(name, column)]
+
+    def batch(self, name, start, stop):
+        """
+        :return: batch of the records in [start, stop) of a dataset
+        """
+
+        columns = dict(
+            (column['name'], self.column(name, column['name'])[start:stop]) for column in self.manifest['schema'][name]
+        )
+
+        if name == 'people':
+
+            people = self.dictionary('people')
+            sexes = self.dictionary('sexes')
+            numbers = self.dictionary('numbers')
+
+            return PersonBatch(
+                id=[people[i] for i in columns['id'].tolist()],
+                name=columns['name'],
+                sex=[sexes[i] for i in columns['sex'].tolist()],
+                number=[numbers[i] for i in columns['number'].tolist()]
+            )
+
+        if name == 'calls':
+            return CallBatch(numbers=self.dictionary('numbers'), **columns)
+
+        if name == 'flights':
+            return FlightBatch(people=self.dictionary('people'), locations=self.dictionary('locations'), **columns)
+
+        return EmploymentBatch(people=self.dictionary('people'), companies=self.dictionary('companies'), **columns)
+
+    def batches(self, name, size=writer.BATCH_SIZE):
+        """
+        :param name: dataset
+        :param size: maximum number of records per batch
+        :return: generator of batches
+        """
+
+        for start in range(0, self.rows(name), size):
+            yield self.batch(name, start, min(start + size, self.rows(name)))
+
+    def data(self, size=writer.BATCH_SIZE):
+        """
+        :param size: maximum number of records per batch
+        :return: dict of generators of batches, per dataset, as `seed.stream_data`
+        """
+
+        return dict((name, self.batches(name, size)) for name in DATASETS)
@@ -0,0 +1,351 @@
+"""
+Incremental seeding: records are fingerprinted, and a persistent manifest keeps the fingerprints of the records
+already loaded, so that only new or changed records are written
+"""
+
+import os
+import os.path
+import weakref
+
+import numpy as np
+
+from forensics import entities
+
+# fields identifying each record, and the fields it holds
+FIELDS = {
+    entities.Person: (('id',), ('name', 'sex', 'number')),
+    entities.PhoneCall: (('id', 'source', 'target'), ('timestamp', 'weekday', 'hour')),
+    entities.Flight: (('number',), ('timestamp', 'departure', 'destination', 'person')),
+    entities.Employment: (('person', 'company', 'since'), ('until',))
+}
+
+# parameters of the rows of the seeding statements that hold each record's identifying fields, in the order of FIELDS
+ROW_FIELDS = {
+    entities.Person: ('personId',),
+    entities.PhoneCall: ('callId', 'number1', 'number2'),
+    entities.Flight: ('flightNo',),
+    entities.Employment: ('personId', 'companyName', 'since')
+}
+
+
+# fingerprints of other versions of the manifest aren't comparable, so the manifest is started over
+VERSION = 2
+
+# columns of the batches holding positions in each dictionary, and the fields of the dictionary's values that are
+# hashed, if they aren't plain values. A dictionary's values are hashed once, and each record gets the hash at its
+# position
+DICTIONARIES = {
+    'numbers': (('source', 'target'), None),
+    'people': (('person',), None),
+    'companies': (('company',), None),
+    'locations': (('departure', 'destination'), ('city', 'country'))
+}
+
+SEED = np.uint64(0x9e3779b97f4a7c15)
+
+
+def _mix(h):
+    """
+    :param h: array of uint64
+    :return: array of uint64, each bit of which depends on every bit of the input (splitmix64's finalizer)
+    """
+
+    h = (h ^ (h >> np.uint64(30)))*np.uint64(0xbf58476d1ce4e5b9)
+    h = (h ^ (h >> np.uint64(27)))*np.uint64(0x94d049bb133111eb)
+
+    return h ^ (h >> np.uint64(31))
+
+
+def _combine(hashes, n):
+    """
+    :param hashes: arrays of uint64, in order
+    :param n: length of the arrays
+    :return: array of uint64 hashes of the arrays' values at each position
+    """
+
+    h = np.full(n, SEED, dtype=np.uint64)
+
+    for column in hashes:
+        h = _mix(h ^ column)
+
+    return h
+
+
+def _strings(values):
+    """
+    Hashes strings a code point at a time, over all the strings at once
+    :param values: sequence of strings
+    :return: array of uint64 hashes
+    """
+
+    values = np.asarray(values, dtype=np.str_)
+
+    if not len(values):
+        return np.empty(0, dtype=np.uint64)
+
+    codes = values.view(np.uint32).reshape(len(values), -1).astype(np.uint64)
+    lengths = np.char.str_len(values)
+
+    h = np.full(len(values), SEED, dtype=np.uint64)
+
+    # strings end where the longest does, so code points past a string's end leave its hash as it is
+    for i in range(codes.shape[1]):
+        h = np.where(i < lengths, _mix(h ^ codes[:, i]), h)
+
+    return _mix(h ^ lengths.astype(np.uint64))
+
+
+def _hash(values):
+    """
+    :param values: column of a batch, or of query parameters: strings, integers or floats
+    :return: array of uint64 hashes of the values, the same whether given as arrays or lists
+    """
+
+    if not isinstance(values, np.ndarray):
+        values = list(values)
+
+        if values and isinstance(values[0], str):
+            return _strings(values)
+
+        values = np.asarray(values)
+
+    if values.dtype.kind in 'US':
+        return _strings(values)
+
+    if values.dtype.kind == 'f':
+        return _mix(np.ascontiguousarray(values, dtype=np.float64).view(np.uint64))
+
+    return _mix(np.ascontiguousarray(values, dtype=np.int64).view(np.uint64))
+
+
+# hashes of the values of each dictionary, by the dictionary, extended as it grows
+_dictionaries = weakref.WeakKeyDictionary()
+
+
+def _dictionary(name, dictionary):
+    """
+    :param name: name of the dictionary in its batch
+    :param dictionary: entities.Dictionary
+    :return: array of the hashes of the dictionary's values
+    """
+
+    hashes = _dictionaries.get(dictionary, np.empty(0, dtype=np.uint64))
+
+    if len(hashes) < len(dictionary):
+
+        values = [dictionary[i] for i in range(len(hashes), len(dictionary))]
+        _, fields = DICTIONARIES[name]
+
+        if fields is None:
+            added = _hash(values)
+        else:
+            added = _combine([_hash([value[field] for value in values]) for field in fields], len(values))
+
+        hashes = np.concatenate([hashes, added])
+        _dictionaries[dictionary] = hashes
+
+    return hashes
+
+
+def _column(batch, field):
+    """
+    :param batch: batch of records
+    :param field: field of the batch's entity
+    :return: array of the hashes of the field of each record
+    """
+
+    column = getattr(batch, field)
+
+    for name in batch.dictionaries:
+        if field in DICTIONARIES[name][0]:
+            return _dictionary(name, getattr(batch, name))[column]
+
+    return _hash(column)
+
+
+def fingerprints(batch):
+    """
+    Hashes the batch's columns, rather than its records
+    :param batch: batch of records
+    :return: arrays of the hash of each record's identifying fields, and of its other fields
+    """
+
+    key_fields, value_fields = FIELDS[batch.entity]
+
+    keys = _combine([_column(batch, field) for field in key_fields], len(batch))
+    values = _combine([_column(batch, field) for field in value_fields], len(batch))
+
+    return keys, values
+
+
+class Manifest(object):
+    """
+    Fingerprints of the records loaded into the database, per dataset, as sorted arrays of key hashes and the
+    matching value hashes. Records seen by `select` are only added to the manifest by `save`, once they're written
+    """
+
+    def __init__(self, path):
+
+        self.path = path
+        self.keys = {}
+        self.values = {}
+        self._pending = {}
+        self._entities = {}
+
+        if os.path.exists(path):
+            with np.load(path) as arrays:
+
+                # a manifest of other fingerprints would select every record anyway
+                if 'version' not in arrays.files or arrays['version'] != VERSION:
+                    return
+
+                for name in arrays.files:
+                    if name != 'version':
+                        dataset, kind = name.rsplit('.', 1)
+                        getattr(self, kind)[dataset] = arrays[name]
+
+    def clear(self):
+
+        self.keys = {}
+        self.values = {}
+        self._pending = {}
+
+    def remove(self):
+        """
+        Empties the manifest, and deletes its file, e.g. once the records it has fingerprints of are deleted
+        :return:
+        """
+
+        self.clear()
+
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __len__(self):
+        return sum(len(keys) for keys in self.keys.values())
+
+    def select(self, name, batch):
+        """
+        :param name: dataset
+        :param batch: batch of records
+        :return: positions of the records in the batch that are new, or changed, since they were loaded
+        """
+
+        keys, values = fingerprints(batch)
+
+        self._entities[name] = batch.entity
+
+        loaded_keys = self.keys.get(name, np.empty(0, dtype=np.uint64))
+        loaded_values = self.values.get(name, np.empty(0, dtype=np.uint64))
+
+        positions = np.minimum(np.searchsorted(loaded_keys, keys), max(len(loaded_keys) - 1, 0))
+
+        if len(loaded_keys):
+            same = (loaded_keys[positions] == keys) & (loaded_values[positions] == values)
+        else:
+            same = np.zeros(len(keys), dtype=bool)
+
+        indices = np.flatnonzero(~same)
+
+        self._pending.setdefault(name, []).append((keys[indices], values[indices]))
+
+        return indices
+
+    def discard(self, name, rows):
+        """
+        Leaves records selected so far out of the manifest, e.g. those that couldn't be written, so that the next
+        incremental run selects them again
+        :param name: dataset
+        :param rows: query parameters of the records, as in their entity's `row()`
+        :return:
+        """
+
+        if not rows or name not in self._pending:
+            return
+
+        fields = ROW_FIELDS[self._entities[name]]
+        keys = _combine([_hash([row[field] for row in rows]) for field in fields], len(rows))
+
+        pending = []
+
+        for pending_keys, pending_values in self._pending[name]:
+            kept = ~np.isin(pending_keys, keys)
+            pending.append((pending_keys[kept], pending_values[kept]))
+
+        self._pending[name] = pending
+
+    def save(self):
+        """
+        Adds the records selected so far, and writes the manifest
+        :return:
+        """
+
+        for name, pending in self._pending.items():
+
+            keys = np.concatenate([self.keys.get(name, np.empty(0, dtype=np.uint64))] + [k for k, _ in pending])
+            values = np.concatenate([self.values.get(name, np.empty(0, dtype=np.uint64))] + [v for _, v in pending])
+
+            # the latest fingerprint of each record wins
+            order = np.argsort(keys[::-1], kind='stable')
+            keys, values = keys[::-1][order], values[::-1][order]
+            first = np.concatenate([[True], keys[1:] != keys[:-1]])
+
+            self.keys[name] = keys[first]
+            self.values[name] = values[first]
+
+        self._pending = {}
+
+        directory = os.path.dirname(self.path)
+
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        arrays = {'version': np.array(VERSION)}
+
+        for name in self.keys:
+            arrays[name + '.keys'] = self.keys[name]
+            arrays[name + '.values'] = self.values[name]
+
+        # the manifest is replaced in one step, so an interrupted save leaves the previous one
+        temporary = self.path + '.tmp'
+
+        with open(temporary, 'wb') as fp:
+            np.savez(fp, **arrays)
+
+        os.replace(temporary, self.path)
+
+
+class Counter(object):
+
+    def __init__(self):
+
+        self.seen = 0
+        self.selected = 0
+
+
+def select(name, dataset, manifest, counter=None):
+    """
+    :param name: dataset name
+    :param dataset: iterable of batches
+    :param manifest: Manifest. Every record is selected, without fingerprinting it, if None
+    :param counter: Counter of the records seen and selected, if given
+    :return: generator of batches of the new, or changed, records
+    """
+
+    for batch in dataset:
+
+        batch = entities.as_batch(batch)
+
+        if manifest is None:
+            indices = np.arange(len(batch))
+        else:
+            indices = manifest.select(name, batch)
+
+        if counter is not None:
+            counter.seen += len(batch)
+            counter.selected += len(indices)
+
+        if len(indices) == len(batch):
+            yield batch
+        elif len(indices):
+            yield batch.take(indices)
@@ -1,7 +1,102 @@
+import abc
+import collections.abc
+import zlib
+
+import numpy as np
+
 from forensics.utils import neo4j
 
 
-class Person(object):
+def partition(key, n):
+    """
+    Stable partition of a key, in [0, n)
+    :param key: text
+    :param n: number of partitions
+    :return:
+    """
+
+    return zlib.crc32(str(key).encode('utf-8')) % n
+
+
+class Entity(abc.ABC):
+    """
+    Record written by a statement, `STATEMENT`, with the record's `row()` as parameters, or, in bulk, by
+    `BULK_STATEMENT`, with the rows of several records as its `rows` parameter
+    """
+
+    __slots__ = ()
+
+    STATEMENT = None
+    BULK_STATEMENT = None
+
+    @abc.abstractmethod
+    def row(self):
+        """
+        :return: parameters of the record's statement
+        """
+
+    @abc.abstractmethod
+    def partition_key(self):
+        """
+        :return: key of the node the record is about, see `forensics.writer`
+        """
+
+    def cypher(self):
+
+        return neo4j.Query(self.STATEMENT, self.row())
+
+    @classmethod
+    def bulk_statement(cls):
+
+        return cls.BULK_STATEMENT
+
+    @classmethod
+    def bulk_cypher(cls, instances):
+
+        return neo4j.Query(cls.BULK_STATEMENT, {'rows': [instance.row() for instance in instances]})
+
+    def as_dict(self):
+
+        return dict((field, getattr(self, field)) for field in self.__slots__)
+
+    def __repr__(self):
+
+        return '{0}({1})'.format(
+            type(self).__name__, ', '.join('{0}={1!r}'.format(field, getattr(self, field)) for field in self.__slots__)
+        )
+
+
+class Person(Entity):
+
+    __slots__ = ('id', 'name', 'sex', 'number')
+
+    # a person whose number changed is unregistered from the old one
+    STATEMENT = neo4j.statement('person', [
+        'MERGE (p :`Person` {{id: {{personId}} }})',
+        'SET p.name = {{name}}',
+        'SET p.sex = {{sex}}',
+        'WITH p',
+        'OPTIONAL MATCH (p)<-[old :REGISTERED_TO]-(previous :`PhoneNumber`)',
+        'WHERE previous.number <> {{number}}',
+        'DELETE old',
+        'WITH DISTINCT p',
+        'MERGE (n :`PhoneNumber` {{number: {{number}} }})',
+        'MERGE (n)-[:REGISTERED_TO]->(p)'
+    ])
+
+    BULK_STATEMENT = neo4j.statement('person.bulk', [
+        'UNWIND {{rows}} AS row',
+        'MERGE (p :`Person` {{id: row.personId }})',
+        'SET p.name = row.name',
+        'SET p.sex = row.sex',
+        'WITH row, p',
+        'OPTIONAL MATCH (p)<-[old :REGISTERED_TO]-(previous :`PhoneNumber`)',
+        'WHERE previous.number <> row.number',
+        'DELETE old',
+        'WITH DISTINCT row, p',
+        'MERGE (n :`PhoneNumber` {{number: row.number }})',
+        'MERGE (n)-[:REGISTERED_TO]->(p)'
+    ])
 
     def __init__(self, id, name, sex, number):
         self.id = id
@@ -9,124 +104,587 @@ class Person(object):
         self.sex = sex
         self.number = number
 
-    def cypher(self):
+    def row(self):
 
-        statements = ['MERGE (p :`Person` {{id: {{personId}} }})',
-                      'SET p.name = {{name}}',
-                      'SET p.sex = {{sex}}',
-                      'MERGE (n :`PhoneNumber` {{number: {{number}} }})',
-                      'MERGE (n)-[:REGISTERED_TO]->(p)']
+        return {
+            'personId': self.id,
+            'name': self.name,
+            'sex': self.sex,
+            'number': self.number
+        }
 
-        statement = '\n'.join(statements).format()
+    def partition_key(self):
+
+        return self.number
 
-        params = [
-            neo4j.Parameter('personId', self.id),
-            neo4j.Parameter('name', self.name),
-            neo4j.Parameter('sex', self.sex),
-            neo4j.Parameter('number', self.number)
-        ]
 
-        return neo4j.Query(statement, params)
+class PhoneCall(Entity):
 
+    __slots__ = ('id', 'source', 'target', 'weekday', 'hour', 'timestamp')
 
-class PhoneCall(object):
+    # calls are merged on their ID: timestamps are to the hour, and the same numbers can call each other more than
+    # once in an hour
+    STATEMENT = neo4j.statement('phone_call', [
+        'MERGE (n1 :`PhoneNumber` {{ number: {{number1}} }})',
+        'MERGE (n2 :`PhoneNumber` {{ number: {{number2}} }})',
+        'MERGE (n1)-[r :CONTACTED {{ id: {{callId}} }}]->(n2)',
+        'SET r.timestamp = {{timestamp}}',
+        'SET r.weekday = {{weekday}}',
+        'SET r.hour = {{hour}}'
+    ])
 
-    def __init__(self, source, target, weekday, hour, timestamp):
+    BULK_STATEMENT = neo4j.statement('phone_call.bulk', [
+        'UNWIND {{rows}} AS row',
+        'MERGE (n1 :`PhoneNumber` {{ number: row.number1 }})',
+        'MERGE (n2 :`PhoneNumber` {{ number: row.number2 }})',
+        'MERGE (n1)-[r :CONTACTED {{ id: row.callId }}]->(n2)',
+        'SET r.timestamp = row.timestamp',
+        'SET r.weekday = row.weekday',
+        'SET r.hour = row.hour'
+    ])
 
+    def __init__(self, id, source, target, weekday, hour, timestamp):
+
+        self.id = id
         self.source = source
         self.target = target
         self.weekday = weekday
         self.hour = hour
         self.timestamp = timestamp
 
+    def row(self):
+
+        return {
+            'callId': self.id,
+            'number1': self.source,
+            'number2': self.target,
+            'weekday': self.weekday,
+            'hour': self.hour,
+            'timestamp': self.timestamp
+        }
+
+    def partition_key(self):
+
+        return self.source
+
+
+class Flight(Entity):
+
+    __slots__ = ('number', 'timestamp', 'departure', 'destination', 'person')
+
+    # a flight whose passenger, or cities, changed is detached from the old ones, and the old passenger is marked for
+    # their flight rollups to be rebuilt, see `forensics.rollups`
+    STATEMENT = neo4j.statement('flight', [
+        'MERGE (country1 :`Country` {{ name:{{co1}} }})',
+        'MERGE (country2 :`Country` {{ name:{{co2}} }})',
+        'MERGE (city1 :`City` {{ name:{{ci1}} }})',
+        'MERGE (city2 :`City` {{ name:{{ci2}} }})',
+        'MERGE (city1)-[:IN]->(country1)',
+        'MERGE (city2)-[:IN]->(country2)',
+        'MERGE (person :`Person` {{id: {{personId}} }})',
+        'MERGE (flight :`Flight` {{number: {{flightNo}} }})',
+        'SET flight.timestamp = {{timestamp}}',
+        'WITH city1, city2, person, flight',
+        'OPTIONAL MATCH (flight)<-[old :TOOK]-(previous :`Person`)',
+        'WHERE previous.id <> {{personId}}',
+        'DELETE old',
+        'SET previous.staleRollups = true',
+        'WITH DISTINCT city1, city2, person, flight',
+        'OPTIONAL MATCH (flight)-[old :FROM]->(previous :`City`)',
+        'WHERE previous.name <> {{ci1}}',
+        'DELETE old',
+        'WITH DISTINCT city1, city2, person, flight',
+        'OPTIONAL MATCH (flight)-[old :TO]->(previous :`City`)',
+        'WHERE previous.name <> {{ci2}}',
+        'DELETE old',
+        'WITH DISTINCT city1, city2, person, flight',
+        'MERGE (flight)-[:FROM]->(city1)',
+        'MERGE (flight)-[:TO]->(city2)',
+        'MERGE (person)-[:TOOK]->(flight)'
+    ])
+
+    BULK_STATEMENT = neo4j.statement('flight.bulk', [
+        'UNWIND {{rows}} AS row',
+        'MERGE (country1 :`Country` {{ name: row.co1 }})',
+        'MERGE (country2 :`Country` {{ name: row.co2 }})',
+        'MERGE (city1 :`City` {{ name: row.ci1 }})',
+        'MERGE (city2 :`City` {{ name: row.ci2 }})',
+        'MERGE (city1)-[:IN]->(country1)',
+        'MERGE (city2)-[:IN]->(country2)',
+        'MERGE (person :`Person` {{id: row.personId }})',
+        'MERGE (flight :`Flight` {{number: row.flightNo }})',
+        'SET flight.timestamp = row.timestamp',
+        'WITH row, city1, city2, person, flight',
+        'OPTIONAL MATCH (flight)<-[old :TOOK]-(previous :`Person`)',
+        'WHERE previous.id <> row.personId',
+        'DELETE old',
+        'SET previous.staleRollups = true',
+        'WITH DISTINCT row, city1, city2, person, flight',
+        'OPTIONAL MATCH (flight)-[old :FROM]->(previous :`City`)',
+        'WHERE previous.name <> row.ci1',
+        'DELETE old',
+        'WITH DISTINCT row, city1, city2, person, flight',
+        'OPTIONAL MATCH (flight)-[old :TO]->(previous :`City`)',
+        'WHERE previous.name <> row.ci2',
+        'DELETE old',
+        'WITH DISTINCT row, city1, city2, person, flight',
+        'MERGE (flight)-[:FROM]->(city1)',
+        'MERGE (flight)-[:TO]->(city2)',
+        'MERGE (person)-[:TOOK]->(flight)'
+    ])
+
+    def __init__(self, number, timestamp, departure, destination, person):
+
+        self.number = number
+        self.timestamp = timestamp
+        self.departure = departure
+        self.destination = destination
+        self.person = person
+
+    def row(self):
+
+        return {
+            'co1': self.departure['country'],
+            'co2': self.destination['country'],
+            'ci1': self.departure['city'],
+            'ci2': self.destination['city'],
+            'flightNo': self.number,
+            'personId': self.person,
+            'timestamp': self.timestamp
+        }
+
+    def partition_key(self):
+
+        return self.person
+
+
+class Employment(Entity):
+
+    __slots__ = ('person', 'company', 'since', 'until')
+
+    STATEMENT = neo4j.statement('employment', [
+        'MERGE (person :`Person` {{ id: {{personId}} }})',
+        'MERGE (company :`Company` {{ name:{{companyName}} }})',
+        'MERGE (person)-[emp :EMPLOYEE_AT {{ since: {{since}} }}]->(company)',
+        'SET emp.until = {{until}}'
+    ])
+
+    BULK_STATEMENT = neo4j.statement('employment.bulk', [
+        'UNWIND {{rows}} AS row',
+        'MERGE (person :`Person` {{ id: row.personId }})',
+        'MERGE (company :`Company` {{ name: row.companyName }})',
+        'MERGE (person)-[emp :EMPLOYEE_AT {{ since: row.since }}]->(company)',
+        'SET emp.until = row.until'
+    ])
+
+    def __init__(self, person, company, since, until):
+
+        self.person = person
+        self.company = company
+        self.since = since
+        self.until = until
+
+    def row(self):
+
+        return {
+            'personId': self.person,
+            'companyName': self.company,
+            'since': self.since,
+            'until': self.until
+        }
+
+    def partition_key(self):
+
+        return self.person
+
+
+def location_key(location):
+
+    return location['city'], location['country']
+
+
+class Dictionary(object):
+    """
+    Interned values, referenced by their position. Values are interned by `key(value)`, or by themselves.
+    Read-only sequences, e.g. memory-mapped columns, are used as they are, rather than copied
+    """
+
+    def __init__(self, values=(), key=None):
+
+        if isinstance(values, collections.abc.Sequence) and not isinstance(values, (list, tuple, str)):
+            self.values = values
+        else:
+            self.values = list(values)
+        self.key = key
+        self._ids = None
+        self._partitions = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, i):
+        return self.values[i]
+
+    def intern(self, value):
+        """
+        :param value:
+        :return: position of the value, added if it's not in the dictionary yet
+        """
+
+        key = self.key or (lambda v: v)
+
+        if self._ids is None:
+            self._ids = dict((key(v), i) for i, v in enumerate(self.values))
+
+        i = self._ids.get(key(value))
+
+        if i is None:
+            i = len(self.values)
+            self.values.append(value)
+            self._ids[key(value)] = i
+            self._partitions = {}
+
+        return i
+
+    def partitions(self, n):
+        """
+        :param n: number of partitions
+        :return: array with the partition of each value
+        """
+
+        if n not in self._partitions:
+            self._partitions[n] = np.array([partition(value, n) for value in self.values], dtype=np.int64)
+
+        return self._partitions[n]
+
+
+class Batch(abc.ABC):
+    """
+    Struct-of-arrays batch of records of the same type. Numeric columns are arrays, and columns of repeated values
+    hold positions in dictionaries shared between batches
+    """
+
+    entity = None
+    columns = ()
+    dictionaries = ()
+
+    def __len__(self):
+        return len(getattr(self, self.columns[0]))
+
+    @abc.abstractmethod
+    def __iter__(self):
+        """
+        :return: iterator of the records, as entities
+        """
+
+    @abc.abstractmethod
+    def rows(self):
+        """
+        :return: list of query parameters of each record, as in the entity's `row()`
+        """
+
+    @abc.abstractmethod
+    def partitions(self, n):
+        """
+        :param n: number of partitions
+        :return: array with the partition of each record, as in the entity's `partition_key()`
+        """
+
+    def as_dicts(self):
+
+        return [instance.as_dict() for instance in self]
+
     def cypher(self):
 
-        statements = ['MERGE (n1 :`PhoneNumber` {{ number: {{number1}} }})',
-                      'MERGE (n2 :`PhoneNumber` {{ number: {{number2}} }})',
-                      'CREATE (n1)-[r :CONTACTED]->(n2)',
-                      'SET r.weekday = {{weekday}}',
-                      'SET r.hour = {{hour}}',
-                      'SET r.timestamp = {{timestamp}}']
-
-        statement = '\n'.join(statements).format()
-
-        params = [
-            neo4j.Parameter('number1', self.source),
-            neo4j.Parameter('number2', self.target),
-            neo4j.Parameter('weekday', self.weekday),
-            neo4j.Parameter('hour', self.hour),
-            neo4j.Parameter('timestamp', self.timestamp)
-        ]
+        return neo4j.Query(self.entity.bulk_statement(), {'rows': self.rows()})
 
-        return neo4j.Query(statement, params)
+    def take(self, indices):
+        """
+        :param indices: slice, or array of positions
+        :return: batch of the selected records, sharing this batch's dictionaries
+        """
 
+        kwargs = dict((name, getattr(self, name)) for name in self.dictionaries)
 
-class Flight(object):
+        for name in self.columns:
 
-    def __init__(self, number, timestamp, departure, destination, person):
+            column = getattr(self, name)
+
+            if isinstance(indices, slice) or isinstance(column, np.ndarray):
+                kwargs[name] = column[indices]
+            else:
+                kwargs[name] = [column[i] for i in indices]
+
+        return type(self)(**kwargs)
+
+    @classmethod
+    @abc.abstractmethod
+    def from_entities(cls, instances, **dictionaries):
+        """
+        :param instances: list of entities
+        :param dictionaries: dictionaries the batch's columns hold positions in. New ones, if not given
+        :return: batch of the entities
+        """
+
+
+class PersonBatch(Batch):
+
+    entity = Person
+    columns = ('id', 'name', 'sex', 'number')
+
+    def __init__(self, id, name, sex, number):
 
+        self.id = id
+        self.name = name
+        self.sex = sex
         self.number = number
+
+    def __iter__(self):
+
+        for id, name, sex, number in zip(self.id, self.name, self.sex, self.number):
+            yield Person(id=id, name=name, sex=sex, number=number)
+
+    def rows(self):
+
+        return [
+            {
+                'personId': id,
+                'name': name,
+                'sex': sex,
+                'number': number
+            } for id, name, sex, number in zip(self.id, self.name, self.sex, self.number)
+        ]
+
+    def partitions(self, n):
+
+        return np.array([partition(number, n) for number in self.number], dtype=np.int64)
+
+    @classmethod
+    def from_entities(cls, instances, **dictionaries):
+
+        return cls(
+            id=[instance.id for instance in instances],
+            name=[instance.name for instance in instances],
+            sex=[instance.sex for instance in instances],
+            number=[instance.number for instance in instances]
+        )
+
+
+class CallBatch(Batch):
+
+    entity = PhoneCall
+    columns = ('id', 'source', 'target', 'weekday', 'hour', 'timestamp')
+    dictionaries = ('numbers',)
+
+    def __init__(self, numbers, id, source, target, weekday, hour, timestamp):
+
+        self.numbers = numbers
+        self.id = id
+        self.source = source
+        self.target = target
+        self.weekday = weekday
+        self.hour = hour
         self.timestamp = timestamp
+
+    def _columns(self):
+
+        return zip(
+            self.id.tolist(), self.source.tolist(), self.target.tolist(), self.weekday.tolist(), self.hour.tolist(),
+            self.timestamp.tolist()
+        )
+
+    def __iter__(self):
+
+        numbers = self.numbers.values
+
+        for id, source, target, weekday, hour, timestamp in self._columns():
+            yield PhoneCall(
+                id=id, source=numbers[source], target=numbers[target], weekday=weekday, hour=hour, timestamp=timestamp
+            )
+
+    def rows(self):
+
+        numbers = self.numbers.values
+
+        return [
+            {
+                'callId': id,
+                'number1': numbers[source],
+                'number2': numbers[target],
+                'weekday': weekday,
+                'hour': hour,
+                'timestamp': timestamp
+            } for id, source, target, weekday, hour, timestamp in self._columns()
+        ]
+
+    def partitions(self, n):
+
+        return self.numbers.partitions(n)[self.source]
+
+    @classmethod
+    def from_entities(cls, instances, numbers=None, **dictionaries):
+
+        numbers = Dictionary() if numbers is None else numbers
+
+        return cls(
+            numbers=numbers,
+            id=np.array([instance.id for instance in instances], dtype=np.int64),
+            source=np.array([numbers.intern(instance.source) for instance in instances], dtype=np.int64),
+            target=np.array([numbers.intern(instance.target) for instance in instances], dtype=np.int64),
+            weekday=np.array([instance.weekday for instance in instances], dtype=np.int64),
+            hour=np.array([instance.hour for instance in instances], dtype=np.int64),
+            timestamp=np.array([instance.timestamp for instance in instances], dtype=np.float64)
+        )
+
+
+class FlightBatch(Batch):
+
+    entity = Flight
+    columns = ('person', 'departure', 'destination', 'number', 'timestamp')
+    dictionaries = ('people', 'locations')
+
+    def __init__(self, people, locations, person, departure, destination, number, timestamp):
+
+        self.people = people
+        self.locations = locations
+        self.person = person
         self.departure = departure
         self.destination = destination
-        self.person = person
+        self.number = number
+        self.timestamp = timestamp
 
-    def cypher(self):
+    def _columns(self):
+
+        return zip(
+            self.number, self.timestamp.tolist(), self.departure.tolist(), self.destination.tolist(),
+            self.person.tolist()
+        )
+
+    def __iter__(self):
+
+        people = self.people.values
+        locations = self.locations.values
+
+        for number, timestamp, departure, destination, person in self._columns():
+            yield Flight(
+                number=number, timestamp=timestamp, departure=locations[departure],
+                destination=locations[destination], person=people[person]
+            )
+
+    def rows(self):
+
+        people = self.people.values
+        locations = self.locations.values
 
-        statements = ['MERGE (country1 :`Country` {{ name:{{co1}} }})',
-                      'MERGE (country2 :`Country` {{ name:{{co2}} }})',
-                      'MERGE (city1 :`City` {{ name:{{ci1}} }})',
-                      'MERGE (city2 :`City` {{ name:{{ci2}} }})',
-                      'MERGE (city1)-[:IN]->(country1)',
-                      'MERGE (city2)-[:IN]->(country2)',
-                      'MERGE (person :`Person` {{id: {{personId}} }})',
-                      'MERGE (flight :`Flight` {{number: {{flightNo}} }})'
-                      'SET flight.timestamp = {{timestamp}}',
-                      'MERGE (flight)-[:FROM]->(city1)',
-                      'MERGE (flight)-[:TO]->(city2)',
-                      'MERGE (person)-[:TOOK]->(flight)'
-                      ]
-
-        statement = '\n'.join(statements).format()
-
-        params = [
-            neo4j.Parameter('co1', self.departure['country']),
-            neo4j.Parameter('co2', self.destination['country']),
-            neo4j.Parameter('ci1', self.departure['city']),
-            neo4j.Parameter('ci2', self.destination['city']),
-            neo4j.Parameter('flightNo', self.number),
-            neo4j.Parameter('personId', self.person),
-            neo4j.Parameter('timestamp', self.timestamp)
+        return [
+            {
+                'co1': locations[departure]['country'],
+                'co2': locations[destination]['country'],
+                'ci1': locations[departure]['city'],
+                'ci2': locations[destination]['city'],
+                'flightNo': number,
+                'personId': people[person],
+                'timestamp': timestamp
+            } for number, timestamp, departure, destination, person in self._columns()
         ]
 
-        return neo4j.Query(statement, params)
+    def partitions(self, n):
 
+        return self.people.partitions(n)[self.person]
 
-class Employment(object):
+    @classmethod
+    def from_entities(cls, instances, people=None, locations=None, **dictionaries):
 
-    def __init__(self, person, company, since, until):
+        people = Dictionary() if people is None else people
+        locations = Dictionary(key=location_key) if locations is None else locations
+
+        return cls(
+            people=people,
+            locations=locations,
+            person=np.array([people.intern(instance.person) for instance in instances], dtype=np.int64),
+            departure=np.array([locations.intern(instance.departure) for instance in instances], dtype=np.int64),
+            destination=np.array([locations.intern(instance.destination) for instance in instances], dtype=np.int64),
+            number=[instance.number for instance in instances],
+            timestamp=np.array([instance.timestamp for instance in instances], dtype=np.float64)
+        )
+
+
+class EmploymentBatch(Batch):
+
+    entity = Employment
+    columns = ('person', 'company', 'since', 'until')
+    dictionaries = ('people', 'companies')
+
+    def __init__(self, people, companies, person, company, since, until):
 
+        self.people = people
+        self.companies = companies
         self.person = person
         self.company = company
         self.since = since
         self.until = until
 
-    def cypher(self):
+    def _columns(self):
+
+        return zip(self.person.tolist(), self.company.tolist(), self.since.tolist(), self.until.tolist())
+
+    def __iter__(self):
+
+        people = self.people.values
+        companies = self.companies.values
+
+        for person, company, since, until in self._columns():
+            yield Employment(person=people[person], company=companies[company], since=since, until=until)
 
-        statements = ['MERGE (person :`Person` {{ id: {{personId}} }})',
-                      'MERGE (company :`Company` {{ name:{{companyName}} }})',
-                      'CREATE (person)-[emp :EMPLOYEE_AT]->(company)',
-                      'SET emp.since = {{since}}',
-                      'SET emp.until = {{until}}'
-                      ]
+    def rows(self):
 
-        statement = '\n'.join(statements).format()
+        people = self.people.values
+        companies = self.companies.values
 
-        params = [
-            neo4j.Parameter('personId', self.person),
-            neo4j.Parameter('companyName', self.company),
-            neo4j.Parameter('since', self.since),
-            neo4j.Parameter('until', self.until),
+        return [
+            {
+                'personId': people[person],
+                'companyName': companies[company],
+                'since': since,
+                'until': until
+            } for person, company, since, until in self._columns()
         ]
 
-        return neo4j.Query(statement, params)
+    def partitions(self, n):
+
+        return self.people.partitions(n)[self.person]
+
+    @classmethod
+    def from_entities(cls, instances, people=None, companies=None, **dictionaries):
+
+        people = Dictionary() if people is None else people
+        companies = Dictionary() if companies is None else companies
+
+        return cls(
+            people=people,
+            companies=companies,
+            person=np.array([people.intern(instance.person) for instance in instances], dtype=np.int64),
+            company=np.array([companies.intern(instance.company) for instance in instances], dtype=np.int64),
+            since=np.array([instance.since for instance in instances], dtype=np.float64),
+            until=np.array([instance.until for instance in instances], dtype=np.float64)
+        )
+
+
+BATCHES = {
+    Person: PersonBatch,
+    PhoneCall: CallBatch,
+    Flight: FlightBatch,
+    Employment: EmploymentBatch
+}
+
+
+def as_batch(chunk):
+    """
+    :param chunk: batch, or list of entities of the same type
+    :return: batch
+    """
+
+    if isinstance(chunk, Batch):
+        return chunk
+
+    return BATCHES[type(chunk[0])].from_entities(chunk)
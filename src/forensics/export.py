@@ -0,0 +1,214 @@
+"""
+Streaming exports of generated data: NDJSON, and CSV files for Neo4j's offline bulk importer (`neo4j-admin import`)
+"""
+
+import csv
+import json
+import os
+import os.path
+
+DATASETS = ['people', 'calls', 'flights', 'employment']
+
+# headers of the node files, in the bulk importer's format
+NODES = {
+    'persons': ['id:ID(Person)', 'name', 'sex', ':LABEL'],
+    'phone_numbers': ['number:ID(PhoneNumber)', ':LABEL'],
+    'flights': ['number:ID(Flight)', 'timestamp:double', ':LABEL'],
+    'cities': ['name:ID(City)', ':LABEL'],
+    'countries': ['name:ID(Country)', ':LABEL'],
+    'companies': ['name:ID(Company)', ':LABEL']
+}
+
+# headers of the relationship files
+RELATIONSHIPS = {
+    'registered_to': [':START_ID(PhoneNumber)', ':END_ID(Person)', ':TYPE'],
+    'contacted': [':START_ID(PhoneNumber)', ':END_ID(PhoneNumber)', 'id:long', 'weekday:int', 'hour:int',
+                  'timestamp:double', ':TYPE'],
+    'took': [':START_ID(Person)', ':END_ID(Flight)', ':TYPE'],
+    'from': [':START_ID(Flight)', ':END_ID(City)', ':TYPE'],
+    'to': [':START_ID(Flight)', ':END_ID(City)', ':TYPE'],
+    'in': [':START_ID(City)', ':END_ID(Country)', ':TYPE'],
+    'employee_at': [':START_ID(Person)', ':END_ID(Company)', 'since:double', 'until:double', ':TYPE']
+}
+
+
+def export_ndjson(data, base_dir):
+    """
+    Writes each dataset to a file with one JSON record per line, a batch at a time
+    :param data: dict of iterables of batches, e.g. from `seed.stream_data`
+    :param base_dir: output directory
+    :return: dict with the number of records written, per dataset
+    """
+
+    if not os.path.exists(base_dir):
+        os.makedirs(base_dir)
+
+    counts = {}
+
+    for name in DATASETS:
+
+        c = 0
+
+        with open(os.path.join(base_dir, '{0}.ndjson'.format(name)), 'w', encoding='utf-8') as fp:
+            for batch in data[name]:
+
+                fp.writelines(json.dumps(record, ensure_ascii=False) + '\n' for record in batch.as_dicts())
+
+                c += len(batch)
+
+        counts[name] = c
+
+    return counts
+
+
+class CsvExport(object):
+    """
+    Node and relationship CSV files, laid out for the bulk importer. Nodes are written the first time their key is
+    seen, and relationships that the seeding statements MERGE are only written once, as seeding does
+    """
+
+    def __init__(self, base_dir):
+
+        self.base_dir = base_dir
+        self.files = {}
+        self.writers = {}
+        self.counts = {}
+
+        # keys of the nodes and merged relationships written so far
+        self.numbers = set()
+        self.cities = set()
+        self.countries = set()
+        self.companies = set()
+        self.located = set()
+
+    def __enter__(self):
+
+        if not os.path.exists(self.base_dir):
+            os.makedirs(self.base_dir)
+
+        for name, header in list(NODES.items()) + list(RELATIONSHIPS.items()):
+
+            fp = open(self.path(name), 'w', encoding='utf-8', newline='')
+
+            self.files[name] = fp
+            self.writers[name] = csv.writer(fp)
+            self.writers[name].writerow(header)
+            self.counts[name] = 0
+
+        return self
+
+    def __exit__(self, type, value, traceback):
+
+        for fp in self.files.values():
+            fp.close()
+
+    def path(self, name):
+        return os.path.join(self.base_dir, '{0}.csv'.format(name))
+
+    def _write(self, name, rows):
+
+        self.writers[name].writerows(rows)
+        self.counts[name] += len(rows)
+
+    def _new(self, seen, keys):
+        """
+        :return: keys not seen before, in order. They're marked as seen
+        """
+
+        new = []
+
+        for key in keys:
+            if key not in seen:
+                seen.add(key)
+                new.append(key)
+
+        return new
+
+    def _places(self, locations):
+
+        self._write('countries', [
+            [country, 'Country'] for country in self._new(self.countries, [l['country'] for l in locations])
+        ])
+        self._write('cities', [
+            [city, 'City'] for city in self._new(self.cities, [l['city'] for l in locations])
+        ])
+        self._write('in', [
+            [city, country, 'IN'] for city, country in self._new(
+                self.located, [(l['city'], l['country']) for l in locations]
+            )
+        ])
+
+    def people(self, batch):
+
+        records = batch.as_dicts()
+
+        self._write('persons', [[r['id'], r['name'], r['sex'], 'Person'] for r in records])
+        self._write('phone_numbers', [
+            [number, 'PhoneNumber'] for number in self._new(self.numbers, [r['number'] for r in records])
+        ])
+        self._write('registered_to', [[r['number'], r['id'], 'REGISTERED_TO'] for r in records])
+
+    def calls(self, batch):
+
+        records = batch.as_dicts()
+
+        # numbers are registered to people, but calls can come from, or go to, unknown numbers
+        self._write('phone_numbers', [
+            [number, 'PhoneNumber'] for number in self._new(
+                self.numbers, [n for r in records for n in (r['source'], r['target'])]
+            )
+        ])
+        self._write('contacted', [
+            [r['source'], r['target'], r['id'], r['weekday'], r['hour'], r['timestamp'], 'CONTACTED'] for r in records
+        ])
+
+    def flights(self, batch):
+
+        records = batch.as_dicts()
+
+        self._places([l for r in records for l in (r['departure'], r['destination'])])
+
+        self._write('flights', [[r['number'], r['timestamp'], 'Flight'] for r in records])
+        self._write('took', [[r['person'], r['number'], 'TOOK'] for r in records])
+        self._write('from', [[r['number'], r['departure']['city'], 'FROM'] for r in records])
+        self._write('to', [[r['number'], r['destination']['city'], 'TO'] for r in records])
+
+    def employment(self, batch):
+
+        records = batch.as_dicts()
+
+        self._write('companies', [
+            [company, 'Company'] for company in self._new(self.companies, [r['company'] for r in records])
+        ])
+        self._write('employee_at', [
+            [r['person'], r['company'], r['since'], r['until'], 'EMPLOYEE_AT'] for r in records
+        ])
+
+    def command(self):
+        """
+        :return: `neo4j-admin import` command line that loads the exported files
+        """
+
+        # flags of Neo4j 3.x, as the statements' `{param}` syntax: 4.x renamed --ignore-duplicate-nodes
+        arguments = ['neo4j-admin import', '--id-type=STRING', '--ignore-duplicate-nodes=true']
+        arguments.extend('--nodes={0}'.format(self.path(name)) for name in NODES)
+        arguments.extend('--relationships={0}'.format(self.path(name)) for name in RELATIONSHIPS)
+
+        return ' \\\n\t'.join(arguments)
+
+
+def export_csv(data, base_dir):
+    """
+    Writes the datasets to node and relationship CSV files for the bulk importer, a batch at a time
+    :param data: dict of iterables of batches, e.g. from `seed.stream_data`
+    :param base_dir: output directory
+    :return: CsvExport, with the number of rows written per file
+    """
+
+    with CsvExport(base_dir) as export:
+
+        for name in DATASETS:
+            for batch in data[name]:
+                getattr(export, name)(batch)
+
+    return export
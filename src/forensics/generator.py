@@ -0,0 +1,237 @@
+"""
+Vectorized generation of random values, drawn in bulk as NumPy arrays
+"""
+
+import datetime
+import threading
+
+import numpy as np
+
+# random activity happens within the year before this date
+END = datetime.datetime(2014, 12, 31, 11, 59, 59)
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+# within a year
+HOURS = (365+1)*24
+
+SECONDS_PER_HOUR = 3600
+SECONDS_PER_DAY = 24*SECONDS_PER_HOUR
+
+# the 1st of January, 1970, was a Thursday
+EPOCH_WEEKDAY = 3
+
+# number of distinct flight numbers, and the stride of consecutive flights among them, coprime to 10^9
+FLIGHT_NUMBERS = 10**9
+FLIGHT_NUMBER_STRIDE = 3**18
+
+
+def naive_seconds(date):
+    """
+    :param date: naive datetime
+    :return: seconds since the epoch, ignoring timezones
+    """
+
+    return int((date - EPOCH).total_seconds())
+
+
+class LocalTime(object):
+    """
+    Converts naive (local) times to unix timestamps, as `datetime.timestamp()` does, in bulk.
+    The UTC offset of each distinct hour is only computed once
+    """
+
+    def __init__(self):
+
+        self._offsets = {}
+        self._lock = threading.Lock()
+
+    def _offset(self, hour):
+
+        date = EPOCH + datetime.timedelta(hours=int(hour))
+
+        return date.timestamp() - naive_seconds(date)
+
+    def timestamps(self, seconds):
+        """
+        :param seconds: array of naive seconds since the epoch
+        :return: array of unix timestamps
+        """
+
+        hours, inverse = np.unique(seconds // SECONDS_PER_HOUR, return_inverse=True)
+
+        with self._lock:
+
+            offsets = np.empty(len(hours), dtype=np.float64)
+
+            for i, hour in enumerate(hours.tolist()):
+
+                if hour not in self._offsets:
+                    self._offsets[hour] = self._offset(hour)
+
+                offsets[i] = self._offsets[hour]
+
+        return seconds + offsets[inverse.reshape(-1)]
+
+
+local_time = LocalTime()
+
+
+def weekdays(seconds):
+    """
+    :param seconds: array of naive seconds since the epoch
+    :return: array of weekdays, where Monday is 0 and Sunday is 6
+    """
+
+    return ((seconds // SECONDS_PER_DAY + EPOCH_WEEKDAY) % 7).astype(np.int64)
+
+
+def day_hours(seconds):
+    """
+    :param seconds: array of naive seconds since the epoch
+    :return: array of hours, 0-23
+    """
+
+    return ((seconds // SECONDS_PER_HOUR) % 24).astype(np.int64)
+
+
+def times(rng, size, end=END, hours=HOURS):
+    """
+    Random times, on the hour offsets of `end` within the given number of hours before it
+    :param rng: numpy random Generator
+    :param size: number of values
+    :param end: latest time
+    :param hours: range, in hours
+    :return: array of naive seconds since the epoch
+    """
+
+    return naive_seconds(end) - rng.integers(0, hours, size=size, endpoint=True)*SECONDS_PER_HOUR
+
+
+def times_in_weekday(rng, weekday, size, end=END, hours=HOURS):
+    """
+    Random times that fall on the given weekday. Rather than drawing times until one falls on the weekday, times are
+    drawn from the hour offsets within the range that fall on it
+    :param rng: numpy random Generator
+    :param weekday: Monday is 0, Sunday is 6
+    :param size: number of values
+    :param end: latest time
+    :param hours: range, in hours
+    :return: array of naive seconds since the epoch
+    """
+
+    candidates = naive_seconds(end) - np.arange(0, hours + 1, dtype=np.int64)*SECONDS_PER_HOUR
+    candidates = candidates[weekdays(candidates) == weekday]
+
+    return rng.choice(candidates, size=size)
+
+
+def calls(rng, size, n, end=END, hours=HOURS):
+    """
+    :param rng: numpy random Generator
+    :param size: number of calls
+    :param n: number of phone numbers to pick sources and targets from
+    :param end: latest time
+    :param hours: range, in hours
+    :return: dict of arrays: source and target indices, weekday, hour and timestamp
+    """
+
+    seconds = times(rng, size, end=end, hours=hours)
+
+    return {
+        'source': rng.integers(0, n, size=size),
+        'target': rng.integers(0, n, size=size),
+        'weekday': weekdays(seconds),
+        'hour': day_hours(seconds),
+        'timestamp': local_time.timestamps(seconds)
+    }
+
+
+def calls_in_weekday(rng, weekday, size, end=END, hours=HOURS):
+    """
+    :param rng: numpy random Generator
+    :param weekday: Monday is 0, Sunday is 6
+    :param size: number of calls
+    :param end: latest time
+    :param hours: range, in hours
+    :return: dict of arrays: weekday, hour and timestamp
+    """
+
+    seconds = times_in_weekday(rng, weekday, size, end=end, hours=hours)
+
+    return {
+        'weekday': weekdays(seconds),
+        'hour': day_hours(seconds),
+        'timestamp': local_time.timestamps(seconds)
+    }
+
+
+def flights(rng, size, n, locations, start=0, offset=0):
+    """
+    :param rng: numpy random Generator
+    :param size: number of flights
+    :param n: number of people to pick passengers from
+    :param locations: number of locations to pick departures and destinations from
+    :param start: position of the first flight in its dataset, see `flight_numbers`
+    :param offset: offset of the flight numbers, see `flight_numbers`
+    :return: dict of arrays: person, departure and destination indices, number and timestamp
+    """
+
+    departure = rng.integers(0, locations, size=size)
+    destination = rng.integers(0, locations, size=size)
+
+    # flights go somewhere else
+    same = np.flatnonzero(departure == destination)
+    while len(same):
+        destination[same] = rng.integers(0, locations, size=len(same))
+        same = same[departure[same] == destination[same]]
+
+    return {
+        'person': rng.integers(0, n, size=size),
+        'departure': departure,
+        'destination': destination,
+        'number': flight_numbers(start + np.arange(size), offset),
+        'timestamp': local_time.timestamps(times(rng, size))
+    }
+
+
+def flight_numbers(positions, offset=0):
+    """
+    Flight numbers are a permutation of the flights' positions in their dataset, so that they're unique: multiplying
+    by a number coprime to 10^9, modulo 10^9, maps distinct positions to distinct numbers, spread over the range
+    :param positions: array of the positions of the flights in their dataset, below 10^9
+    :param offset: offset of the numbers, e.g. drawn from the dataset seed, so that datasets of other seeds have other
+    numbers
+    :return: list of flight numbers, formatted as `NNN-NN-NNNN`
+    """
+
+    positions = np.asarray(positions, dtype=np.int64)
+
+    if len(positions) and positions.max() >= FLIGHT_NUMBERS:
+        raise ValueError('Flight numbers are only unique for datasets of up to {0} flights'.format(FLIGHT_NUMBERS))
+
+    numbers = (positions*FLIGHT_NUMBER_STRIDE + offset) % FLIGHT_NUMBERS
+
+    return ['{0:03d}-{1:02d}-{2:04d}'.format(n // 10**6, n // 10**4 % 100, n % 10**4) for n in numbers.tolist()]
+
+
+def employment(rng, size, n, companies):
+    """
+    :param rng: numpy random Generator
+    :param size: number of employment records
+    :param n: number of people to pick employees from
+    :param companies: number of companies
+    :return: dict of arrays: person and company indices, since and until timestamps. Until is -1 for current
+    employment
+    """
+
+    since = times(rng, size, hours=(10 * 365 + 1) * 24)
+    until = since + rng.integers(90, 3650, size=size, endpoint=True)*SECONDS_PER_DAY
+
+    return {
+        'person': rng.integers(0, n, size=size),
+        'company': rng.integers(0, companies, size=size),
+        'since': local_time.timestamps(since),
+        'until': np.where(rng.integers(0, 1, size=size, endpoint=True) == 1, local_time.timestamps(until), -1.)
+    }
+
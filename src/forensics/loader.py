@@ -0,0 +1,202 @@
+"""
+Loading of datasets dumped by `seed.dump`, as batches for the writer. Dumps are read a chunk of records at a time,
+and chunks are parsed by a pool of processes, ahead of the writer
+"""
+
+import collections
+import json
+import multiprocessing
+import os
+import os.path
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from forensics import columnar, writer
+from forensics.entities import Person, PhoneCall, Flight, Employment, BATCHES
+
+DATASETS = ['people', 'calls', 'flights', 'employment']
+
+ENTITIES = {
+    'people': Person,
+    'calls': PhoneCall,
+    'flights': Flight,
+    'employment': Employment
+}
+
+# in order of preference, when the format isn't given
+FORMATS = ['columnar', 'ndjson', 'json']
+
+# characters of JSON arrays read at a time
+BLOCK_SIZE = 2**20
+
+# braces, and strings, as a whole, or a quote, for the start of a string the buffer ends within
+TOKENS = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|[{}]|"', re.DOTALL)
+
+
+def detect(base_dir):
+    """
+    :param base_dir: directory the datasets were dumped to
+    :return: format of the dump in the directory: columnar, ndjson or json
+    """
+
+    paths = {
+        'columnar': os.path.join(base_dir, 'columnar', columnar.MANIFEST),
+        'ndjson': os.path.join(base_dir, 'people.ndjson'),
+        'json': os.path.join(base_dir, 'people.json')
+    }
+
+    for format in FORMATS:
+        if os.path.exists(paths[format]):
+            return format
+
+    raise IOError('No dumped datasets found in {0}'.format(base_dir))
+
+
+def ndjson_records(fp):
+    """
+    :param fp: file with one JSON record per line
+    :return: generator of the text of each record
+    """
+
+    for line in fp:
+        if line.strip():
+            yield line
+
+
+def json_records(fp, block_size=BLOCK_SIZE):
+    """
+    Splits a JSON array of records, in any layout, e.g. as written by `seed.dump_json`, a block at a time. Records are
+    found by their braces, outside of strings, and parsed later, by `parse`
+    :param fp: file with a JSON array of records
+    :param block_size: number of characters read at a time
+    :return: generator of the text of each record
+    """
+
+    buffer = ''
+    position = 0
+    start = None
+    depth = 0
+
+    while True:
+
+        for match in TOKENS.finditer(buffer, position):
+
+            token = match.group()
+
+            if token == '"':
+                # a string cut in two, by the end of the buffer
+                break
+
+            position = match.end()
+
+            if token == '{':
+
+                if depth == 0:
+                    start = match.start()
+
+                depth += 1
+
+            elif token == '}':
+
+                depth -= 1
+
+                if depth == 0:
+                    yield buffer[start:position]
+                    start = None
+        else:
+            position = len(buffer)
+
+        block = fp.read(block_size)
+
+        if not block:
+            break
+
+        # only the record being read is kept
+        keep = start if start is not None else position
+        buffer = buffer[keep:] + block
+        position -= keep
+        start = None if start is None else 0
+
+    if start is not None or depth != 0 or position < len(buffer):
+        raise ValueError('Truncated JSON array in {0}'.format(getattr(fp, 'name', 'a file')))
+
+
+def parse(dataset, texts):
+    """
+    :param dataset: name of the dataset
+    :param texts: list of the JSON text of records
+    :return: batch of the records
+    """
+
+    entity = ENTITIES[dataset]
+
+    return BATCHES[entity].from_entities([entity(**json.loads(text)) for text in texts])
+
+
+def parsed(dataset, chunks, processes=1):
+    """
+    Parses chunks of records, in order. With more than one process, chunks are parsed by a pool of processes,
+    a bounded number of chunks ahead of the consumer, so parsing overlaps with writing
+    :param dataset: name of the dataset
+    :param chunks: iterable of lists of the JSON text of records
+    :param processes: number of worker processes
+    :return: generator of batches
+    """
+
+    if processes <= 1:
+        for chunk in chunks:
+            yield parse(dataset, chunk)
+        return
+
+    # chunks are consumed by the writer's threads, and forking a process that runs threads can copy locks they hold
+    with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('forkserver')) as executor:
+
+        pending = collections.deque()
+
+        for chunk in chunks:
+
+            pending.append(executor.submit(parse, dataset, chunk))
+
+            if len(pending) >= 2*processes:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+
+def _read(path, records, dataset, chunk_size, processes):
+
+    with open(path, encoding='utf-8') as fp:
+
+        chunks = writer.batches(records(fp), chunk_size)
+
+        for batch in parsed(dataset, chunks, processes):
+            yield batch
+
+
+def load_data(base_dir, format=None, chunk_size=writer.BATCH_SIZE, processes=1):
+    """
+    Streams dumped datasets. Files are only opened when their dataset is first consumed
+    :param base_dir: directory the datasets were dumped to, e.g. data/out
+    :param format: columnar, ndjson or json. Detected from the files in the directory by default
+    :param chunk_size: number of records per batch
+    :param processes: number of processes parsing records
+    :return: dict of generators of batches, per dataset, as `seed.stream_data`
+    """
+
+    format = format or detect(base_dir)
+
+    print('\tLoading {0} datasets from {1}'.format(format, base_dir))
+
+    if format == 'columnar':
+        # columns are memory-mapped, so there's nothing to parse
+        return columnar.ColumnarDataset(os.path.join(base_dir, 'columnar')).data(chunk_size)
+
+    records = ndjson_records if format == 'ndjson' else json_records
+
+    return dict(
+        (name, _read(
+            os.path.join(base_dir, '{0}.{1}'.format(name, format)), records, name, chunk_size, processes
+        )) for name in DATASETS
+    )
+
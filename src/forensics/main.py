@@ -6,7 +6,7 @@ import argparse
 
 
 from forensics.patterns import run_analysis
-from forensics import seed
+from forensics.utils import cache, neo4j
 
 
 # step 1: seed random data
@@ -21,13 +21,95 @@ if __name__ == '__main__':
 
     parser.add_argument('--seed', type=bool, default=False)
     parser.add_argument('--pattern', type=str, default="*")
+    parser.add_argument('--bulk', type=str, default='yes', choices=['yes', 'no'],
+                        help='Seed with one UNWIND statement per batch (yes), or one statement per record (no)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of concurrent writers per dataset, when seeding. Defaults to config.ini')
+    parser.add_argument('--scale', type=float, default=None,
+                        help='Scale factor of the seeded datasets. Defaults to config.ini')
+    parser.add_argument('--rng-seed', type=int, default=None,
+                        help='Dataset seed, to reproduce a dataset. Defaults to config.ini, or a random seed')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='Number of processes generating data, when seeding. Defaults to config.ini')
+    parser.add_argument('--load', type=str, default=None, choices=['auto', 'columnar', 'ndjson', 'json'],
+                        help='Seed with the datasets dumped to data/out by seed.py, instead of generating them')
+    parser.add_argument('--wipe', type=str, default=None, choices=['delete', 'drop'],
+                        help='Empty the database before seeding by deleting nodes in batches, or by dropping the '
+                             'store. Defaults to config.ini')
+    parser.add_argument('--incremental', type=str, default='no', choices=['yes', 'no'],
+                        help='Keep the database, and only seed records that are new, or changed, since the last seed')
+    parser.add_argument('--keep-manifest', type=str, default=None, choices=['yes', 'no'],
+                        help='Fingerprint the records of a full seed, for later incremental seeds. Defaults to '
+                             'config.ini, or to whether there is a manifest already')
+    parser.add_argument('--backend', type=str, default='neo4j', choices=['neo4j', 'memory'],
+                        help='Run the patterns on the Neo4j server (neo4j), or on an in-memory graph of data '
+                             'generated, or loaded with --load, for this run (memory)')
+    parser.add_argument('--callgraph', type=str, default='no', choices=['no', 'export', 'open'],
+                        help='Run patterns 3, 4 and 5 on a sparse snapshot of the call graph, for every number at '
+                             'once: exported from the database, and saved to data/callgraph.npz (export), or opened '
+                             'from there (open)')
+    parser.add_argument('--cache', type=str, default='yes', choices=['yes', 'no'],
+                        help='Reuse the results of pattern queries run since the last seed')
+    parser.add_argument('--stats', type=str, default='no', choices=['yes', 'no'],
+                        help='Print connection pool, and result cache, statistics at the end')
+    parser.add_argument('--startup', type=str, default='no', choices=['yes', 'no'],
+                        help='Report the import time of each module, and exit')
 
     args = parser.parse_args()
 
+    if args.startup == 'yes':
+        from forensics.utils import startup
+        startup.report()
+        exit(0)
+
     seed_data = args.seed
     pattern = args.pattern
+    bulk = args.bulk == 'yes'
+
+    if args.backend == 'memory':
+        # the in-memory graph is filled directly, rather than seeded through statements
+        from forensics import seed
+        seed.seed_memory(scale=args.scale, rng_seed=args.rng_seed, processes=args.processes, load=args.load)
+
+    elif seed_data:
+        # the data generation stack is only loaded when seeding
+        from forensics import seed
+        seed.seed(
+            bulk=bulk, workers=args.workers, scale=args.scale, rng_seed=args.rng_seed, processes=args.processes,
+            load=args.load, wipe_mode=args.wipe,
+            incremental=args.incremental == 'yes',
+            keep_manifest=None if args.keep_manifest is None else args.keep_manifest == 'yes'
+        )
+
+    if args.cache == 'no':
+        cache.get_cache().enabled = False
+
+    snapshot = None
+
+    if args.callgraph != 'no':
+        from forensics import callgraph
+
+        if args.callgraph == 'export':
+            snapshot = callgraph.CallGraph.export()
+            snapshot.save(callgraph.SNAPSHOT)
+        else:
+            snapshot = callgraph.CallGraph.open(callgraph.SNAPSHOT)
+
+        print('Call graph snapshot: {0} numbers, {1} calls'.format(len(snapshot.numbers), len(snapshot)))
+
+    if pattern in ['1', '2', '*'] and not seed_data and args.backend != 'memory':
+        # the frequency patterns read the flight rollups, which seeding rebuilds. A database seeded before they
+        # existed, or before their months were in UTC, gets them built once, before the patterns run
+        from forensics import rollups
+        rollups.ensure()
+
+    run_analysis(pattern, snapshot=snapshot)
 
-    if seed_data:
-        seed.seed()
+    if args.stats == 'yes':
+        print('\nConnection pool:')
+        for k, v in sorted(neo4j.pool_stats().items()):
+            print('\t', k, '=>', v)
 
-    run_analysis(pattern)
+        print('\nResult cache:')
+        for k, v in sorted(cache.cache_stats().items()):
+            print('\t', k, '=>', v)
@@ -1,7 +1,12 @@
 import datetime
+import itertools
 import time
 
-from forensics.utils import neo4j
+from forensics.utils import cache, lazy, neo4j, results
+from forensics.utils.periods import months
+
+# the call graph snapshot, and NumPy, are only loaded when patterns run on a snapshot
+callgraph = lazy.module('forensics.callgraph')
 
 PATTERNS = {
     1: '\n**Find the top 20 people that took more than 1 flight between ~Jan - Jun 2014, to any destination.'
@@ -15,6 +20,138 @@ PATTERNS = {
 }
 
 
+# the frequency patterns read the monthly flight rollups, see `forensics.rollups`, so their windows are whole months
+ONE = neo4j.statement('patterns.one', [
+    'MATCH (person :`Person`)-[rollup :FLEW_TO]->(country :`Country`)',
+    'WHERE rollup.month >= {{startDate}} AND rollup.month < {{endDate}}',
+    'WITH person.name AS person, SUM(rollup.flights) AS n, country.name AS destination',
+    'WHERE n > {{count}}',
+    'RETURN person, n, destination',
+    'ORDER BY n DESC',
+    'LIMIT {{limit}}'
+])
+
+
+def period(timestamp):
+    """
+    Bucketing of a per-period statement, which scans its whole window once: the `boundaries` parameter holds the
+    start of each period, e.g. from `months`, and the end of the last one
+    :param timestamp: Cypher expression of a unix timestamp, e.g. `flight.timestamp`
+    :return: statement lines, of the condition that the timestamp is within the periods, and of the position of the
+    period it falls in, as `period`, with the variables of the match
+    """
+
+    return [
+        'WHERE {0} >= {{{{boundaries}}}}[0] AND {0} < {{{{boundaries}}}}[-1]'.format(timestamp),
+        'WITH *, size([boundary IN {{{{boundaries}}}} WHERE boundary <= {0}]) - 1 AS period'.format(timestamp)
+    ]
+
+
+TWO = neo4j.statement('patterns.two', [
+    'MATCH (person :`Person`)-[rollup :FLEW_TO]->(country :`Country`)',
+    *period('rollup.month'),
+    'WITH period, person.name AS person, SUM(rollup.flights) AS n, country.name AS destination',
+    'WHERE n > {{count}}',
+    'RETURN period, person, n, destination',
+    'ORDER BY period'
+])
+
+THREE = neo4j.statement('patterns.three', [
+    'MATCH (poi)<-[:REGISTERED_TO]-(poiPhone :`PhoneNumber`)-[call :CONTACTED]->'
+    '(repPhone :`PhoneNumber` {{number: {{repNumber}}}})',
+    'WHERE call.weekday = {{weekday}}',
+    'RETURN poi.name AS subjectName, COUNT(call) AS numberOfCalls'
+])
+#  AND call.hour >= {{startInterval}} AND call.hour <= {{endInterval}}
+
+FOUR = neo4j.statement('patterns.four', [
+    'MATCH (poi :`Person`)<-[:REGISTERED_TO]-(poiPhone :`PhoneNumber`)-[call :CONTACTED]->'
+    '(repPhone :`PhoneNumber` {{number: {{repNumber}}}})',
+    'WHERE call.weekday = {{weekday}}',
+    'WITH poi, COUNT(call) AS numberOfCalls',
+    'MATCH (poi)-[:TOOK]->(flight :`Flight`)-[:TO]-(:`City`)-[:IN]->(country :`Country`)',
+    'WHERE country.name IN {{countries}} AND flight.timestamp >= {{startDate}} AND flight.timestamp < {{endDate}}',
+    'RETURN poi.name as subjectName, poi.id AS ID, COUNT(flight) AS flights, country.name AS country'
+])
+
+FIVE = neo4j.statement('patterns.five', [
+    'MATCH (poi :`Person`)<-[:REGISTERED_TO]-(poiPhone :`PhoneNumber`)-[call :CONTACTED]->'
+    '(repPhone :`PhoneNumber` {{number: {{repNumber}}}})',
+    'WHERE call.weekday = {{weekday}}',
+    'WITH poi, COUNT(call) AS numberOfCalls',
+    'MATCH (poi)-[:TOOK]->(flight :`Flight`)-[:TO]-(:`City`)-[:IN]->(country :`Country`)'
+    'WHERE country.name IN {{countries}} AND flight.timestamp >= {{startDate}} AND flight.timestamp < {{endDate}}',
+    'WITH poi',
+    'MATCH (poi)-[employment :EMPLOYEE_AT]->(company: `Company` {{name: {{companyName}} }})',
+    'WHERE employment.since < {{activitiesStartPeriod}} OR employment.until > {{activitiesStartPeriod}}',
+    'WITH DISTINCT employment, poi, company',
+    'RETURN poi.name as subjectName, poi.id AS ID, employment.since AS since, employment.until AS until'
+])
+
+
+def show(columns, rows, format=None):
+    """
+    Prints the rows of a result as they're read
+    :param columns: header, printed before the first row
+    :param rows: iterable of rows, e.g. a Cursor
+    :param format: function of a row, to the values printed. Rows are printed as lists, by default
+    :return: number of rows
+    """
+
+    n = 0
+
+    for row in rows:
+
+        if n == 0:
+            print('\t', columns)
+
+        print('\t', format(row) if format else list(row))
+        n += 1
+
+    if n == 0:
+        print('\t', 'No matching patterns found')
+
+    return n
+
+
+def by_period(rows, boundaries):
+    """
+    Splits the result of a per-period statement, ordered by period, as it's read
+    :param rows: rows whose first value is their period, e.g. a Cursor
+    :param boundaries: the `boundaries` parameter of the statement
+    :return: generator of the start, and the end, of each period, as UTC datetimes, and an iterator of its rows,
+    without the period. Periods without rows are included
+    """
+
+    groups = itertools.groupby(rows, key=lambda row: row[0])
+    group = next(groups, None)
+
+    for i in range(0, len(boundaries) - 1):
+
+        start = datetime.datetime.fromtimestamp(boundaries[i], tz=datetime.timezone.utc)
+        end = datetime.datetime.fromtimestamp(boundaries[i + 1], tz=datetime.timezone.utc)
+
+        if group is not None and group[0] == i:
+            yield start, end, (row[1:] for row in group[1])
+            group = next(groups, None)
+        else:
+            yield start, end, iter(())
+
+
+def representative(rs, number):
+    """
+    :param rs: Columns of a pattern evaluated for every number called, see `forensics.callgraph`
+    :param number: the representative's phone number
+    :return: Columns of the representative's rows, without the number
+    """
+
+    print('\t', 'Evaluated for {0} numbers called'.format(len(set(rs['representative'].tolist()))))
+
+    rs = rs.take(rs['representative'] == number)
+
+    return results.Columns(rs.names[1:], rs.arrays)
+
+
 def patterns():
 
     for k, v in PATTERNS.items():
@@ -34,44 +171,22 @@ def one():
 
     print(msg)
 
-    statements = [
-        'MATCH (person :`Person`)-[:TOOK]->(flight :`Flight`)-[:TO]-(:`City`)-[:IN]->(country :`Country`)',
-        'WHERE flight.timestamp >= {{startDate}} AND flight.timestamp < {{endDate}}',
-        'WITH person.name AS person, COUNT(flight) AS n, country.name AS destination',
-        'WHERE n > {{count}}',
-        'RETURN person, n, destination',
-        'ORDER BY n DESC',
-        'LIMIT {{limit}}'
-    ]
+    print(ONE)
 
-    statement = '\n'.join(statements).format()
+    boundaries = months(datetime.datetime(2014, 1, 1), datetime.datetime(2014, 6, 30))
 
-    print(statement)
+    params = {
+        'startDate': boundaries[0],
+        'endDate': boundaries[-1],
+        'count': 1,
+        'limit': 20
+    }
 
-    start_date = datetime.datetime(2014, 1, 1)
-    end_date = datetime.datetime(2014, 6, 30)
-
-    params = [
-        neo4j.Parameter('startDate', start_date.timestamp()),
-        neo4j.Parameter('endDate',  end_date.timestamp()),
-        neo4j.Parameter('count',  1),
-        neo4j.Parameter('limit',  20)
-    ]
-
-    query = neo4j.Query(statement, params)
+    query = neo4j.Query(ONE, params)
 
     start = time.time()*1000
 
-    with neo4j.Transaction() as tx:
-
-        rs = tx.execute(query)
-
-        if rs:
-            print('\t', ['Person', 'No. Flights', 'Destination'])
-            for row in rs:
-                print('\t', row)
-        else:
-            print('\t', 'No matching patterns found')
+    show(['Person', 'No. Flights', 'Destination'], cache.get_cache().stream(query))
 
     end = time.time()*1000
 
@@ -84,108 +199,65 @@ def two():
     msg = PATTERNS[2]
     print(msg)
 
-    statements = [
-        'MATCH (person :`Person`)-[:TOOK]->(flight :`Flight`)-[:TO]-(:`City`)-[:IN]->(country :`Country`)',
-        'WHERE flight.timestamp >= {{startDate}} AND flight.timestamp < {{endDate}}',
-        'WITH person.name AS person, COUNT(flight) AS n, country.name AS destination',
-        'WHERE n > {{count}}',
-        'RETURN person, n, destination'
-    ]
-
-    statement = '\n'.join(statements).format()
+    print(TWO)
 
-    print(statement)
+    params = {
+        'boundaries': months(datetime.datetime(2014, 1, 1), datetime.datetime(2014, 8, 31)),
+        'count': 1
+    }
 
-    queries = []
-    start_date = datetime.datetime(2014, 8, 1)
-    end_date = datetime.datetime(2014, 8, 31)
-
-    for i in reversed(range(0, 8)):
-
-        params = [
-            neo4j.Parameter('startDate', (start_date - datetime.timedelta(days=30*i)).timestamp()),
-            neo4j.Parameter('endDate',  (end_date - datetime.timedelta(days=30*i)).timestamp()),
-            neo4j.Parameter('count', 1)
-        ]
-
-        query = neo4j.Query(statement, params)
-        queries.append(query)
+    query = neo4j.Query(TWO, params)
 
     start = time.time()*1000
 
-    with neo4j.BatchTransaction() as tx:
-
-        for query in queries:
-            tx.append(query)
-
-        resultsets = tx.execute()
-
-        for rs, query in zip(resultsets, queries):
+    # the window is scanned once, and each month's rollups summed; months arrive in order
+    for month, next_month, rs in by_period(cache.get_cache().stream(query), params['boundaries']):
 
-            print(
-                'Between',
-                datetime.datetime.fromtimestamp(query.params[0].value).strftime('%Y-%m-%d'),
-                'and',
-                datetime.datetime.fromtimestamp(query.params[1].value).strftime('%Y-%m-%d'),
-            )
+        print(
+            'Between',
+            month.strftime('%Y-%m-%d'),
+            'and',
+            (next_month - datetime.timedelta(days=1)).strftime('%Y-%m-%d'),
+        )
 
-            if rs:
-                print('\t', ['Person', 'No. Flights', 'Destination'])
-                for row in rs:
-                    print('\t', row)
-            else:
-                print('\t', 'No matching patterns found')
+        show(['Person', 'No. Flights', 'Destination'], rs)
 
     end = time.time()*1000
 
     print('Took {0:.2f}ms'.format(end-start))
 
 
-def three():
+def three(snapshot=None):
 
     # find a phone number that has made calls on between 6pm and 10pm to the representative
     msg = PATTERNS[3]
     print(msg)
 
-    statements = [
-        'MATCH (poi)<-[:REGISTERED_TO]-(poiPhone :`PhoneNumber`)-[call :CONTACTED]->'
-        '(repPhone :`PhoneNumber` {{number: {{repNumber}}}})',
-        'WHERE call.weekday = {{weekday}}',
-        'RETURN poi.name AS subjectName, COUNT(call) AS numberOfCalls'
-    ]
-    #  AND call.hour >= {{startInterval}} AND call.hour <= {{endInterval}}
-
-    statement = '\n'.join(statements).format()
-
-    print(statement)
+    print(THREE)
 
     query = neo4j.Query(
-        statement,
-        [
-            neo4j.Parameter('repNumber', '+911-123-987-468'),
-            neo4j.Parameter('weekday', 2)
-        ]
+        THREE,
+        {
+            'repNumber': '+911-123-987-468',
+            'weekday': 2
+        }
     )
 
     start = time.time()*1000
 
-    with neo4j.Transaction() as tx:
-
-        rs = tx.execute(query)
-
-        if rs:
-            print('\t', ['Subject\'s Name', 'No. Calls'])
-            for row in rs:
-                print('\t', row)
-        else:
-            print('\t', 'No matching patterns found')
+    if snapshot is not None:
+        # every number called is evaluated at once, and the representative's rows are shown
+        rs = callgraph.three(snapshot, query.params['weekday'])
+        show(['Subject\'s Name', 'No. Calls'], representative(rs, query.params['repNumber']).rows())
+    else:
+        show(['Subject\'s Name', 'No. Calls'], cache.get_cache().stream(query))
 
     end = time.time()*1000
 
     print('Took {0:.2f}ms'.format(end-start))
 
 
-def four():
+def four(snapshot=None):
 
     # among the people that called the representative, find those that have flown in or out of
     # one of enterprise XYZ offices in Japan, or the UK
@@ -193,112 +265,86 @@ def four():
 
     print(msg)
 
-    statements = [
-        'MATCH (poi :`Person`)<-[:REGISTERED_TO]-(poiPhone :`PhoneNumber`)-[call :CONTACTED]->'
-        '(repPhone :`PhoneNumber` {{number: {{repNumber}}}})',
-        'WHERE call.weekday = {{weekday}}',
-        'WITH poi, COUNT(call) AS numberOfCalls',
-        'MATCH (poi)-[:TOOK]->(flight :`Flight`)-[:TO]-(:`City`)-[:IN]->(country :`Country`)',
-        'WHERE country.name IN {{countries}} AND flight.timestamp >= {{startDate}} AND flight.timestamp < {{endDate}}',
-        'RETURN poi.name as subjectName, poi.id AS ID, COUNT(flight) AS flights, country.name AS country'
-    ]
-
-    statement = '\n'.join(statements).format()
-
-    print(statement)
+    print(FOUR)
 
     query = neo4j.Query(
-        statement,
-        [
-            neo4j.Parameter('repNumber', '+911-123-987-468'),
-            neo4j.Parameter('weekday', 2),
-            neo4j.Parameter('countries', ['Japan', 'UK']),
-            neo4j.Parameter('startDate', datetime.datetime(2014, 1, 1).timestamp()),
-            neo4j.Parameter('endDate', datetime.datetime(2014, 12, 31).timestamp())
-        ]
+        FOUR,
+        {
+            'repNumber': '+911-123-987-468',
+            'weekday': 2,
+            'countries': ['Japan', 'UK'],
+            'startDate': datetime.datetime(2014, 1, 1).timestamp(),
+            'endDate': datetime.datetime(2014, 12, 31).timestamp()
+        }
     )
 
     start = time.time()*1000
 
-    with neo4j.Transaction() as tx:
-
-        rs = tx.execute(query)
-
-        if rs:
-            print('\t', ['Name', 'ID', 'No. of Flights'])
-            for row in rs:
-                print('\t', row)
-        else:
-            print('\t', 'No matching patterns found')
+    if snapshot is not None:
+        params = query.params
+        rs = callgraph.four(snapshot, params['weekday'], params['countries'], params['startDate'], params['endDate'])
+        show(['Name', 'ID', 'No. of Flights'], representative(rs, params['repNumber']).rows())
+    else:
+        show(['Name', 'ID', 'No. of Flights'], cache.get_cache().stream(query))
 
     end = time.time()*1000
 
     print('Took {0:.2f}ms'.format(end-start))
 
 
-def five():
+def five(snapshot=None):
 
     msg = PATTERNS[5]
 
     print(msg)
 
-    statements = [
-        'MATCH (poi :`Person`)<-[:REGISTERED_TO]-(poiPhone :`PhoneNumber`)-[call :CONTACTED]->'
-        '(repPhone :`PhoneNumber` {{number: {{repNumber}}}})',
-        'WHERE call.weekday = {{weekday}}',
-        'WITH poi, COUNT(call) AS numberOfCalls',
-        'MATCH (poi)-[:TOOK]->(flight :`Flight`)-[:TO]-(:`City`)-[:IN]->(country :`Country`)'
-        'WHERE country.name IN {{countries}} AND flight.timestamp >= {{startDate}} AND flight.timestamp < {{endDate}}',
-        'WITH poi',
-        'MATCH (poi)-[employment :EMPLOYEE_AT]->(company: `Company` {{name: {{companyName}} }})',
-        'WHERE employment.since < {{activitiesStartPeriod}} OR employment.until > {{activitiesStartPeriod}}',
-        'WITH DISTINCT employment, poi, company',
-        'RETURN poi.name as subjectName, poi.id AS ID, employment.since AS since, employment.until AS until'
-    ]
-
-    statement = '\n'.join(statements).format()
-
-    print(statement)
+    print(FIVE)
 
     query = neo4j.Query(
-        statement,
-        [
-            neo4j.Parameter('repNumber', '+911-123-987-468'),
-            neo4j.Parameter('weekday', 2),
-            neo4j.Parameter('countries', ['Japan', 'UK']),
-            neo4j.Parameter('companyName', 'WT Enterprises'),
-            neo4j.Parameter('startDate', datetime.datetime(2014, 1, 1).timestamp()),
-            neo4j.Parameter('endDate', datetime.datetime(2014, 12, 31).timestamp()),
-            neo4j.Parameter('activitiesStartPeriod', datetime.datetime(2014, 1, 1).timestamp())
-        ]
+        FIVE,
+        {
+            'repNumber': '+911-123-987-468',
+            'weekday': 2,
+            'countries': ['Japan', 'UK'],
+            'companyName': 'WT Enterprises',
+            'startDate': datetime.datetime(2014, 1, 1).timestamp(),
+            'endDate': datetime.datetime(2014, 12, 31).timestamp(),
+            'activitiesStartPeriod': datetime.datetime(2014, 1, 1).timestamp()
+        }
     )
 
     start = time.time()*1000
 
-    with neo4j.Transaction() as tx:
-
-        rs = tx.execute(query)
-
-        if rs:
-            print('\t', ['Name', 'ID', 'Since', 'Until'])
-            for row in rs:
-                print(
-                    '\t',
-                    [
-                        row[0], row[1],
-                        datetime.datetime.fromtimestamp(row[2]).strftime('%Y-%m-%d'),
-                        datetime.datetime.fromtimestamp(row[3]).strftime('%Y-%m-%d')
-                    ]
-                )
-        else:
-            print('\t', 'No matching patterns found')
+    if snapshot is not None:
+        params = query.params
+        rs = representative(
+            callgraph.five(
+                snapshot, params['weekday'], params['countries'], params['startDate'], params['endDate'],
+                params['companyName'], params['activitiesStartPeriod']
+            ),
+            params['repNumber']
+        )
+    else:
+        rs = cache.get_cache().stream(
+            query, types={'since': results.TIMESTAMP, 'until': results.TIMESTAMP}
+        ).fetch_columns()
+
+    # dates are converted a column at a time
+    rows = zip(rs['subjectName'].tolist(), rs['ID'].tolist(), rs.dates('since'), rs.dates('until'))
+
+    show(['Name', 'ID', 'Since', 'Until'], rows)
 
     end = time.time()*1000
 
     print('Took {0:.2f}ms'.format(end-start))
 
 
-def run_analysis(pattern):
+def run_analysis(pattern, snapshot=None):
+    """
+    :param pattern: number of the pattern, or `*` for all of them
+    :param snapshot: CallGraph to evaluate the caller patterns (3, 4 and 5) on, instead of querying the database
+    :return:
+    """
 
     if pattern == str(1):
         one()
@@ -307,17 +353,20 @@ def run_analysis(pattern):
         two()
 
     elif pattern == str(3):
-        three()
+        three(snapshot)
 
     elif pattern == str(4):
-        four()
+        four(snapshot)
 
     elif pattern == str(5):
-        five()
+        five(snapshot)
 
     elif pattern == '*':
-        for step in [one, two, three, four, five]:
-            step()
+        one()
+        two()
+
+        for step in [three, four, five]:
+            step(snapshot)
 
     # TODO: step 6, find current employment of anyone that used to work at WT Enterprises, who contacted the rep
 
@@ -0,0 +1,217 @@
+"""
+Materialized flight rollups: the number of flights of each person to each destination country, per calendar month, as
+`(:Person)-[:FLEW_TO {month, flights}]->(:Country)` relationships, where `month` is the unix timestamp of the start of
+the month, in UTC. Frequency patterns sum the rollups of the months they cover, instead of counting flights.
+
+Rollups are rebuilt from the flights in the database when seeding. Incremental loads only rebuild the rollups of the
+people whose rollups the loaded flights could have changed: those that took one of the flights, before or after it was
+loaded, and those that flew to one of their cities, which may have been placed in another country
+"""
+
+import datetime
+import itertools
+
+from forensics import entities
+from forensics.utils import config, lazy, neo4j
+from forensics.utils.periods import months
+
+aio = lazy.module('forensics.utils.aio')
+
+# people whose rollups are rebuilt per transaction
+BATCH_SIZE = 1000
+
+RANGE = neo4j.statement('rollups.range', [
+    'MATCH (flight :`Flight`)',
+    'RETURN min(flight.timestamp) AS first, max(flight.timestamp) AS last'
+])
+
+PEOPLE = neo4j.statement('rollups.people', [
+    'MATCH (person :`Person`)-[:TOOK]->(:`Flight`)',
+    'RETURN DISTINCT person.id AS id'
+])
+
+# the people that took the flights, now, that flew to the cities, whose country may have changed, and those a flight
+# was taken from by a load, which the flight's statement marks, as they're no longer among its passengers
+AFFECTED = neo4j.statement('rollups.affected', [
+    'UNWIND {{flights}} AS number',
+    'MATCH (:`Flight` {{number: number}})<-[:TOOK]-(person :`Person`)',
+    'RETURN DISTINCT person.id AS id',
+    'UNION',
+    'UNWIND {{cities}} AS name',
+    'MATCH (:`City` {{name: name}})-[:TO]-(:`Flight`)<-[:TOOK]-(person :`Person`)',
+    'RETURN DISTINCT person.id AS id',
+    'UNION',
+    'MATCH (person :`Person`)',
+    'WHERE person.staleRollups = true',
+    'RETURN person.id AS id'
+])
+
+# a database seeded before the rollups existed has flights, but no rollups, and one seeded before their months were
+# in UTC has rollups of other months
+BUILT = neo4j.statement('rollups.built', [
+    'MATCH (:`Person`)-[rollup :FLEW_TO]->(:`Country`)',
+    'RETURN rollup.month AS month',
+    'LIMIT 1'
+])
+
+FLOWN = neo4j.statement('rollups.flown', [
+    'MATCH (:`Person`)-[:TOOK]->(:`Flight`)',
+    'RETURN 1 AS flown',
+    'LIMIT 1'
+])
+
+CLEAR = neo4j.statement('rollups.clear', [
+    'UNWIND {{people}} AS id',
+    'MATCH (person :`Person` {{id: id}})',
+    'REMOVE person.staleRollups',
+    'WITH person',
+    'OPTIONAL MATCH (person)-[rollup :FLEW_TO]->(:`Country`)',
+    'DELETE rollup'
+])
+
+BUILD = neo4j.statement('rollups.build', [
+    'UNWIND {{people}} AS id',
+    'MATCH (person :`Person` {{id: id}})-[:TOOK]->(flight :`Flight`)-[:TO]-(:`City`)-[:IN]->(country :`Country`)',
+    'WHERE flight.timestamp IS NOT NULL',
+    'WITH person, country, '
+    '{{boundaries}}[size([boundary IN {{boundaries}} WHERE boundary <= flight.timestamp]) - 1] AS month',
+    'WITH person, country, month, COUNT(*) AS flights',
+    'MERGE (person)-[rollup :FLEW_TO {{month: month}}]->(country)',
+    'SET rollup.flights = flights'
+])
+
+
+class Tracker(object):
+    """
+    Flight numbers, and cities, of the flights of a dataset, read from the columns of its batches as they're consumed
+    """
+
+    def __init__(self):
+
+        self.flights = set()
+        self.cities = set()
+
+    def track(self, chunks):
+        """
+        :param chunks: iterable of batches, or lists of flights
+        :return: generator of the chunks, as batches
+        """
+
+        for chunk in chunks:
+
+            batch = entities.as_batch(chunk)
+            locations = batch.locations
+
+            self.flights.update(batch.number)
+            self.cities.update(
+                locations[i]['city'] for i in set(batch.departure.tolist()) | set(batch.destination.tolist())
+            )
+
+            yield batch
+
+    def __len__(self):
+        return len(self.flights)
+
+
+def boundaries():
+    """
+    :return: the start of each month with flights, and of the month after the last, in UTC, as unix timestamps
+    """
+
+    first, last = neo4j.run_query(neo4j.Query(RANGE))[0]
+
+    if first is None:
+        return []
+
+    return months(
+        datetime.datetime.fromtimestamp(first, tz=datetime.timezone.utc),
+        datetime.datetime.fromtimestamp(last, tz=datetime.timezone.utc)
+    )
+
+
+def affected(tracker):
+    """
+    :param tracker: Tracker of the flights loaded, once they're written
+    :return: IDs of the people whose rollups the flights could have changed
+    """
+
+    rows = neo4j.run_query(
+        neo4j.Query(AFFECTED, {'flights': sorted(tracker.flights), 'cities': sorted(tracker.cities)})
+    )
+
+    return sorted(set(row[0] for row in rows))
+
+
+def _rebuild(batch, periods):
+    """
+    :param batch: IDs of people
+    :param periods: month boundaries
+    :return: queries rebuilding the rollups of the people, in one transaction
+    """
+
+    queries = [neo4j.Query(CLEAR, {'people': batch})]
+
+    if periods:
+        queries.append(neo4j.Query(BUILD, {'people': batch, 'boundaries': periods}))
+
+    return queries
+
+
+def refresh(people=None, batch_size=BATCH_SIZE, concurrency=None):
+    """
+    Rebuilds the rollups of people, from their flights. The batches of people are independent: over HTTP, up to
+    `concurrency` of them are rebuilt at once, through the asyncio client, rather than a round trip after another
+    :param people: IDs of the people. Everyone that took a flight, if not given
+    :param batch_size: number of people per transaction
+    :param concurrency: number of transactions in flight at once. Defaults to the `concurrency` option in config.ini
+    :return: number of people whose rollups were rebuilt
+    """
+
+    if people is None:
+        people = [row[0] for row in neo4j.run_query(neo4j.Query(PEOPLE))]
+
+    periods = boundaries()
+    people = iter(people)
+    batches = list(iter(lambda: list(itertools.islice(people, batch_size)), []))
+
+    # the asyncio client only talks HTTP, and is only loaded for it
+    http = neo4j.get_pool().transport.name == 'http' and len(batches) > 1
+
+    if http and concurrency is None:
+        concurrency = config.get('neo4j', 'concurrency', type=int, fallback=aio.CONCURRENCY)
+
+    if http and concurrency > 1:
+        aio.run_transactions([_rebuild(batch, periods) for batch in batches], concurrency=concurrency)
+    else:
+        for batch in batches:
+            with neo4j.BatchTransaction() as tx:
+
+                for query in _rebuild(batch, periods):
+                    tx.append(query)
+
+                tx.commit()
+
+    return sum(len(batch) for batch in batches)
+
+
+def ensure():
+    """
+    Builds the rollups of a database seeded before they existed, which has flights, but no rollups, for the frequency
+    patterns to read, and rebuilds those of a database seeded before their months were in UTC
+    :return: number of people whose rollups were built
+    """
+
+    built = neo4j.run_query(neo4j.Query(BUILT))
+
+    if built and built[0][0] in boundaries():
+        return 0
+
+    if not built and not neo4j.run_query(neo4j.Query(FLOWN)):
+        return 0
+
+    if built:
+        print('\t', 'The flight rollups are of months in local time. Rebuilding them in UTC')
+    else:
+        print('\t', 'The database has flights, but no flight rollups. Building them')
+
+    return refresh()
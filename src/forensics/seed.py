@@ -1,16 +1,24 @@
+import argparse
+import collections
 import datetime
+import itertools
 import json
+import multiprocessing
 import os
 import os.path
-import random
+import time
 import uuid
+from concurrent.futures import ProcessPoolExecutor
 
-from faker import Factory
+import numpy as np
 
-from forensics.entities import Person, Employment, PhoneCall, Flight
-from forensics.utils import config, neo4j
+from forensics import columnar, delta, export, generator, loader, rollups, wipe, writer
+from forensics.entities import (Person, Dictionary, PersonBatch, CallBatch, FlightBatch, EmploymentBatch,
+                                as_batch, location_key)
+from forensics.utils import cache, config, lazy, neo4j, standin
 
-fake = Factory.create()
+# faker is only loaded when data is generated
+fake = lazy.Lazy(lambda: lazy.module('faker').Factory.create())
 
 N = {
     'people': 10**3,
@@ -19,235 +27,406 @@ N = {
     'employment': int((10**3)*.88)
 }
 
-# generate timestamp within a year
-timestamp = lambda: datetime.datetime(2014, 12, 31, 11, 59, 59) - datetime.timedelta(
-    hours=random.randint(0, (365+1)*24)
-)
-
 INDEXES = [
-    'CREATE INDEX ON :`Person`(id);',
     'CREATE INDEX ON :`Person`(name);',
     'CREATE INDEX ON :`Person`(sex);',
-    'CREATE INDEX ON :`PhoneNumber`(number);',
-    'CREATE INDEX ON :`Country`(name);',
-    'CREATE INDEX ON :`City`(name);',
-    'CREATE INDEX ON :`Flight`(number);',
-    'CREATE INDEX ON :`Company`(name);'
+    # people whose flight rollups are to be rebuilt, see `forensics.rollups`
+    'CREATE INDEX ON :`Person`(staleRollups);'
+]
+
+# keys nodes are MERGEd on. Concurrent writers MERGE the same phone numbers, cities, countries and companies, and only
+# a uniqueness constraint keeps two transactions from each creating a node that doesn't exist yet
+KEYS = [
+    ('Person', 'id'),
+    ('PhoneNumber', 'number'),
+    ('Country', 'name'),
+    ('City', 'name'),
+    ('Flight', 'number'),
+    ('Company', 'name')
 ]
 
+CONSTRAINT = 'CREATE CONSTRAINT ON (n :`{0}`) ASSERT n.{1} IS UNIQUE;'
+INDEX = 'DROP INDEX ON :`{0}`({1});'
+
+# names the datasets are reported with, as they're written
+STAGES = {
+    'people': 'people',
+    'calls': 'phone activity',
+    'flights': 'flight data',
+    'employment': 'employment data'
+}
+
+# random streams derived from a dataset seed
+STREAMS = {
+    'people': 0,
+    'calls': 1,
+    'flights': 2,
+    'employment': 3,
+    'shared': 4,
+    'poi-calls': 5,
+    'poi-flights': 6,
+    'flight-numbers': 7
+}
+
+
+def sizes(scale=1.0):
+    """
+    :param scale: scale factor applied to the default dataset sizes, in `N`
+    :return: number of random records to generate, per dataset
+    """
+
+    people = max(int(N['people']*scale), 2)
+
+    return {
+        'people': people,
+        'calls': int(N['calls']*scale),
+        'flights': int(N['flights']*scale),
+        'employment': int(people*.88)
+    }
+
+
+def load_locations():
+
+    locations = []
+    with open(os.path.join(config.PROJECT_BASE, 'data/locations.json'), encoding='latin-1') as fp:
+
+        entries = json.load(fp)
+
+        for entry in entries:
+
+            tokens = entry.split(',')
+            city, country = tokens[0], ''.join(tokens[1:])
+
+            locations.append(
+                {
+                    'city': city.strip(),
+                    'country': country.strip()
+                }
+            )
+
+    return locations
+
+
+def random_generator(seed, stream, index=0):
+    """
+    Independent random generators, derived from the dataset seed
+    :param seed: dataset seed
+    :param stream: one of `STREAMS`
+    :param index: shard index
+    :return: numpy random Generator
+    """
+
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(STREAMS[stream], index)))
+
+
+def seed_faker(rng):
+
+    fake.seed(int(rng.integers(0, 2**32)))
+
+
+def random_uuid(rng):
+
+    return str(uuid.UUID(bytes=rng.bytes(16), version=4))
+
+
+def _shard_range(context, dataset, index):
+
+    start = index*context['chunk_size']
+
+    return min(context['chunk_size'], context['sizes'][dataset] - start)
+
+
+def _people_shard(context, index):
+
+    rng = random_generator(context['seed'], 'people', index)
+    seed_faker(rng)
+
+    ids, names, sexes, numbers = [], [], [], []
+
+    for _ in range(0, _shard_range(context, 'people', index)):
+
+        profile = fake.simple_profile()
+
+        ids.append(random_uuid(rng))
+        names.append(profile['name'])
+        sexes.append(profile['sex'])
+        numbers.append(fake.phone_number())
+
+    return PersonBatch(id=ids, name=names, sex=sexes, number=numbers)
+
+
+# shards of the other datasets only draw positions in the dictionaries of people, phone numbers, companies and
+# locations; the dictionaries themselves stay with the consumer
+
+def _employment_shard(context, index):
+
+    rng = random_generator(context['seed'], 'employment', index)
+
+    return generator.employment(
+        rng, _shard_range(context, 'employment', index), context['counts']['people'], context['counts']['companies']
+    )
+
+
+def _calls_shard(context, index):
+
+    rng = random_generator(context['seed'], 'calls', index)
+    size = _shard_range(context, 'calls', index)
+
+    values = generator.calls(rng, size, context['counts']['numbers'])
+
+    # calls are identified by their position in the dataset
+    values['id'] = index*context['chunk_size'] + np.arange(size, dtype=np.int64)
+
+    return values
+
+
+def _flights_shard(context, index):
+
+    rng = random_generator(context['seed'], 'flights', index)
+
+    return generator.flights(
+        rng, _shard_range(context, 'flights', index), context['counts']['passengers'], context['counts']['locations'],
+        start=index*context['chunk_size'], offset=context['flight_numbers']
+    )
+
+
+# context of the shards run by a worker process
+_context = None
+
+
+def _initialize_worker(context):
+
+    global _context
+    _context = context
+
+
+def _run_shard(function, index):
+
+    return function(_context, index)
+
+
+def shards(function, context, dataset, processes=1):
+    """
+    Runs a dataset's shards, in order. With more than one process, shards are run by a pool of processes,
+    a bounded number of shards ahead of the consumer
+    :param function: shard function, taking the context and the shard's index
+    :param context: dict of sizes, chunk size, seed and the data shared by the shards
+    :param dataset: name of the dataset
+    :param processes: number of worker processes
+    :return: generator of shard results
+    """
+
+    count = -(-context['sizes'][dataset] // context['chunk_size'])
+
+    if processes <= 1:
+        for index in range(0, count):
+            yield function(context, index)
+        return
+
+    # shards are consumed by the writer's threads, and forking a process that runs threads can copy locks they hold
+    mp_context = multiprocessing.get_context('forkserver')
+
+    with ProcessPoolExecutor(
+        max_workers=processes, mp_context=mp_context, initializer=_initialize_worker, initargs=(context,)
+    ) as executor:
+
+        pending = collections.deque()
 
-def timestamp_in_weekday(weekday):
+        for index in range(0, count):
 
-    tmstp = timestamp()
+            pending.append(executor.submit(_run_shard, function, index))
 
-    while tmstp.weekday() != weekday:
-        tmstp = timestamp()
+            if len(pending) >= 2*processes:
+                yield pending.popleft().result()
 
-    return tmstp
+        while pending:
+            yield pending.popleft().result()
 
 
-def generate_data():
+def stream_data(scale=1.0, chunk_size=writer.BATCH_SIZE, seed=None, processes=1):
+    """
+    Generates random data, along with the data of the people of interest, lazily, as batches of records.
+    People are generated up front, every other record is generated as it's consumed. Phone numbers, people's IDs,
+    companies and locations are interned in dictionaries shared by all batches.
+
+    Each dataset is split into shards of `chunk_size` records, and each shard draws its random values from its own
+    generator, seeded from the dataset seed and the shard's index. For a given seed, scale and chunk size, the data
+    is the same regardless of the number of processes generating it
+    :param scale: scale factor applied to the default dataset sizes
+    :param chunk_size: maximum number of records per chunk
+    :param seed: dataset seed. A random one is picked, if not given
+    :param processes: number of worker processes generating shards
+    :return: dict of generators of batches, for people, calls, flights and employment. Each generator
+    can be consumed independently
+    """
+
+    if seed is None:
+        seed = np.random.SeedSequence().entropy % 2**63
+
+    print('\tDataset seed: {0}'.format(seed))
+
+    context = {
+        'seed': seed,
+        'sizes': sizes(scale),
+        'chunk_size': chunk_size,
+        'flight_numbers': int(random_generator(seed, 'flight-numbers').integers(0, generator.FLIGHT_NUMBERS))
+    }
 
     # people
+    population = list(shards(_people_shard, context, 'people', processes))
 
-    people = [
-        Person(
-            id=str(uuid.uuid4()),
-            name=profile['name'],
-            sex=profile['sex'],
-            number=fake.phone_number()
-        ) for profile in [fake.simple_profile() for _ in range(0, N['people'])]
-    ]
+    rng = random_generator(seed, 'shared')
+    seed_faker(rng)
 
     # other random folk
-    random_folk = random.sample(people, 2)
+    random_folk = rng.choice(context['sizes']['people'], size=2, replace=False).tolist()
 
     # companies
-    companies = [
+    companies = Dictionary(
         fake.company() for _ in range(0, (10**2)*2)
-    ]
-
-    companies.extend(
-        ['WT Enterprises', 'Enterprise XYZ']
     )
 
-    # employment
-    employment = [
-        Employment(
-            person=random.sample(people, 1)[0].id,
-            company=random.sample(companies, 1)[0],
-            since=tmstmp.timestamp(),
-            until=(tmstmp + datetime.timedelta(days=random.randint(90, 3650))).timestamp() if random.randint(0,
-                                                                                                             1) else -1
-        ) for tmstmp in map(lambda _: (
-            datetime.datetime(2014, 12, 31, 11, 59, 59) - datetime.timedelta(
-                hours=random.randint(0, (10 * 365 + 1) * 24))
-        ), range(0, N['employment']))
-    ]
+    wt_enterprises = companies.intern('WT Enterprises')
+    enterprise_xyz = companies.intern('Enterprise XYZ')
 
     # data of people of interest
     representative = Person(
-        id=str(uuid.uuid4()),
+        id=random_uuid(rng),
         name='Adi Segan',
         sex='F',
         number='+911-123-987-468'
     )
 
     seller = Person(
-        id=str(uuid.uuid4()),
+        id=random_uuid(rng),
         name='Kiran Trope',
         sex='M',
         number='+502-987-123-753'
     )
 
-    people.extend(
-        [representative, seller]
-    )
+    # POIs are among the people making and receiving random calls, and taking random flights.
+    # They follow the random people in the dictionaries
+    people = Dictionary(id for batch in population for id in batch.id)
+    numbers = Dictionary(number for batch in population for number in batch.number)
 
-    # employment of POI: first worked at WT Enterprises, and then quit and later in 2014 joined Enterprise XYZ
-    employment.extend(
-        [
-            Employment(
-                person=seller.id,
-                company='WT Enterprises',
-                since=datetime.datetime(2013, 7, 1).timestamp(),
-                until=datetime.datetime(2014, 9, 30).timestamp()
-            ),
-            Employment(
-                person=seller.id,
-                company='Enterprise XYZ',
-                since=datetime.datetime(2014, 11, 1).timestamp(),
-                until=-1
-            )
-        ]
-    )
+    poi = {
+        'representative': len(people),
+        'seller': len(people) + 1
+    }
 
-    # phone activity
-    phone_activity = [
-        PhoneCall(
-            source=random.sample(people, 1)[0].number,
-            target=random.sample(people, 1)[0].number,
-            weekday=tmstmp.weekday(),
-            hour=tmstmp.hour,
-            timestamp=tmstmp.timestamp()
-        ) for tmstmp in map(lambda _: timestamp(), range(0, N['calls']))
-    ]
+    people.values.extend([representative.id, seller.id])
+    numbers.values.extend([representative.number, seller.number])
 
-    # POI phone calls source, target
-    phone_activity.extend(
-        [
-            PhoneCall(
-                source=seller.number,
-                target=representative.number,
-                weekday=tmstmp.weekday(),
-                hour=tmstmp.hour,
-                timestamp=tmstmp.timestamp()
-            ) for tmstmp in map(lambda _: timestamp_in_weekday(2), range(0, 17))
-        ]
-    )
+    locations = Dictionary(load_locations(), key=location_key)
 
-    phone_activity.extend(
-        [
-            PhoneCall(
-                source=folk.number,
-                target=representative.number,
-                weekday=tmstmp.weekday(),
-                hour=tmstmp.hour,
-                timestamp=tmstmp.timestamp()
-            ) for tmstmp, folk in map(lambda folk: (timestamp_in_weekday(2), folk), random_folk)
-        ]
-    )
+    context['counts'] = {
+        'people': context['sizes']['people'],
+        'passengers': len(people),
+        'numbers': len(numbers),
+        'companies': len(companies),
+        'locations': len(locations)
+    }
 
-    # locations
-    locations = []
-    with open(os.path.join(config.PROJECT_BASE, 'data/locations.json'), encoding='latin-1') as fp:
+    def people_data():
 
-        entries = json.load(fp)
+        for batch in population:
+            yield batch
 
-        for entry in entries:
+        yield PersonBatch.from_entities([representative, seller])
 
-            tokens = entry.split(',')
-            city, country = tokens[0], ''.join(tokens[1:])
+    def employment():
 
-            locations.append(
-                {
-                    'city': city.strip(),
-                    'country': country.strip()
-                }
-            )
+        for values in shards(_employment_shard, context, 'employment', processes):
+            yield EmploymentBatch(people=people, companies=companies, **values)
 
-    # flights
+        # employment of POI: first worked at WT Enterprises, and then quit and later in 2014 joined Enterprise XYZ
+        yield EmploymentBatch(
+            people=people,
+            companies=companies,
+            person=np.array([poi['seller'], poi['seller']]),
+            company=np.array([wt_enterprises, enterprise_xyz]),
+            since=np.array([datetime.datetime(2013, 7, 1).timestamp(), datetime.datetime(2014, 11, 1).timestamp()]),
+            until=np.array([datetime.datetime(2014, 9, 30).timestamp(), -1])
+        )
 
-    flight_activity = []
-    for _ in range(0, N['flights']):
+    def phone_activity():
 
-        departure = random.sample(locations, 1)[0]
-        destination = random.sample(locations, 1)[0]
-        while departure == destination:
-            destination = random.sample(locations, 1)[0]
+        for values in shards(_calls_shard, context, 'calls', processes):
+            yield CallBatch(numbers=numbers, **values)
 
-        flight_activity.append(
-            Flight(
-                number=fake.ssn(),
-                timestamp=timestamp().timestamp(),
-                departure=departure,
-                destination=destination,
-                person=random.sample(people, 1)[0].id
-            )
+        rng = random_generator(seed, 'poi-calls')
+
+        # POI phone calls source, target, on Wednesdays
+        sources = np.array([poi['seller']]*17 + random_folk)
+        values = generator.calls_in_weekday(rng, 2, len(sources))
+
+        yield CallBatch(
+            numbers=numbers,
+            id=context['sizes']['calls'] + np.arange(len(sources), dtype=np.int64),
+            source=sources,
+            target=np.full(len(sources), poi['representative']),
+            **values
         )
 
-    # flight data of POI
-    flight_activity.extend(
-        [
-            Flight(
-                number=fake.ssn(),
-                timestamp=timestamp().timestamp(),
-                departure={
-                    'country': 'United States',
-                    'city': 'Arizona',
-                },
-                destination={
-                    'country': 'Japan',
-                    'city': 'Ôsaka',
-                },
-                person=seller.id
-            ) for _ in range(0, 3)
-        ]
-    )
+    def flight_activity():
 
-    # bogus data of someone else that was in contact with the rep of Enterprise XYZ and flew there, but doesn't work at
-    # WT Enterprises
-
-    flight_activity.extend(
-        [
-            Flight(
-                number=fake.ssn(),
-                timestamp=timestamp().timestamp(),
-                departure=random.sample(locations, 1)[0],
-                destination={
-                    'country': 'Japan',
-                    'city': 'Ôsaka',
-                },
-                person=random.sample(people, 1)[0].id
-            ) for _ in range(0, 2)
-        ]
-    )
+        for values in shards(_flights_shard, context, 'flights', processes):
+            yield FlightBatch(people=people, locations=locations, **values)
 
-    # random folk flights
-    flight_activity.extend(
-        [
-            Flight(
-                number=fake.ssn(),
-                timestamp=timestamp().timestamp(),
-                departure=random.sample(locations, 1)[0],
-                destination={
-                    'country': 'Japan',
-                    'city': 'Ôsaka',
-                },
-                person=folk.id
-            ) for folk in random_folk
-        ]
-    )
+        rng = random_generator(seed, 'poi-flights')
+
+        # flight data of POI, to Japan
+        persons = [poi['seller']]*3
+
+        # bogus data of someone else that was in contact with the rep of Enterprise XYZ and flew there, but doesn't
+        # work at WT Enterprises
+        persons.extend(rng.integers(0, len(people), size=2).tolist())
+
+        # random folk flights
+        persons.extend(random_folk)
+
+        arizona = locations.intern({'country': 'United States', 'city': 'Arizona'})
+        osaka = locations.intern({'country': 'Japan', 'city': 'Ôsaka'})
+
+        departures = [arizona]*3 + rng.integers(0, context['counts']['locations'], size=4).tolist()
+
+        yield FlightBatch(
+            people=people,
+            locations=locations,
+            person=np.array(persons),
+            departure=np.array(departures),
+            destination=np.full(len(persons), osaka),
+            number=generator.flight_numbers(
+                context['sizes']['flights'] + np.arange(len(persons)), context['flight_numbers']
+            ),
+            timestamp=generator.local_time.timestamps(generator.times(rng, len(persons)))
+        )
+
+    return {
+        'people': people_data(),
+        'calls': phone_activity(),
+        'flights': flight_activity(),
+        'employment': employment()
+    }
+
+
+def records(chunks):
+    """
+    :param chunks: iterable of batches, or lists of records, e.g. a generator from `stream_data`
+    :return: generator of records
+    """
+
+    return itertools.chain.from_iterable(chunks)
+
+
+def generate_data(scale=1.0, seed=None, processes=1):
+
+    data = stream_data(scale, seed=seed, processes=processes)
+
+    people = list(records(data['people']))
+    phone_activity = list(records(data['calls']))
+    flight_activity = list(records(data['flights']))
+    employment = list(records(data['employment']))
 
     print('Generated data...')
     print('\t# People:', len(people))
@@ -258,114 +437,295 @@ def generate_data():
     return people, phone_activity, flight_activity, employment
 
 
-def clean_database():
+def generation_options(scale=None, rng_seed=None, processes=None):
+    """
+    :param scale: scale factor of the datasets. Defaults to the `scale` option in config.ini
+    :param rng_seed: dataset seed. Defaults to the `rng_seed` option in config.ini, if any
+    :param processes: number of processes generating data. Defaults to the `processes` option in config.ini
+    :return: keyword arguments of `stream_data`
+    """
 
-    # with neo4j.BatchTransaction() as tx:
-    statements = ['MATCH (n)',
-                  'WITH n',
-                  'LIMIT {limit}',
-                  'OPTIONAL MATCH (n)-[r]-(x)',
-                  'DELETE r, n']
+    return {
+        'scale': config.get('seed', 'scale', type=float, fallback=1.0) if scale is None else scale,
+        'seed': config.get('seed', 'rng_seed', type=int, fallback=None) if rng_seed is None else rng_seed,
+        'processes': config.get('seed', 'processes', type=int, fallback=1) if processes is None else processes
+    }
 
-    query = neo4j.Query('\n'.join(statements), [neo4j.Parameter('limit', 10000)])
 
-    tx = neo4j.Transaction()
-    while tx.execute(query):
-        tx = neo4j.Transaction()
+def create_schema():
+    """
+    Creates the indexes, and the uniqueness constraints of the keys nodes are MERGEd on
+    :return:
+    """
 
-    tx.execute(query)
-    tx.commit()
+    for label, key in KEYS:
 
-    statements = ['MATCH (n)',
-                  'WITH n',
-                  'LIMIT {limit}',
-                  'DELETE n']
+        # a constraint can't be created over a plain index of the same key, as earlier seeds created
+        try:
+            neo4j.run_query(neo4j.Query(INDEX.format(label, key)))
+        except neo4j.TransactionError:
+            pass
 
-    query = neo4j.Query('\n'.join(statements), [neo4j.Parameter('limit', 10000)])
+    with neo4j.BatchTransaction() as tx:
 
-    tx = neo4j.Transaction()
-    while tx.execute(query):
-        tx = neo4j.Transaction()
-    tx.commit()
+        for index in INDEXES:
+            tx.append(neo4j.Query(index))
 
+        for label, key in KEYS:
+            tx.append(neo4j.Query(CONSTRAINT.format(label, key)))
 
-def seed():
+        tx.commit()
 
-    def run_transaction(dataset):
 
-        limit = 5000
-        c = 0
-        with neo4j.BatchTransaction() as tx:
-            for instance in dataset:
-                tx.append(instance.cypher())
+def seed(bulk=True, workers=None, scale=None, rng_seed=None, processes=None, load=None, wipe_mode=None,
+         incremental=False, keep_manifest=None):
+    """
+    Empties the database, and seeds it with new random data, or with data dumped to data/out.
+    Data is generated, or loaded, as it's written. The fingerprints of the records written can be kept in a manifest,
+    so that incremental runs only write records that are new, or changed, since then
+    :param bulk: write each batch as a single UNWIND statement
+    :param workers: number of concurrent writers per dataset. Defaults to the `workers` option in config.ini
+    :param scale: scale factor of the datasets. Defaults to the `scale` option in config.ini
+    :param rng_seed: dataset seed, to reproduce a dataset. Defaults to the `rng_seed` option in config.ini, if any
+    :param processes: number of processes generating data. Defaults to the `processes` option in config.ini
+    :param load: format of the files to load the data from, instead of generating it: columnar, ndjson or json.
+    `auto` picks the format of the files found in data/out
+    :param wipe_mode: how the database is emptied: `delete` or `drop`. Defaults to the `mode` option of the `wipe`
+    section in config.ini
+    :param incremental: keep the database, and only write records that aren't in the manifest
+    :param keep_manifest: fingerprint the records of a full seed, for later incremental ones. Defaults to the
+    `keep_manifest` option in config.ini, or, if not set, to whether there's a manifest already, i.e. whether seeds
+    have been incremental. Incremental seeds always keep it
+    :return:
+    """
+
+    if workers is None:
+        workers = config.get('seed', 'workers', type=int, fallback=1)
+
+    options = generation_options(scale, rng_seed, processes)
+
+    path = config.get('seed', 'manifest', type=str, fallback=os.path.join(config.PROJECT_BASE, 'data', 'manifest.npz'))
+
+    if keep_manifest is None:
+        keep_manifest = config.get('seed', 'keep_manifest', type=bool, fallback=os.path.exists(path))
+
+    manifest = delta.Manifest(path)
+
+    if not (incremental or keep_manifest):
+        # the records of the database are about to be replaced, and won't be fingerprinted
+        manifest.remove()
+        manifest = None
+
+    try:
+        _seed(bulk, workers, options, load, wipe_mode, incremental, manifest)
+    finally:
+        # even a partial load changes the data, so cached pattern results aren't used again
+        cache.bump()
+
+
+def _seed(bulk, workers, options, load, wipe_mode, incremental, manifest):
+
+    if incremental:
+        print('Writing records not in the manifest: {0} loaded'.format(len(manifest)))
+    else:
+        # dropping the store also drops its indexes, so they're created afterwards
+        print('Emptying database')
+        wipe.wipe(mode=wipe_mode)
+
+        if manifest is not None:
+            manifest.clear()
 
-                c += 1
+    # index database
+    print('Creating db indexes')
+    create_schema()
 
-                if c % limit == 0:
-                    tx.execute()
+    if load:
+        data = loader.load_data(
+            os.path.join(config.PROJECT_BASE, 'data', 'out'), format=None if load == 'auto' else load,
+            processes=options['processes']
+        )
+    else:
+        # generate random data
+        print('Generating random data, scale {0}: {1}'.format(options['scale'], sizes(options['scale'])))
+        data = stream_data(**options)
+
+    counters = dict((name, delta.Counter()) for name in data)
+    data = dict((name, delta.select(name, data[name], manifest, counters[name])) for name in data)
+
+    # incremental loads only rebuild the rollups of the people the flights written may have changed
+    tracker = rollups.Tracker()
+
+    if incremental:
+        data['flights'] = tracker.track(data['flights'])
+
+    # phone calls only touch phone numbers, and flights only people, flights and places,
+    # so they can be written at the same time
+    stages = [
+        [(STAGES['people'], data['people'])],
+        [(STAGES['calls'], data['calls']), (STAGES['flights'], data['flights'])],
+        [(STAGES['employment'], data['employment'])]
+    ]
 
-            if c % limit != 0:
-                tx.execute()
+    failed = writer.write_stages(stages, bulk=bulk, workers=workers)
+
+    # rows that couldn't be written are left out of the manifest, so that the next incremental seed retries them
+    if manifest is not None:
+        for name, label in STAGES.items():
+            manifest.discard(name, [row for row, _ in failed.get(label, [])])
+
+    print('Rebuilding flight rollups')
+    people = rollups.refresh(rollups.affected(tracker) if incremental else None)
+    print('\t# People: {0}'.format(people))
+
+    # records only make it to the manifest once every stage is written, and the rollups rebuilt
+    if manifest is not None:
+        manifest.save()
+
+    for name, counter in counters.items():
+        print('\t# {0}: {1} new or changed, of {2}'.format(name.capitalize(), counter.selected, counter.seen))
+
+
+def seed_memory(data=None, scale=None, rng_seed=None, processes=None, load=None):
+    """
+    Loads data into the process' in-memory graph (see `forensics.utils.standin`) directly, rather than through
+    statements, and sends the process' queries to it, over the `local` transport. The patterns then run as traversals
+    of the graph's adjacency indexes, with the results of their Cypher
+    :param data: dict of iterables of batches, or of lists of records, per dataset, as returned by `stream_data`, or
+    the lists of `generate_data`, each as a single chunk. Generated, or loaded, if not given
+    :param scale: scale factor of the datasets. Defaults to the `scale` option in config.ini
+    :param rng_seed: dataset seed, to reproduce a dataset. Defaults to the `rng_seed` option in config.ini, if any
+    :param processes: number of processes generating data. Defaults to the `processes` option in config.ini
+    :param load: format of the files to load the data from, instead of generating it: columnar, ndjson or json.
+    `auto` picks the format of the files found in data/out
+    :return: the database
+    """
+
+    options = generation_options(scale, rng_seed, processes)
+
+    if data is None and load:
+        data = loader.load_data(
+            os.path.join(config.PROJECT_BASE, 'data', 'out'), format=None if load == 'auto' else load,
+            processes=options['processes']
+        )
+    elif data is None:
+        print('Generating random data, scale {0}: {1}'.format(options['scale'], sizes(options['scale'])))
+        data = stream_data(**options)
 
-    # index database
-    print('Creating db indexes')
-    with neo4j.BatchTransaction() as tx:
-        for index in INDEXES:
+    database = standin.get_database()
+    database.drop()
 
-            query = neo4j.Query(index, [])
-            tx.append(query)
+    # people first, so that flights and employment find them, as when seeding
+    for name in ['people', 'calls', 'flights', 'employment']:
 
-        tx.commit()
+        start = time.time()
+        n = database.load(as_batch(chunk) for chunk in data[name] if len(chunk))
 
-    print('Emptying database')
-    clean_database()
+        print('\t# {0}: {1} loaded in {2:.2f}s'.format(name.capitalize(), n, time.time() - start))
 
-    # generate random data
-    print('Generating random data')
-    people, phone_activity, flight_activity, employment_data = generate_data()
+    print('\t# Nodes: {0}'.format(len(database.graph)))
 
-    print('Seeding people')
-    run_transaction(people)
+    neo4j.use_transport('local')
 
-    print('Seeding phone activity')
-    run_transaction(phone_activity)
+    print('\t# Flight rollups of {0} people'.format(rollups.refresh()))
 
-    print('Seeding flight data')
-    run_transaction(flight_activity)
+    cache.bump()
 
-    print('Seeding employment data')
-    run_transaction(employment_data)
+    return database
 
 
-def dump():
+def dump_json(fp, dataset):
+    """
+    Writes records to a JSON array, a batch at a time
+    :param fp: file object
+    :param dataset: iterable of batches, e.g. a generator from `stream_data`
+    :return: number of records written
+    """
 
-    class JSEncoder(json.JSONEncoder):
-        def default(self, o):
-            return o.__dict__
+    c = 0
 
-    people, phone_activity, flight_activity, employment_data = generate_data()
+    fp.write('[')
+
+    for record in itertools.chain.from_iterable(batch.as_dicts() for batch in dataset):
+
+        fp.write(',\n' if c else '\n')
+        fp.write(json.dumps(record, indent=3))
+
+        c += 1
+
+    fp.write('\n]\n')
+
+    return c
+
+
+def dump(scale=None, rng_seed=None, processes=None, format='json'):
+    """
+    Generates random data, and writes it to data/out as it's generated
+    :param scale: scale factor of the datasets. Defaults to config.ini
+    :param rng_seed: dataset seed. Defaults to config.ini, if any
+    :param processes: number of processes generating data. Defaults to config.ini
+    :param format: `json`, a JSON array per dataset; `ndjson`, a JSON record per line; or `csv`, node and relationship
+    files for Neo4j's offline bulk importer, in data/out/import; or `columnar`, memory-mappable column files, in
+    data/out/columnar
+    :return:
+    """
+
+    data = stream_data(**generation_options(scale, rng_seed, processes))
 
     base_dir = os.path.join(config.PROJECT_BASE, 'data', 'out')
 
+    if format == 'ndjson':
+
+        for name, c in export.export_ndjson(data, base_dir).items():
+            print('\t# {0}: {1}'.format(name.capitalize(), c))
+
+        return
+
+    if format == 'columnar':
+
+        for name, c in columnar.write_dataset(data, os.path.join(base_dir, 'columnar')).items():
+            print('\t# {0}: {1}'.format(name.capitalize(), c))
+
+        return
+
+    if format == 'csv':
+
+        csv_export = export.export_csv(data, os.path.join(base_dir, 'import'))
+
+        for name, c in sorted(csv_export.counts.items()):
+            print('\t# {0}: {1}'.format(name, c))
+
+        print('To import the files into an empty database, stop the server and run:\n\t{0}'.format(
+            csv_export.command()
+        ))
+
+        return
+
     if not os.path.exists(base_dir):
         os.makedirs(base_dir)
 
-    with open(os.path.join(base_dir, 'people.json'), 'w') as fp:
+    for name, filename in [('people', 'people.json'), ('calls', 'calls.json'), ('flights', 'flights.json'),
+                           ('employment', 'employment.json')]:
 
-        json.dump(people, fp, indent=3, cls=JSEncoder)
+        with open(os.path.join(base_dir, filename), 'w') as fp:
 
-    with open(os.path.join(base_dir, 'calls.json'), 'w') as fp:
+            c = dump_json(fp, data[name])
 
-        json.dump(phone_activity, fp, indent=3, cls=JSEncoder)
+        print('\t# {0}: {1}'.format(name.capitalize(), c))
 
-    with open(os.path.join(base_dir, 'flights.json'), 'w') as fp:
 
-        json.dump(flight_activity, fp, indent=3, cls=JSEncoder)
+if __name__ == '__main__':
 
-    with open(os.path.join(base_dir, 'employment.json'), 'w') as fp:
+    parser = argparse.ArgumentParser(description='Generate random data files, in data/out')
 
-        json.dump(employment_data, fp, indent=3, cls=JSEncoder)
+    parser.add_argument('--scale', type=float, default=None,
+                        help='Scale factor of the datasets. Defaults to config.ini')
+    parser.add_argument('--rng-seed', type=int, default=None,
+                        help='Dataset seed, to reproduce a dataset. Defaults to config.ini, or a random seed')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='Number of processes generating data. Defaults to config.ini')
+    parser.add_argument('--format', type=str, default='json', choices=['json', 'ndjson', 'csv', 'columnar'],
+                        help='JSON arrays, JSON lines, CSV files for neo4j-admin import, or binary columns')
 
+    args = parser.parse_args()
 
-if __name__ == '__main__':
-    dump()
+    dump(scale=args.scale, rng_seed=args.rng_seed, processes=args.processes, format=args.format)
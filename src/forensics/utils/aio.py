@@ -0,0 +1,427 @@
+"""
+Asyncio client for Neo4j's transactional HTTP endpoint, with an async counterpart of `BatchTransaction`. Requests go
+over pooled keep-alive connections, at most `concurrency` at a time, so that independent transactions, e.g. the
+batches of a rollup rebuild, overlap their round trips rather than wait on each other
+"""
+
+import asyncio
+import base64
+import json
+import ssl
+import urllib.parse
+
+from forensics.utils import neo4j
+
+CONCURRENCY = 8
+TIMEOUT = 300
+
+
+class TransactionError(neo4j.TransactionError):
+    """
+    Failed request: the server's errors, with their codes, or the HTTP status if there are none
+    """
+
+    def __init__(self, status, errors=()):
+
+        self.status = status
+        self.errors = list(errors)
+
+        message = '\n'.join('{0}:\n{1}'.format(error['code'], error['message']) for error in self.errors)
+
+        super(TransactionError, self).__init__(message or 'HTTP status {0}'.format(status))
+
+
+class Response(object):
+
+    def __init__(self, status, headers, body, keep_alive):
+
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.keep_alive = keep_alive
+
+
+class Connection(object):
+    """
+    HTTP/1.1 keep-alive connection
+    """
+
+    def __init__(self, host, port, ssl_context=None, timeout=TIMEOUT):
+
+        self.host = host
+        self.port = port
+        self.ssl_context = ssl_context
+        self.timeout = timeout
+        self.reader = None
+        self.writer = None
+
+    async def open(self):
+
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl_context)
+
+    @property
+    def closed(self):
+        return self.writer is None or self.writer.is_closing()
+
+    def close(self):
+
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def send(self, method, path, headers, body=None):
+
+        lines = ['{0} {1} HTTP/1.1'.format(method, path)]
+        lines.extend('{0}: {1}'.format(k, v) for k, v in headers.items())
+        lines.append('Content-Length: {0}'.format(len(body) if body else 0))
+
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + (body or b''))
+
+    async def _receive(self):
+
+        line = await self.reader.readline()
+
+        if not line:
+            raise ConnectionError('Connection closed by {0}:{1}'.format(self.host, self.port))
+
+        status = int(line.split()[1])
+        headers = {}
+
+        while True:
+
+            line = await self.reader.readline()
+
+            if line in (b'\r\n', b'\n', b''):
+                break
+
+            key, value = line.decode('latin-1').split(':', 1)
+            headers[key.strip().lower()] = value.strip()
+
+        keep_alive = headers.get('connection', '').lower() != 'close'
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+
+            chunks = []
+
+            while True:
+
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+
+                if size == 0:
+                    # trailers
+                    while (await self.reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readexactly(2)
+
+            body = b''.join(chunks)
+
+        elif 'content-length' in headers:
+            body = await self.reader.readexactly(int(headers['content-length']))
+        else:
+            body = await self.reader.read()
+            keep_alive = False
+
+        return Response(status, headers, body, keep_alive)
+
+    async def receive(self):
+
+        return await asyncio.wait_for(self._receive(), self.timeout)
+
+    async def request(self, method, path, headers, body=None):
+
+        self.send(method, path, headers, body)
+        await self.writer.drain()
+
+        return await self.receive()
+
+
+class Pool(object):
+    """
+    Bounded pool of connections to one server. Connections are opened on demand, up to `size`, and kept open
+    """
+
+    def __init__(self, host, port, ssl_context=None, size=CONCURRENCY):
+
+        self.host = host
+        self.port = port
+        self.ssl_context = ssl_context
+        self.size = size
+
+        self._idle = []
+        self._semaphore = asyncio.Semaphore(size)
+
+        self.created = 0
+
+    async def acquire(self):
+
+        await self._semaphore.acquire()
+
+        while self._idle:
+
+            connection = self._idle.pop()
+
+            if not connection.closed:
+                return connection
+
+        connection = Connection(self.host, self.port, self.ssl_context)
+
+        try:
+            await connection.open()
+        except Exception:
+            self._semaphore.release()
+            raise
+
+        self.created += 1
+
+        return connection
+
+    def release(self, connection, reuse=True):
+
+        if reuse and not connection.closed:
+            self._idle.append(connection)
+        else:
+            connection.close()
+
+        self._semaphore.release()
+
+    def close(self):
+
+        for connection in self._idle:
+            connection.close()
+
+        self._idle = []
+
+
+def statements(queries):
+
+    return {
+        'statements': [
+            {'statement': query.statement, 'parameters': query.params, 'resultDataContents': ['row']}
+            for query in queries
+        ]
+    }
+
+
+def rows(content):
+    """
+    :param content: decoded response
+    :return: list of the rows of each statement's result
+    """
+
+    return [[row['row'] for row in result['data']] for result in content['results']]
+
+
+class Client(object):
+    """
+    Client of the transactional endpoint, for use within one event loop
+    """
+
+    def __init__(self, settings=None, concurrency=CONCURRENCY):
+        """
+        :param settings: connection settings. Those of the process' transport, if not given
+        :param concurrency: number of requests in flight at once, and of connections kept open
+        """
+
+        if settings is None:
+            settings = neo4j.get_pool().transport.settings
+
+        host = settings['host']
+        port = int(settings['port'])
+        protocol = settings['protocol']
+
+        credentials = '{0}:{1}'.format(settings['username'], settings['password']).encode('utf-8')
+
+        self.base = '/{0}/transaction'.format(settings['endpoint'].strip('/'))
+        self.headers = {
+            'Host': '{0}:{1}'.format(host, port),
+            'Authorization': 'Basic {0}'.format(base64.b64encode(credentials).decode('ascii')),
+            'Accept': 'application/json; charset=UTF-8',
+            'Content-Type': 'application/json',
+            'X-Stream': 'true'
+        }
+
+        self.pool = Pool(host, port, ssl.create_default_context() if protocol == 'https' else None, concurrency)
+        self.requests = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, type, value, traceback):
+        self.close()
+
+    def close(self):
+        self.pool.close()
+
+    def _body(self, payload):
+
+        return None if payload is None else json.dumps(payload).encode('utf-8')
+
+    def _decode(self, response):
+
+        self.requests += 1
+
+        try:
+            content = json.loads(response.body.decode('utf-8')) if response.body else {}
+        except ValueError:
+            raise TransactionError(response.status)
+
+        if content.get('errors'):
+            raise TransactionError(response.status, content['errors'])
+
+        if response.status not in (200, 201):
+            raise TransactionError(response.status)
+
+        return content
+
+    async def request(self, method, path, payload=None):
+        """
+        :return: decoded response, and the path of the transaction it opened, if any
+        """
+
+        # the pool holds at most `concurrency` connections, so it bounds the requests in flight
+        connection = await self.pool.acquire()
+
+        try:
+            response = await connection.request(method, path, self.headers, self._body(payload))
+        except BaseException:
+            self.pool.release(connection, reuse=False)
+            raise
+
+        self.pool.release(connection, reuse=response.keep_alive)
+
+        location = response.headers.get('location')
+
+        return self._decode(response), urllib.parse.urlparse(location).path if location else None
+
+    def batch_transaction(self, retries=neo4j.RETRIES):
+        return BatchTransaction(self, retries)
+
+
+class BatchTransaction(object):
+    """
+    Batch of queries in a transaction. The transaction is opened by the first request, and committed with the
+    queries still pending, in one request.
+
+    As with `neo4j.BatchTransaction`, transient errors are retried after a jittered backoff, by replaying the
+    transaction's queries in a new transaction
+    """
+
+    def __init__(self, client, retries=neo4j.RETRIES):
+
+        self.client = client
+        self.retries = retries
+        self.path = None
+        self.executed = []
+        self.pending = []
+        self.finished = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, type, value, traceback):
+
+        if value is None:
+            await self.commit()
+        else:
+            await self.rollback()
+
+    def append(self, query):
+
+        assert isinstance(query, neo4j.Query)
+
+        self.pending.append(query)
+
+    async def _run(self, commit):
+
+        pending, self.pending = self.pending, []
+        replayed = []
+        attempt = 0
+
+        while True:
+
+            path = self.path or self.client.base
+
+            try:
+                content, location = await self.client.request(
+                    'POST', path + '/commit' if commit else path, statements(replayed + pending)
+                )
+            except TransactionError as exc:
+
+                # the server rolls the transaction back on any error
+                self.path = None
+
+                if not neo4j.is_transient(exc) or attempt >= self.retries:
+                    self.finished = True
+                    raise
+
+                await asyncio.sleep(neo4j.backoff(attempt))
+                attempt += 1
+
+                replayed = self.executed
+                continue
+
+            if location and not commit:
+                self.path = location
+
+            self.executed = self.executed + pending
+
+            return rows(content)[len(replayed):]
+
+    async def execute(self):
+        """
+        :return: list of the rows of each pending query's result
+        """
+
+        return await self._run(commit=False)
+
+    async def commit(self):
+
+        if self.finished:
+            return
+
+        self.finished = True
+
+        return await self._run(commit=True)
+
+    async def rollback(self):
+
+        if self.finished:
+            return
+
+        self.finished = True
+
+        if self.path is not None:
+            try:
+                await self.client.request('DELETE', self.path)
+            except TransactionError:
+                # the server already rolled back a transaction that failed
+                pass
+
+
+def run_transactions(transactions, concurrency=CONCURRENCY, retries=neo4j.RETRIES):
+    """
+    Runs lists of queries, each list in its own transaction, at most `concurrency` at a time, from blocking code.
+    Transactions that fail with a transient error, e.g. a deadlock between two of them, are retried
+    :param transactions: iterable of lists of Query
+    :param concurrency: number of transactions in flight at once
+    :param retries: attempts of each transaction that fails with a transient error
+    :return: list of the rows of each query's result, per transaction, in order
+    """
+
+    async def commit(client, queries):
+
+        async with client.batch_transaction(retries) as tx:
+
+            for query in queries:
+                tx.append(query)
+
+            return await tx.commit()
+
+    async def run():
+        async with Client(concurrency=concurrency) as client:
+            return await asyncio.gather(*[commit(client, queries) for queries in transactions])
+
+    return asyncio.run(run())
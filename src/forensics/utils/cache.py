@@ -0,0 +1,323 @@
+"""
+Cache of query results, for the pattern layer: results are kept in memory, and, if the `path` option of the `cache`
+section in config.ini is set, as files in that directory, so that they're reused across runs. Both are bounded, and
+evict the least recently used results first. Results of the process' own stand-in database are only kept in memory.
+
+Results are keyed by their statement, with its whitespace normalized, their parameters, the database they came from,
+and the generation of its dataset: a random token kept in the database, on a `Dataset` node, that seeding replaces
+every time it loads data, so that results of earlier data are never reused. Results of a database without one, e.g.
+one that was wiped, or never seeded, aren't cached
+"""
+
+import collections
+import contextlib
+import hashlib
+import json
+import os
+import os.path
+import threading
+import uuid
+
+from forensics.utils import config, neo4j, results
+
+CACHE_SIZE = 256
+DISK_SIZE = 4096
+
+GENERATION = neo4j.statement('cache.generation', [
+    'MATCH (dataset :`Dataset`)',
+    'RETURN dataset.generation AS generation'
+])
+
+BUMP = neo4j.statement('cache.bump', [
+    'MERGE (dataset :`Dataset`)',
+    'SET dataset.generation = {{generation}}',
+    'RETURN dataset.generation AS generation'
+])
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def generation():
+    """
+    :return: generation of the dataset in the database, None if it was never seeded
+    """
+
+    rows = neo4j.run_query(neo4j.Query(GENERATION))
+
+    return rows[0][0] if rows else None
+
+
+def bump():
+    """
+    Moves to a new generation of the dataset, so that results cached until now aren't used again
+    :return: new generation
+    """
+
+    value = uuid.uuid4().hex
+
+    neo4j.run_query(neo4j.Query(BUMP, {'generation': value}))
+
+    return value
+
+
+def database():
+    """
+    :return: URI of the database queries go to
+    """
+
+    return neo4j.get_pool().transport.uri()
+
+
+def normalize(statement):
+    """
+    :return: the statement, with each run of whitespace replaced by a single space
+    """
+
+    return ' '.join(statement.split())
+
+
+class ResultCache(object):
+    """
+    Bounded LRU cache of results, in memory, and on disk if a directory is given. Results are only cached once they've
+    been read whole
+    """
+
+    def __init__(self, size=CACHE_SIZE, path=None, disk_size=DISK_SIZE):
+        """
+        :param size: number of results kept in memory
+        :param path: directory results are also kept in, as JSON files. Memory only, if not given
+        :param disk_size: number of results kept on disk
+        """
+
+        self.size = size
+        self.path = path
+        self.disk_size = disk_size
+        self.enabled = True
+
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+
+    def key(self, query):
+        """
+        :param query: Query
+        :return: key of the query's result, for the database, and the current generation of its dataset. None, if
+        the database has no generation
+        """
+
+        current = generation()
+
+        if current is None:
+            return None
+
+        text = json.dumps([normalize(query.statement), query.params, database(), current], sort_keys=True, default=str)
+
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def _file(self, key):
+        return os.path.join(self.path, key + '.json')
+
+    def _persistent(self):
+
+        # results of the process' own database don't outlive it
+        return self.path is not None and neo4j.get_pool().transport.name != 'local'
+
+    def get(self, key):
+        """
+        :param key: key of a result
+        :return: (columns, rows) of the result, or None if it isn't cached
+        """
+
+        with self._lock:
+
+            entry = self._entries.get(key)
+
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        if self._persistent():
+
+            try:
+                with open(self._file(key), 'r') as fp:
+                    content = json.load(fp)
+            except (FileNotFoundError, ValueError):
+                pass
+            else:
+                # read files are the most recently used
+                with contextlib.suppress(FileNotFoundError):
+                    os.utime(self._file(key))
+
+                entry = content['columns'], content['rows']
+
+                with self._lock:
+                    self.disk_hits += 1
+                    self._remember(key, entry)
+
+                return entry
+
+        with self._lock:
+            self.misses += 1
+
+        return None
+
+    def _remember(self, key, entry):
+
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def put(self, key, columns, rows):
+        """
+        :param key: key of the result
+        :param columns: names of the result's columns
+        :param rows: list of the result's rows, as lists of values
+        :return:
+        """
+
+        entry = list(columns), rows
+
+        with self._lock:
+            self.stored += 1
+            self._remember(key, entry)
+
+        if not self._persistent():
+            return
+
+        with open(self._file(key) + '.tmp', 'w') as fp:
+            json.dump({'columns': entry[0], 'rows': rows}, fp)
+
+        os.replace(self._file(key) + '.tmp', self._file(key))
+
+        self._trim()
+
+    def _trim(self):
+
+        files = [name for name in os.listdir(self.path) if name.endswith('.json')]
+
+        if len(files) <= self.disk_size:
+            return
+
+        files.sort(key=lambda name: os.path.getmtime(os.path.join(self.path, name)))
+
+        for name in files[:len(files) - self.disk_size]:
+
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(os.path.join(self.path, name))
+
+            with self._lock:
+                self.disk_evictions += 1
+
+    def clear(self):
+
+        with self._lock:
+            self._entries.clear()
+
+        if self.path is not None:
+            for name in os.listdir(self.path):
+                if name.endswith('.json'):
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(os.path.join(self.path, name))
+
+    def _recorded(self, key, cursor, types=None, tx=None):
+        """
+        :param key: key the result is cached with, once its records have all been read. Not cached, if None
+        :param tx: Transaction the result is read in, committed once its records have all been read
+        :return: Cursor over the records of `cursor`
+        """
+
+        def records():
+
+            rows = []
+
+            with tx if tx is not None else contextlib.nullcontext():
+
+                for record in cursor:
+
+                    if key is not None:
+                        rows.append(list(record))
+
+                    yield record
+
+            if key is not None:
+                self.put(key, cursor.columns, rows)
+
+        return results.Cursor(records(), cursor.fetch_size, cursor.columns, types)
+
+    def stream(self, query, fetch_size=None, types=None):
+        """
+        Runs a query in its own transaction, as `neo4j.stream_query`, unless its result is cached
+        :param query: Query
+        :param fetch_size: number of records read at a time
+        :param types: mapping of column names to their types, for `Cursor.fetch_columns`
+        :return: Cursor
+        """
+
+        key = self.key(query) if self.enabled else None
+        entry = self.get(key) if key is not None else None
+
+        if entry is not None:
+            return results.Cursor(entry[1], fetch_size or results.FETCH_SIZE, entry[0], types)
+
+        tx = neo4j.Transaction()
+
+        return self._recorded(key, tx.stream(query, fetch_size, types), types, tx)
+
+    def stats(self):
+
+        current = generation()
+
+        with self._lock:
+            return {
+                'size': self.size,
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'stored': self.stored,
+                'evictions': self.evictions,
+                'disk_evictions': self.disk_evictions,
+                'database': database(),
+                'generation': current
+            }
+
+
+def get_cache():
+    """
+    :return: the process' result cache, created on first use, with the options of the `cache` section in config.ini
+    """
+
+    global _cache
+
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+
+                path = config.get('cache', 'path', type=str, fallback='')
+
+                _cache = ResultCache(
+                    size=config.get('cache', 'size', type=int, fallback=CACHE_SIZE),
+                    path=os.path.join(config.PROJECT_BASE, path) if path else None,
+                    disk_size=config.get('cache', 'disk_size', type=int, fallback=DISK_SIZE)
+                )
+
+    return _cache
+
+
+def cache_stats():
+
+    return get_cache().stats()
@@ -0,0 +1,54 @@
+import importlib
+import threading
+
+
+class Lazy(object):
+    """
+    Proxy to an object that is only created on first use, e.g. a heavy module, or a client.
+    Attribute reads and writes are forwarded to the object
+    """
+
+    def __init__(self, factory):
+
+        object.__setattr__(self, '_factory', factory)
+        object.__setattr__(self, '_target', None)
+        object.__setattr__(self, '_lock', threading.Lock())
+
+    def _load(self):
+
+        target = object.__getattribute__(self, '_target')
+
+        if target is None:
+            with object.__getattribute__(self, '_lock'):
+
+                target = object.__getattribute__(self, '_target')
+
+                if target is None:
+                    target = object.__getattribute__(self, '_factory')()
+                    object.__setattr__(self, '_target', target)
+
+        return target
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._load(), name, value)
+
+    def __repr__(self):
+
+        target = object.__getattribute__(self, '_target')
+
+        if target is None:
+            return 'Lazy(<not loaded>)'
+        else:
+            return 'Lazy({0!r})'.format(target)
+
+
+def module(name):
+    """
+    :param name: fully qualified module name, e.g. `requests`
+    :return: proxy to the module, imported on first attribute access
+    """
+
+    return Lazy(lambda: importlib.import_module(name))
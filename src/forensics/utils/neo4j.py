@@ -1,47 +1,250 @@
+import contextlib
+import random
 import re
+import threading
+import time
 
-from neo4jrestclient.client import GraphDatabase
-from neo4jrestclient import exceptions
-import neo4jrestclient.options
-from forensics.utils import config
+from forensics.utils import config, results, transport
+
+TransactionError = transport.TransactionError
 
 NEO_VAR_NAME_LABEL_REGEX = "^[a-zA-Z_][a-zA-Z0-9_]*$"
 re.compile(NEO_VAR_NAME_LABEL_REGEX)
 
+POOL_SIZE = 32
+POOL_TIMEOUT = 300
+
+# error codes of failures that can succeed if retried
+TRANSIENT_ERRORS = ('Neo.TransientError.',)
+
+RETRIES = 5
+
+# seconds
+BACKOFF = .05
+MAX_BACKOFF = 5.
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# transport the process' queries go over, instead of the one set in config.ini, see `use_transport`
+_transport = None
 
-def get_connection():
+
+class ConnectionPoolError(Exception):
+    pass
+
+
+def is_transient(exc):
     """
-    Creates a connection object to the graph database using py2neo
-    :return: py2neo GraphDatabaseService object
+    :param exc: TransactionError
+    :return: whether the transaction failed with an error the server classifies as transient, e.g. a deadlock,
+    or a lock acquisition timeout, so that it can succeed if retried
     """
 
-    try:
+    return any(code in str(exc) for code in TRANSIENT_ERRORS)
+
 
+def backoff(attempt, base=BACKOFF, cap=MAX_BACKOFF):
+    """
+    :param attempt: number of attempts so far, from 0
+    :return: seconds to wait before the next attempt: random, up to an exponentially growing bound ("full jitter"),
+    so that transactions that deadlocked on each other don't retry in lockstep
+    """
+
+    return random.uniform(0, min(cap, base*2**attempt))
+
+
+def get_connection(neo4j=None):
+    """
+    Creates a connection to the graph database, over the transport set in config.ini
+    :param neo4j: connection settings. Read from config.ini, if not given
+    :return: connection, whose `transaction` method starts a transaction
+    """
+
+    if neo4j is None:
         neo4j = config.get("neo4j")
-    except Exception:
-        raise
 
-    username = neo4j["username"]
-    password = neo4j["password"]
-    host = neo4j["host"]
-    port = int(neo4j["port"])
-    endpoint = neo4j["endpoint"]
-    protocol = neo4j["protocol"]
+        if _transport is not None:
+            neo4j['transport'] = _transport
 
-    try:
+    return transport.get_transport(neo4j).connect()
 
-        uri = "{0}://{1}:{2}/{3}/".format(protocol, host, port, endpoint)
 
-        db_conn = GraphDatabase(uri, username=username, password=password)
+class ConnectionPool(object):
+    """
+    Bounded pool of connections, over the transport set in config.ini. Connections are created on demand, up to
+    `size`, and reused afterwards; the network connections underneath are kept alive between requests.
+    Once every connection is in use, `acquire` waits for one to be released
+    """
 
-        neo4jrestclient.options.URI_REWRITES = {
-            "http://0.0.0.0:7474/": "{0}://{1}:{2}/".format(protocol, host, port)
-        }
+    def __init__(self, size=POOL_SIZE, timeout=POOL_TIMEOUT):
 
-    except exceptions.TransactionException as exc:
-        raise exc
-    else:
-        return db_conn
+        self.size = size
+        self.timeout = timeout
+
+        self._settings = config.get("neo4j")
+
+        if _transport is not None:
+            self._settings['transport'] = _transport
+
+        self.transport = transport.get_transport(self._settings)
+        self.fetch_size = int(self._settings.get('fetch_size', results.FETCH_SIZE))
+        self._idle = []
+        self._condition = threading.Condition()
+
+        self.created = 0
+        self.acquired = 0
+        self.in_use = 0
+        self.peak = 0
+        self.waits = 0
+        self.wait_time = 0.
+
+        self._mount()
+
+    def _mount(self):
+
+        # the transport's own connection pool, if it has one, is sized to ours
+        self.transport.resize(self.size)
+
+    def reserve(self, size):
+        """
+        Grows the pool to at least `size` clients
+        :param size:
+        :return:
+        """
+
+        with self._condition:
+
+            if size > self.size:
+                self.size = size
+                self._mount()
+                self._condition.notify_all()
+
+    def acquire(self):
+
+        with self._condition:
+
+            if self.in_use >= self.size:
+
+                self.waits += 1
+                start = time.time()
+
+                if not self._condition.wait_for(lambda: self.in_use < self.size, timeout=self.timeout):
+                    raise ConnectionPoolError(
+                        'Timed out after {0}s waiting for one of {1} connections'.format(self.timeout, self.size)
+                    )
+
+                self.wait_time += time.time() - start
+
+            self.in_use += 1
+            self.acquired += 1
+            self.peak = max(self.peak, self.in_use)
+
+            if self._idle:
+                return self._idle.pop()
+
+            self.created += 1
+
+        try:
+            return self.transport.connect()
+        except Exception:
+            with self._condition:
+                self.in_use -= 1
+                self.created -= 1
+                self._condition.notify()
+            raise
+
+    def release(self, graph):
+
+        with self._condition:
+
+            self._idle.append(graph)
+            self.in_use -= 1
+            self._condition.notify()
+
+    @contextlib.contextmanager
+    def connection(self):
+
+        graph = self.acquire()
+
+        try:
+            yield graph
+        finally:
+            self.release(graph)
+
+    def transaction(self):
+        """
+        :return: a transaction, on a connection acquired from the pool. The connection is released by
+        `finish_transaction`
+        """
+
+        graph = self.acquire()
+
+        return graph, graph.transaction()
+
+    def finish_transaction(self, graph, tx):
+
+        graph.finish(tx)
+
+        self.release(graph)
+
+    def stats(self):
+
+        with self._condition:
+            return {
+                'transport': self.transport.name,
+                'size': self.size,
+                'created': self.created,
+                'idle': len(self._idle),
+                'in_use': self.in_use,
+                'peak': self.peak,
+                'acquired': self.acquired,
+                'waits': self.waits,
+                'wait_ms': self.wait_time*1000
+            }
+
+
+def get_pool():
+    """
+    :return: the process' connection pool, created on first use. The pool size is read from the `pool_size`
+    option in config.ini
+    """
+
+    global _pool
+
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(size=config.get("neo4j", "pool_size", type=int, fallback=POOL_SIZE))
+
+    return _pool
+
+
+def use_transport(name):
+    """
+    Sends the process' queries over another transport than the one set in config.ini, e.g. `local`, once the
+    in-memory database has been loaded. The pool is replaced, and its connections discarded
+    :param name: transport, one of `transport.TRANSPORTS`
+    :return:
+    """
+
+    global _pool, _transport
+
+    if name not in transport.TRANSPORTS:
+        raise ValueError('Unknown transport: {0}. Expected one of {1}'.format(name, ', '.join(transport.TRANSPORTS)))
+
+    with _pool_lock:
+
+        if _pool is not None:
+            _pool.transport.close()
+
+        _transport = name
+        _pool = None
+
+
+def pool_stats():
+
+    return get_pool().stats()
 
 
 def is_valid_label(label):
@@ -87,14 +290,46 @@ class Parameter(object):
 
 class Query(object):
     """
+    Statement, and its parameters: a mapping of parameter names to values, sent as it is.
+    A list of Parameter is also accepted, and converted once
     """
 
-    def __init__(self, statement, params):
+    __slots__ = ('statement', 'params')
+
+    def __init__(self, statement, params=None):
+
+        if params is None:
+            params = {}
+        elif isinstance(params, (list, tuple)):
+            params = dict((param.key, param.value) for param in params)
 
         self.statement = statement
         self.params = params
 
 
+# statements, by name, built once when their module is loaded, and the names of the statements
+STATEMENTS = {}
+NAMES = {}
+
+
+def statement(name, lines):
+    """
+    Builds and registers a statement
+    :param name: name of the statement, unique across modules
+    :param lines: lines of the statement, in `str.format` syntax: parameters are written as `{{param}}`
+    :return: statement
+    """
+
+    text = '\n'.join(lines).format()
+
+    if STATEMENTS.setdefault(name, text) != text:
+        raise ValueError('A different statement is already registered as `{0}`'.format(name))
+
+    NAMES[text] = name
+
+    return text
+
+
 class CypherQuery(object):
 
     def __init__(self, statement, commit=False):
@@ -106,12 +341,7 @@ class CypherQuery(object):
 
         def wrapped_f(*args, **kwargs):
 
-            params = []
-
-            for key in kwargs:
-                params.append(Parameter(key, kwargs[key]))
-
-            query = Query(self.__statement, params)
+            query = Query(self.__statement, kwargs)
 
             r = run_query(query, self.__commit)
 
@@ -128,24 +358,24 @@ def run_query(query, commit=True, timeout=30):
     :return:
     """
 
-    graph = get_connection()
-    tx = graph.transaction(for_query=True)
+    pool = get_pool()
+    graph, tx = pool.transaction()
 
-    q = query.statement
-    p = {param.key: param.value for param in query.params}
-
-    tx.append(q, params=p)
+    tx.append(query.statement, query.params)
 
     try:
 
         result = tx.execute()[0]
 
-    except exceptions.TransactionException as exc:
+        tx.commit()
+
+    except TransactionError as exc:
 
         # Logger.error("Error initiating transaction:\n\t{0}".format(exc))
         raise exc
 
-    tx.commit()
+    finally:
+        pool.finish_transaction(graph, tx)
 
     return result
 
@@ -159,20 +389,19 @@ def run_batch_query(queries, commit=True, timeout=300):
     """
 
     #TODO: see if there is a way to set timeout with restneo4jclient
-    graph = get_connection()
-    tx = graph.transaction(for_query=True)
+    pool = get_pool()
+    graph, tx = pool.transaction()
 
     for query in queries:
-        statement = query.statement
-        params = {param.key: param.value for param in query.params}
-
-        tx.append(statement, params)
+        tx.append(query.statement, query.params)
 
     try:
 
-        results = tx.execute()
+        rs = tx.execute()
+
+        tx.commit()
 
-    except exceptions.TransactionException as exc:
+    except TransactionError as exc:
 
         # Logger.error(
         #     'Transaction error:\n\t{0}'.format(
@@ -182,63 +411,133 @@ def run_batch_query(queries, commit=True, timeout=300):
 
         raise exc
 
-    tx.commit()
-
-    collection = []
-    for result in results:
+    finally:
+        pool.finish_transaction(graph, tx)
 
-        records = []
+    return rs
 
-        for record in result:
 
-            records.append(record)
-
-        collection.append(records)
+def stream_query(query, fetch_size=None):
+    """
+    Runs a query in its own transaction, and reads its result lazily
+    :param query: Query
+    :param fetch_size: number of records read at a time. The `fetch_size` option in config.ini, if not given
+    :return: generator of the records of the result. The transaction is committed once they've all been read
+    """
 
-    return collection
+    with Transaction() as tx:
+        for record in tx.stream(query, fetch_size):
+            yield record
 
 
 class Transaction(object):
+    """
+    Query transaction on a pooled connection. The connection goes back to the pool once the transaction
+    is committed or rolled back
+    """
     # TODO: use neo4jrestclient CypherQuery class
     def __init__(self):
-        self.graph = get_connection()
-        self.tx = self.graph.transaction(for_query=True)
+        self.pool = get_pool()
+        self.graph, self.tx = self.pool.transaction()
 
     def __enter__(self):
         self._instance = self
         return self._instance
 
     def __exit__(self, type, value, traceback):
-        self._instance.commit()
+
+        if value is None:
+            self._instance.commit()
+        else:
+            self._instance.rollback()
+
+    def _finish(self):
+
+        if self.graph is not None:
+            self.pool.finish_transaction(self.graph, self.tx)
+            self.graph = None
 
     def execute(self, query):
 
         try:
 
-            q = query.statement
-            p = {param.key: param.value for param in query.params}
-
-            self.tx.append(q, p)
+            self.tx.append(query.statement, query.params)
             result = self.tx.execute()[0]
 
-        except neo4jrestclient.exceptions.TransactionException:
-            self.tx.rollback()
+        except TransactionError:
+            self.rollback()
             raise
         else:
             return result
 
+    def stream(self, query, fetch_size=None, types=None):
+        """
+        Runs a query, and reads its result lazily. The result must be read before the next query of the transaction
+        runs, or the transaction is committed: records left are skipped
+        :param query: Query
+        :param fetch_size: number of records read at a time. The `fetch_size` option in config.ini, if not given
+        :param types: mapping of column names to their types, e.g. `results.TIMESTAMP`, for `Cursor.fetch_columns`
+        :return: Cursor
+        """
+
+        try:
+            columns, records = self.tx.stream(query.statement, query.params)
+        except TransactionError:
+            self.rollback()
+            raise
+
+        return results.Cursor(self._records(records), fetch_size or self.pool.fetch_size, columns, types)
+
+    def _records(self, records):
+
+        try:
+            for record in records:
+                yield record
+        except TransactionError:
+            self.rollback()
+            raise
+
     def commit(self):
-        self.tx.commit()
+
+        if self.graph is None:
+            return
+
+        try:
+            self.tx.commit()
+        finally:
+            self._finish()
 
     def rollback(self):
-        self.tx.rollback()
+
+        if self.graph is None:
+            return
+
+        try:
+            self.tx.rollback()
+        except TransactionError:
+            # the server already rolled back a transaction that failed
+            pass
+        finally:
+            self._finish()
 
 
 class BatchTransaction(object):
+    """
+    Batch of queries in a transaction, on a pooled connection. The connection goes back to the pool once the
+    transaction is committed or rolled back.
+
+    The server rolls a transaction back on any error. Transient errors, e.g. deadlocks, are retried up to `retries`
+    times, after a jittered backoff, by replaying the transaction's queries in a new transaction
+    """
     # TODO: use neo4jrestclient CypherQuery class
-    def __init__(self):
-        self.graph = get_connection()
-        self.tx = self.graph.transaction(for_query=True)
+    def __init__(self, retries=RETRIES):
+        self.pool = get_pool()
+        self.retries = retries
+        self.graph, self.tx = self.pool.transaction()
+
+        # queries of the transaction so far, and the number of them not executed yet
+        self.queries = []
+        self.pending = 0
 
     def __enter__(self):
         self._instance = self
@@ -246,43 +545,143 @@ class BatchTransaction(object):
 
     def __exit__(self, type, value, traceback):
 
-        self._instance.commit()
+        if value is None:
+            self._instance.commit()
+        else:
+            self._instance.rollback()
+
+    def _finish(self):
+
+        if self.graph is not None:
+            self.pool.finish_transaction(self.graph, self.tx)
+            self.graph = None
+
+    def _restart(self):
+
+        # the failed transaction is gone from the server, so it's dropped rather than rolled back
+        self.graph.finish(self.tx)
+        self.tx = self.graph.transaction()
+
+        for query in self.queries:
+            self.tx.append(query.statement, query.params)
+
+    def _run(self, commit):
+        """
+        :param commit: commit the transaction, with the pending queries
+        :return: results of the pending queries
+        """
+
+        attempt = 0
+
+        while True:
+
+            try:
+                results = self.tx.commit() if commit else self.tx.execute()
+            except TransactionError as exc:
+
+                if not is_transient(exc) or attempt >= self.retries:
+                    raise
+
+                time.sleep(backoff(attempt))
+                attempt += 1
+
+                self._restart()
+            else:
+                results = list(results or [])
+                pending, self.pending = self.pending, 0
+
+                # a retried transaction also returns the results of the queries replayed before the pending ones
+                return results[len(results) - pending:] if pending else []
 
     def append(self, query):
 
         assert isinstance(query, Query)
 
-        q = query.statement
-        p = {param.key: param.value for param in query.params}
-
-        self.tx.append(q, p)
+        self.tx.append(query.statement, query.params)
+        self.queries.append(query)
+        self.pending += 1
 
     def execute(self):
 
         try:
 
-            results = self.tx.execute()
+            results = self._run(commit=False)
 
-        except neo4jrestclient.exceptions.TransactionException:
-            self.tx.rollback()
+        except TransactionError:
+            self.rollback()
             raise
         else:
+            return results
 
-            collection = []
-            for result in results:
+    def commit(self):
 
-                records = []
+        if self.graph is None:
+            return
 
-                for record in result:
+        try:
+            self._run(commit=True)
+        finally:
+            self._finish()
 
-                    records.append(record)
+    def rollback(self):
 
-                collection.append(records)
+        if self.graph is None:
+            return
 
-            return collection
+        try:
+            self.tx.rollback()
+        except TransactionError:
+            # the server already rolled back a transaction that failed
+            pass
+        finally:
+            self._finish()
 
-    def commit(self):
-        self.tx.commit()
 
-    def rollback(self):
-        self.tx.rollback()
+def bisect(queries):
+    """
+    :param queries: list of Query
+    :return: two halves of the queries or, for a single query, of its `rows` parameter. None, if it can't be split
+    """
+
+    if len(queries) > 1:
+        middle = len(queries) // 2
+        return queries[:middle], queries[middle:]
+
+    query = queries[0]
+    rows = query.params.get('rows')
+
+    if not isinstance(rows, list) or len(rows) < 2:
+        return None
+
+    middle = len(rows) // 2
+
+    return (
+        [Query(query.statement, dict(query.params, rows=rows[:middle]))],
+        [Query(query.statement, dict(query.params, rows=rows[middle:]))]
+    )
+
+
+def write_batch(queries, retries=RETRIES):
+    """
+    Commits queries in one transaction, retrying transient errors. If the transaction still fails, the queries are
+    split in half, and each half is committed on its own, down to single queries, and single rows of their `rows`
+    parameter, so that every row that can be written is
+    :param queries: list of Query
+    :param retries: attempts of each transaction that fails with a transient error
+    :return: list of (query, exception) tuples, for the queries, or single-row queries, that couldn't be written
+    """
+
+    try:
+        with BatchTransaction(retries=retries) as tx:
+            for query in queries:
+                tx.append(query)
+    except TransactionError as exc:
+
+        halves = bisect(queries)
+
+        if halves is None:
+            return [(queries[0], exc)]
+
+        return write_batch(halves[0], retries) + write_batch(halves[1], retries)
+
+    return []
@@ -0,0 +1,25 @@
+import datetime
+
+
+def _next_month(month):
+    return month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1)
+
+
+def months(start, end):
+    """
+    :param start: datetime, in the first month. Naive datetimes are taken as UTC
+    :param end: datetime, in the last month
+    :return: list of the unix timestamps of the start of each calendar month, in UTC, from `start`'s to `end`'s,
+    followed by the start of the month after. Months don't depend on the machine's time zone, so rollups built on one
+    are read the same on another
+    """
+
+    month = datetime.datetime(start.year, start.month, 1, tzinfo=datetime.timezone.utc)
+    last = datetime.datetime(end.year, end.month, 1, tzinfo=datetime.timezone.utc)
+    boundaries = [month.timestamp()]
+
+    while month <= last:
+        month = _next_month(month)
+        boundaries.append(month.timestamp())
+
+    return boundaries
@@ -0,0 +1,323 @@
+"""
+Query results, read lazily: cursors over the records of a result, and the incremental parser of the responses of the
+transactional HTTP endpoint that feeds them. Records are named tuples of the result's columns, and batches of records
+can be decoded to columns, as NumPy arrays
+"""
+
+import codecs
+import collections
+import datetime
+import itertools
+import json
+import re
+import threading
+
+from forensics.utils import lazy
+
+np = lazy.module('numpy')
+
+FETCH_SIZE = 1000
+
+# type of the columns of unix timestamps, decoded to local times
+TIMESTAMP = 'timestamp'
+
+COLUMNS = re.compile(r'"columns"\s*:\s*')
+DATA = re.compile(r'"data"\s*:\s*\[')
+ERRORS = re.compile(r'"errors"\s*:\s*')
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+SECONDS_PER_HOUR = 3600
+
+
+class RowParser(object):
+    """
+    Incremental parser of a response of the transactional endpoint, to a single statement. Rows are decoded as soon as
+    they've arrived, so a response is never held whole; the errors, which come after the results, are read by `close`
+    """
+
+    def __init__(self):
+
+        self._decoder = json.JSONDecoder()
+        self._text = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._rows = False
+        self._done = False
+
+        self.columns = None
+
+    def feed(self, data):
+        """
+        :param data: next bytes of the response
+        :return: list of the rows decoded from them
+        """
+
+        self._buffer += self._text.decode(data)
+
+        if self._done:
+            return []
+
+        if self.columns is None:
+
+            match = COLUMNS.search(self._buffer)
+
+            try:
+                self.columns = self._decoder.raw_decode(self._buffer, match.end())[0] if match else None
+            except ValueError:
+                # the columns haven't fully arrived yet
+                return []
+
+        if not self._rows:
+
+            match = DATA.search(self._buffer)
+
+            if match is None:
+                return []
+
+            self._rows = True
+            self._buffer = self._buffer[match.end():]
+
+        rows = []
+        buffer = self._buffer
+        position = 0
+
+        while True:
+
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+
+            if position >= len(buffer):
+                break
+
+            if buffer[position] == ']':
+                self._done = True
+                position += 1
+                break
+
+            try:
+                record, position = self._decoder.raw_decode(buffer, position)
+            except ValueError:
+                # the record hasn't fully arrived yet
+                break
+
+            rows.append(record['row'] if 'row' in record else record['rest'])
+
+        self._buffer = buffer[position:]
+
+        return rows
+
+    def close(self):
+        """
+        :return: errors of the response, once it's been read whole
+        """
+
+        self._buffer += self._text.decode(b'', final=True)
+
+        if not self._rows:
+            # no results, e.g. a statement that failed before returning any
+            return json.loads(self._buffer).get('errors', []) if self._buffer.strip() else []
+
+        match = ERRORS.search(self._buffer)
+
+        if match is None:
+            return []
+
+        return self._decoder.raw_decode(self._buffer, match.end())[0]
+
+
+_offsets = {}
+_offsets_lock = threading.Lock()
+
+
+def _offset(hour):
+
+    seconds = hour*SECONDS_PER_HOUR
+
+    return int((datetime.datetime.fromtimestamp(seconds) - EPOCH).total_seconds()) - seconds
+
+
+def local_times(timestamps):
+    """
+    Converts unix timestamps to local times, as `datetime.datetime.fromtimestamp` does, in bulk.
+    The UTC offset of each distinct hour is only computed once
+    :param timestamps: array of unix timestamps
+    :return: array of naive local times, as datetime64[s]
+    """
+
+    seconds = np.floor(np.asarray(timestamps, dtype=np.float64)).astype(np.int64)
+    hours, inverse = np.unique(seconds // SECONDS_PER_HOUR, return_inverse=True)
+
+    with _offsets_lock:
+
+        offsets = np.empty(len(hours), dtype=np.int64)
+
+        for i, hour in enumerate(hours.tolist()):
+
+            if hour not in _offsets:
+                _offsets[hour] = _offset(hour)
+
+            offsets[i] = _offsets[hour]
+
+    return (seconds + offsets[inverse.reshape(-1)]).astype('datetime64[s]')
+
+
+_record_types = {}
+
+
+def record_type(columns):
+    """
+    :param columns: names of the columns of a result
+    :return: named tuple of the columns. Names that aren't identifiers, e.g. `count(*)`, are replaced by their
+    position, as `_0`
+    """
+
+    key = tuple(columns)
+
+    if key not in _record_types:
+        _record_types[key] = collections.namedtuple('Record', key, rename=True)
+
+    return _record_types[key]
+
+
+class Columns(object):
+    """
+    Batch of records as columns: an array per column, in a mapping of column names to arrays. Timestamp columns are
+    arrays of local times
+    """
+
+    def __init__(self, names, arrays):
+
+        self.names = list(names)
+        self.arrays = arrays
+
+    def __len__(self):
+        return len(self.arrays[self.names[0]]) if self.names else 0
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    def __contains__(self, name):
+        return name in self.arrays
+
+    def keys(self):
+        return list(self.names)
+
+    def dates(self, name, unit='D'):
+        """
+        :param name: timestamp column
+        :param unit: precision, e.g. `D` for days, or `s` for seconds
+        :return: list of the times, as ISO 8601 text, e.g. 2014-01-31
+        """
+
+        return np.datetime_as_string(self.arrays[name], unit=unit).tolist()
+
+    def take(self, indices):
+        """
+        :param indices: slice, array of positions, or boolean mask
+        :return: Columns of the selected records
+        """
+
+        return Columns(self.names, dict((name, self.arrays[name][indices]) for name in self.names))
+
+    def rows(self):
+        """
+        :return: generator of the records, as lists
+        """
+
+        for row in zip(*[self.arrays[name].tolist() for name in self.names]):
+            yield list(row)
+
+
+def decode(names, rows, types=None):
+    """
+    :param names: names of the columns
+    :param rows: list of rows, as sequences of values
+    :param types: mapping of column names to NumPy dtypes, or `TIMESTAMP`. Other columns' dtypes are inferred
+    :return: Columns
+    """
+
+    types = types or {}
+    values = list(zip(*rows)) if rows else [()]*len(names)
+    arrays = {}
+
+    for name, column in zip(names, values):
+
+        kind = types.get(name)
+
+        if kind == TIMESTAMP:
+            arrays[name] = local_times(column)
+        else:
+            arrays[name] = np.asarray(column, dtype=kind)
+
+    return Columns(names, arrays)
+
+
+class Cursor(object):
+    """
+    Records of a result, read lazily from the transport as they're consumed. Records must be read before the next
+    statement of the transaction runs: whatever's left is skipped then.
+
+    Records are named tuples of the result's columns, and `fetch_columns` decodes a batch of records to arrays
+    """
+
+    def __init__(self, records, fetch_size=FETCH_SIZE, columns=(), types=None, close=None):
+        """
+        :param records: iterator of the records, as sequences of values, read from the transport
+        :param fetch_size: number of records `fetchmany` reads by default
+        :param columns: names of the columns
+        :param types: mapping of column names to their types, for `fetch_columns`
+        :param close: callable that discards the records left, if any
+        """
+
+        self._records = iter(records)
+        self._close = close
+
+        self.fetch_size = fetch_size
+        self.columns = list(columns)
+        self.types = types or {}
+        self.count = 0
+
+        self._record = record_type(self.columns)._make if self.columns else list
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+
+        record = next(self._records)
+        self.count += 1
+
+        return self._record(record)
+
+    def fetch_columns(self, size=None):
+        """
+        :param size: number of records. All the records left, if not given
+        :return: Columns of the records
+        """
+
+        rows = list(itertools.islice(self._records, size))
+        self.count += len(rows)
+
+        return decode(self.columns, rows, self.types)
+
+    def fetchone(self):
+        return next(self, None)
+
+    def fetchmany(self, size=None):
+        """
+        :param size: number of records. `fetch_size`, if not given
+        :return: list of up to `size` records, empty once the result has been read
+        """
+
+        return list(itertools.islice(self, size or self.fetch_size))
+
+    def fetchall(self):
+        return list(self)
+
+    def close(self):
+
+        if self._close is not None:
+            self._close()
+            self._close = None
+
+        self._records = iter(())
@@ -0,0 +1,892 @@
+"""
+Stand-in for a Neo4j server, for tests: an in-memory graph that runs the statements this project registers
+(see `neo4j.statement`), by name, rather than parsing Cypher. Schema statements are accepted, and ignored.
+
+The `local` transport runs transactions on the process' stand-in database directly. `Server` serves a database over
+the transactional HTTP endpoint, for the `http` transport:
+
+    python -m forensics.utils.standin --port 7474
+
+Data can also be loaded into a database directly, with `Database.load`, for the `memory` backend of main.py: nodes
+are indexed by label and key, and relationships by type, at both ends, so the patterns run as traversals of those
+indexes
+"""
+
+import argparse
+import bisect
+import collections
+import importlib
+import itertools
+import json
+import re
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from forensics.utils import neo4j
+
+# property identifying the nodes of each label, as merged by the seeding statements
+KEYS = {
+    'Person': 'id',
+    'PhoneNumber': 'number',
+    'Flight': 'number',
+    'City': 'name',
+    'Country': 'name',
+    'Company': 'name',
+    'Dataset': 'generation'
+}
+
+# modules that register the statements the stand-in runs
+MODULES = [
+    'forensics.callgraph', 'forensics.entities', 'forensics.patterns', 'forensics.rollups', 'forensics.wipe',
+    'forensics.utils.cache'
+]
+
+SCHEMA = re.compile(r'^\s*(CREATE|DROP) (INDEX|CONSTRAINT) ')
+
+RETURN = re.compile(r'^RETURN (.*)$', re.MULTILINE)
+ALIAS = re.compile(r'\s+AS\s+(\w+)$', re.IGNORECASE)
+
+VERSION = '3.5.0'
+
+_database = None
+_database_lock = threading.Lock()
+
+
+class StatementError(neo4j.TransactionError):
+    """
+    Error of a statement, reported with a server error code
+    """
+
+    def __init__(self, code, message):
+
+        self.code = code
+        self.message = message
+
+        super(StatementError, self).__init__('{0}:\n{1}'.format(code, message))
+
+
+def columns(statement):
+    """
+    :param statement: statement
+    :return: names of the columns of its result, from its RETURN clause: the alias of each value, or its expression
+    """
+
+    match = None
+
+    for match in RETURN.finditer(statement):
+        pass
+
+    if match is None:
+        return []
+
+    names = []
+    depth = 0
+    start = 0
+    text = match.group(1)
+
+    # values are split on the commas that aren't within brackets
+    for i, c in enumerate(text + ','):
+
+        if c in '([{':
+            depth += 1
+        elif c in ')]}':
+            depth -= 1
+        elif c == ',' and depth == 0:
+
+            value = text[start:i].strip()
+            alias = ALIAS.search(value)
+
+            names.append(alias.group(1) if alias else value)
+            start = i + 1
+
+    return names
+
+
+class Node(object):
+
+    __slots__ = ('id', 'label', 'props', 'outgoing', 'incoming')
+
+    def __init__(self, id, label, props):
+
+        self.id = id
+        self.label = label
+        self.props = props
+        self.outgoing = collections.defaultdict(dict)
+        self.incoming = collections.defaultdict(dict)
+
+
+class Relationship(object):
+
+    __slots__ = ('id', 'type', 'start', 'end', 'props')
+
+    def __init__(self, id, type, start, end, props):
+
+        self.id = id
+        self.type = type
+        self.start = start
+        self.end = end
+        self.props = props
+
+
+class Graph(object):
+    """
+    Property graph: nodes are indexed by label and key property, and relationships by type, at both of their nodes
+    """
+
+    def __init__(self):
+
+        self.nodes = {}
+        self._ids = itertools.count()
+
+    def __len__(self):
+        return self.count()
+
+    def label(self, label):
+        """
+        :param label: node label
+        :return: the nodes with the label, by key
+        """
+
+        return self.nodes.get(label, {})
+
+    def merge_node(self, label, key):
+
+        nodes = self.nodes.setdefault(label, {})
+        node = nodes.get(key)
+
+        if node is None:
+            node = nodes[key] = Node(next(self._ids), label, {KEYS[label]: key})
+
+        return node
+
+    def merge_relationship(self, type, start, end, **props):
+        """
+        :param props: properties the relationship is matched on
+        :return: relationship
+        """
+
+        key = (end.id,) + tuple(sorted(props.items()))
+        relationships = start.outgoing[type]
+        relationship = relationships.get(key)
+
+        if relationship is None:
+            relationship = relationships[key] = Relationship(next(self._ids), type, start, end, props)
+            end.incoming[type][(start.id,) + key[1:]] = relationship
+
+        return relationship
+
+    def remove(self, relationship):
+        """
+        Deletes a relationship
+        """
+
+        start, end = relationship.start, relationship.end
+
+        # relationships are keyed by the properties they were merged on, which may have been set since
+        for key, r in list(start.outgoing[relationship.type].items()):
+            if r is relationship:
+                del start.outgoing[relationship.type][key]
+                end.incoming[relationship.type].pop((start.id,) + key[1:], None)
+
+    def delete(self, node):
+        """
+        Deletes a node, and its relationships
+        """
+
+        for type, relationships in node.outgoing.items():
+            for key, relationship in relationships.items():
+                relationship.end.incoming[type].pop((node.id,) + key[1:], None)
+
+        for type, relationships in node.incoming.items():
+            for key, relationship in relationships.items():
+                relationship.start.outgoing[type].pop((node.id,) + key[1:], None)
+
+        del self.nodes[node.label][node.props[KEYS[node.label]]]
+
+    def count(self, label=None):
+
+        if label is not None:
+            return len(self.label(label))
+
+        return sum(len(nodes) for nodes in self.nodes.values())
+
+    def clear(self):
+        self.nodes = {}
+
+
+def _related(node, type, direction='outgoing'):
+
+    return (
+        relationship.end if direction == 'outgoing' else relationship.start
+        for relationship in getattr(node, direction)[type].values()
+    )
+
+
+class Database(object):
+    """
+    Graph, and the handlers of the statements it runs. Statements run one at a time, and take effect as they run:
+    there's no isolation between transactions, and no rollback
+    """
+
+    def __init__(self):
+
+        # statements are registered by the modules that send them, which a server process doesn't otherwise load
+        for module in MODULES:
+            importlib.import_module(module)
+
+        self.graph = Graph()
+        self._lock = threading.RLock()
+        self._failures = collections.deque()
+
+        self.statements = 0
+
+        self.handlers = {
+            'person': self._person,
+            'phone_call': self._phone_call,
+            'flight': self._flight,
+            'employment': self._employment,
+            'patterns.one': self._pattern_one,
+            'patterns.two': self._pattern_two,
+            'patterns.three': self._pattern_three,
+            'patterns.four': self._pattern_four,
+            'patterns.five': self._pattern_five,
+            'callgraph.calls': self._export_calls,
+            'callgraph.owners': self._export_owners,
+            'callgraph.flights': self._export_flights,
+            'callgraph.employment': self._export_employment,
+            'rollups.range': self._rollups_range,
+            'rollups.people': self._rollups_people,
+            'rollups.affected': self._rollups_affected,
+            'rollups.built': self._rollups_built,
+            'rollups.flown': self._rollups_flown,
+            'rollups.clear': self._rollups_clear,
+            'rollups.build': self._rollups_build,
+            'cache.generation': self._generation,
+            'cache.bump': self._bump
+        }
+
+    def fail(self, code, times=1, message='Injected failure'):
+        """
+        Fails the next statements with an error, e.g. `Neo.TransientError.Transaction.DeadlockDetected`, to test how
+        clients handle it
+        :param code: error code
+        :param times: number of statements that fail
+        :param message: error message
+        :return:
+        """
+
+        with self._lock:
+            self._failures.extend([(code, message)]*times)
+
+    def drop(self):
+        """
+        Empties the database
+        """
+
+        with self._lock:
+            self.graph.clear()
+
+    def _handler(self, statement):
+
+        if SCHEMA.match(statement):
+            return lambda params: []
+
+        name = neo4j.NAMES.get(statement)
+
+        if name is not None and name.startswith('wipe.'):
+            _, action, label = name.split('.', 2)
+            label = None if label == '*' else label
+            return lambda params: self._delete(label, params['limit']) if action == 'delete' else self._count(label)
+
+        bulk = name is not None and name.endswith('.bulk')
+        handler = self.handlers.get(name[:-len('.bulk')] if bulk else name)
+
+        if handler is None:
+            raise StatementError(
+                'Neo.ClientError.Statement.SyntaxError',
+                'The stand-in database only runs the statements it has handlers for:\n{0}'.format(statement)
+            )
+
+        if bulk:
+            return lambda params: [row for r in params['rows'] for row in handler(r)]
+
+        return handler
+
+    def run(self, statements):
+        """
+        :param statements: list of (statement, params) tuples
+        :return: list of the rows of each statement's result
+        """
+
+        results = []
+
+        with self._lock:
+
+            for statement, params in statements:
+
+                self.statements += 1
+
+                if self._failures:
+                    raise StatementError(*self._failures.popleft())
+
+                results.append(self._handler(statement)(params or {}))
+
+        return results
+
+    def load(self, batches):
+        """
+        Merges batches of records into the graph directly, as their bulk statements would, without going through
+        transactions, e.g. to run the patterns on data that's only ever been in memory
+        :param batches: iterable of batches, see `forensics.entities.Batch`
+        :return: number of records merged
+        """
+
+        n = 0
+
+        for batch in batches:
+
+            query = batch.cypher()
+            handler = self._handler(query.statement)
+
+            with self._lock:
+                handler(query.params)
+
+            n += len(batch)
+
+        return n
+
+    def _count(self, label):
+        return [[self.graph.count(label)]]
+
+    def _delete(self, label, limit):
+
+        labels = [label] if label else list(self.graph.nodes)
+        nodes = itertools.islice((node for name in labels for node in list(self.graph.label(name).values())), limit)
+        deleted = 0
+
+        for node in nodes:
+            self.graph.delete(node)
+            deleted += 1
+
+        return [[deleted]]
+
+    def _person(self, row):
+
+        graph = self.graph
+
+        person = graph.merge_node('Person', row['personId'])
+        person.props['name'] = row['name']
+        person.props['sex'] = row['sex']
+
+        number = graph.merge_node('PhoneNumber', row['number'])
+
+        for registration in list(person.incoming['REGISTERED_TO'].values()):
+            if registration.start is not number:
+                graph.remove(registration)
+
+        graph.merge_relationship('REGISTERED_TO', number, person)
+
+        return []
+
+    def _phone_call(self, row):
+
+        graph = self.graph
+
+        source = graph.merge_node('PhoneNumber', row['number1'])
+        target = graph.merge_node('PhoneNumber', row['number2'])
+
+        call = graph.merge_relationship('CONTACTED', source, target, id=row['callId'])
+        call.props['timestamp'] = row['timestamp']
+        call.props['weekday'] = row['weekday']
+        call.props['hour'] = row['hour']
+
+        return []
+
+    def _flight(self, row):
+
+        graph = self.graph
+
+        country1 = graph.merge_node('Country', row['co1'])
+        country2 = graph.merge_node('Country', row['co2'])
+        city1 = graph.merge_node('City', row['ci1'])
+        city2 = graph.merge_node('City', row['ci2'])
+
+        graph.merge_relationship('IN', city1, country1)
+        graph.merge_relationship('IN', city2, country2)
+
+        person = graph.merge_node('Person', row['personId'])
+        flight = graph.merge_node('Flight', row['flightNo'])
+        flight.props['timestamp'] = row['timestamp']
+
+        for type, current in [('FROM', city1), ('TO', city2)]:
+            for relationship in list(flight.outgoing[type].values()):
+                if relationship.end is not current:
+                    graph.remove(relationship)
+
+        for relationship in list(flight.incoming['TOOK'].values()):
+            if relationship.start is not person:
+                graph.remove(relationship)
+                relationship.start.props['staleRollups'] = True
+
+        graph.merge_relationship('FROM', flight, city1)
+        graph.merge_relationship('TO', flight, city2)
+        graph.merge_relationship('TOOK', person, flight)
+
+        return []
+
+    def _employment(self, row):
+
+        graph = self.graph
+
+        person = graph.merge_node('Person', row['personId'])
+        company = graph.merge_node('Company', row['companyName'])
+
+        employment = graph.merge_relationship('EMPLOYEE_AT', person, company, since=row['since'])
+        employment.props['until'] = row['until']
+
+        return []
+
+    def _destinations(self, person, start, end):
+        """
+        :return: generator of (flight, country) of each flight the person took between `start` and `end`
+        """
+
+        for flight in _related(person, 'TOOK'):
+
+            if not start <= flight.props.get('timestamp', start - 1) < end:
+                continue
+
+            for city in _related(flight, 'TO'):
+                for country in _related(city, 'IN'):
+                    yield flight, country
+
+    def _rollups(self, start, end):
+        """
+        :return: generator of (person, country, rollup) of each monthly rollup between `start` and `end`
+        """
+
+        for person in self.graph.label('Person').values():
+            for rollup in person.outgoing['FLEW_TO'].values():
+                if start <= rollup.props['month'] < end:
+                    yield person, rollup.end, rollup
+
+    def _pattern_one(self, params):
+
+        counts = collections.Counter()
+
+        for person, country, rollup in self._rollups(params['startDate'], params['endDate']):
+            counts[(person.props.get('name'), country.props['name'])] += rollup.props['flights']
+
+        rows = [[person, n, destination] for (person, destination), n in counts.items() if n > params['count']]
+        rows.sort(key=lambda row: row[1], reverse=True)
+
+        return rows[:params['limit']]
+
+    def _pattern_two(self, params):
+
+        boundaries = params['boundaries']
+        counts = collections.Counter()
+
+        for person, country, rollup in self._rollups(boundaries[0], boundaries[-1]):
+
+            period = bisect.bisect_right(boundaries, rollup.props['month']) - 1
+            counts[(period, person.props.get('name'), country.props['name'])] += rollup.props['flights']
+
+        return sorted(
+            [period, person, n, destination] for (period, person, destination), n in counts.items()
+            if n > params['count']
+        )
+
+    def _callers(self, params):
+        """
+        :return: dict of the number of calls made to the representative's number on the weekday, per caller
+        """
+
+        callers = collections.Counter()
+        representative = self.graph.label('PhoneNumber').get(params['repNumber'])
+
+        if representative is None:
+            return callers
+
+        for call in representative.incoming['CONTACTED'].values():
+
+            if call.props.get('weekday') != params['weekday']:
+                continue
+
+            for person in _related(call.start, 'REGISTERED_TO'):
+                callers[person] += 1
+
+        return callers
+
+    def _pattern_three(self, params):
+
+        counts = collections.Counter()
+
+        for person, calls in self._callers(params).items():
+            counts[person.props.get('name')] += calls
+
+        return [[name, calls] for name, calls in counts.items()]
+
+    def _caller_flights(self, params):
+        """
+        :return: generator of (caller, country) of each flight a caller took to one of the countries
+        """
+
+        countries = set(params['countries'])
+
+        for person in self._callers(params):
+            for flight, country in self._destinations(person, params['startDate'], params['endDate']):
+                if country.props['name'] in countries:
+                    yield person, country
+
+    def _pattern_four(self, params):
+
+        counts = collections.Counter(
+            (person.props.get('name'), person.props['id'], country.props['name'])
+            for person, country in self._caller_flights(params)
+        )
+
+        return [[name, id, flights, country] for (name, id, country), flights in counts.items()]
+
+    def _pattern_five(self, params):
+
+        people = dict((person.id, person) for person, _ in self._caller_flights(params))
+        period = params['activitiesStartPeriod']
+        rows = []
+
+        for person in people.values():
+            for employment in person.outgoing['EMPLOYEE_AT'].values():
+
+                if employment.end.props['name'] != params['companyName']:
+                    continue
+
+                since, until = employment.props['since'], employment.props.get('until')
+
+                if since < period or (until is not None and until > period):
+                    rows.append([person.props.get('name'), person.props['id'], since, until])
+
+        return rows
+
+    def _export_calls(self, params):
+
+        return [
+            [number, call.end.props['number'], call.props.get('weekday'), call.props.get('hour'),
+             call.props.get('timestamp')]
+            for number, node in self.graph.label('PhoneNumber').items()
+            for call in node.outgoing['CONTACTED'].values()
+        ]
+
+    def _export_owners(self, params):
+
+        return [
+            [number, person.props['id'], person.props.get('name')]
+            for number, node in self.graph.label('PhoneNumber').items()
+            for person in _related(node, 'REGISTERED_TO')
+        ]
+
+    def _export_flights(self, params):
+
+        return [
+            [id, flight.props.get('timestamp'), country.props['name']]
+            for id, person in self.graph.label('Person').items()
+            for flight, country in self._destinations(person, float('-inf'), float('inf'))
+        ]
+
+    def _export_employment(self, params):
+
+        return [
+            [id, employment.end.props['name'], employment.props['since'], employment.props.get('until')]
+            for id, person in self.graph.label('Person').items()
+            for employment in person.outgoing['EMPLOYEE_AT'].values()
+        ]
+
+    def _rollups_range(self, params):
+
+        timestamps = [
+            flight.props['timestamp'] for flight in self.graph.label('Flight').values()
+            if flight.props.get('timestamp') is not None
+        ]
+
+        return [[min(timestamps), max(timestamps)] if timestamps else [None, None]]
+
+    def _rollups_people(self, params):
+
+        return [[id] for id, person in self.graph.label('Person').items() if person.outgoing['TOOK']]
+
+    def _rollups_affected(self, params):
+
+        people = set()
+        flights = self.graph.label('Flight')
+        cities = self.graph.label('City')
+
+        for number in params['flights']:
+            if number in flights:
+                people.update(_related(flights[number], 'TOOK', 'incoming'))
+
+        for name in params['cities']:
+            if name in cities:
+                for flight in _related(cities[name], 'TO', 'incoming'):
+                    people.update(_related(flight, 'TOOK', 'incoming'))
+
+        people.update(person for person in self.graph.label('Person').values() if person.props.get('staleRollups'))
+
+        return [[person.props['id']] for person in people]
+
+    def _rollups_built(self, params):
+
+        for person in self.graph.label('Person').values():
+            for rollup in person.outgoing['FLEW_TO'].values():
+                return [[rollup.props['month']]]
+
+        return []
+
+    def _rollups_flown(self, params):
+
+        return [[1]] if self._rollups_people(params) else []
+
+    def _rollups_clear(self, params):
+
+        for id in params['people']:
+
+            person = self.graph.label('Person').get(id)
+
+            if person is not None:
+
+                person.props.pop('staleRollups', None)
+
+                for rollup in list(person.outgoing['FLEW_TO'].values()):
+                    self.graph.remove(rollup)
+
+        return []
+
+    def _rollups_build(self, params):
+
+        boundaries = params['boundaries']
+
+        for id in params['people']:
+
+            person = self.graph.label('Person').get(id)
+
+            if person is None:
+                continue
+
+            counts = collections.Counter()
+
+            for flight, country in self._destinations(person, float('-inf'), float('inf')):
+                if flight.props.get('timestamp') is not None:
+                    month = boundaries[bisect.bisect_right(boundaries, flight.props['timestamp']) - 1]
+                    counts[(country, month)] += 1
+
+            for (country, month), flights in counts.items():
+                self.graph.merge_relationship('FLEW_TO', person, country, month=month).props['flights'] = flights
+
+        return []
+
+    def _generation(self, params):
+
+        return [[generation] for generation in self.graph.label('Dataset')]
+
+    def _bump(self, params):
+
+        # a database has a single dataset
+        for dataset in list(self.graph.label('Dataset').values()):
+            self.graph.delete(dataset)
+
+        self.graph.merge_node('Dataset', params['generation'])
+
+        return [[params['generation']]]
+
+
+def get_database():
+    """
+    :return: the process' stand-in database, created on first use
+    """
+
+    global _database
+
+    if _database is None:
+        with _database_lock:
+            if _database is None:
+                _database = Database()
+
+    return _database
+
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    Transactional endpoint, under /db/data: statements are posted to /transaction, to open a transaction, to
+    /transaction/<id>, and to /transaction/<id>/commit, or /transaction/commit, to commit. Errors roll the transaction
+    back, as Neo4j does
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _url(self, path):
+        return 'http://{0}{1}{2}'.format(self.headers.get('Host'), self.server.base, path)
+
+    def _send(self, status, content, headers=None):
+
+        body = json.dumps(content).encode('utf-8')
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(body)))
+
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, code, message):
+        self._send(status, {'results': [], 'errors': [{'code': code, 'message': message}]})
+
+    def _payload(self):
+
+        # clients send bodies with any method, and a body left unread would be taken for the next request
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+        return json.loads(body) if body else {}
+
+    def _path(self):
+
+        path = self.path.split('?', 1)[0]
+
+        if not path.startswith(self.server.base):
+            return None
+
+        return path[len(self.server.base):].strip('/').split('/')
+
+    def do_GET(self):
+
+        self._payload()
+
+        if self._path() != ['']:
+            return self._error(404, 'Neo.ClientError.Request.Invalid', 'Not found: {0}'.format(self.path))
+
+        self._send(200, {
+            'node': self._url('/node'),
+            'node_index': self._url('/index/node'),
+            'relationship_index': self._url('/index/relationship'),
+            'node_labels': self._url('/labels'),
+            'extensions_info': self._url('/ext'),
+            'extensions': {},
+            'batch': self._url('/batch'),
+            'cypher': self._url('/cypher'),
+            'transaction': self._url('/transaction'),
+            'neo4j_version': VERSION
+        })
+
+    def do_POST(self):
+
+        payload = self._payload()
+        path = self._path()
+        transactions = self.server.transactions
+
+        if not path or path[0] != 'transaction' or len(path) > 3:
+            return self._error(404, 'Neo.ClientError.Request.Invalid', 'Not found: {0}'.format(self.path))
+
+        commit = path[-1] == 'commit'
+        id = path[1] if len(path) > 1 and path[1] != 'commit' else None
+
+        if id is not None and id not in transactions:
+            return self._error(
+                404, 'Neo.ClientError.Transaction.TransactionNotFound', 'Unrecognized transaction id: {0}'.format(id)
+            )
+
+        statements = [(s['statement'], s.get('parameters')) for s in payload.get('statements', [])]
+
+        try:
+            results = self.server.database.run(statements)
+        except StatementError as exc:
+            transactions.discard(id)
+            return self._send(200, {'results': [], 'errors': [{'code': exc.code, 'message': exc.message}]})
+
+        content = {
+            'results': [
+                {'columns': columns(statement), 'data': [{'row': row, 'rest': row} for row in rows]}
+                for (statement, _), rows in zip(statements, results)
+            ],
+            'errors': []
+        }
+        headers = {}
+
+        if commit:
+            transactions.discard(id)
+            return self._send(200, content, headers)
+
+        if id is None:
+            id = str(next(self.server.ids))
+            transactions.add(id)
+            headers['Location'] = self._url('/transaction/{0}'.format(id))
+
+        content['commit'] = self._url('/transaction/{0}/commit'.format(id))
+        content['transaction'] = {'expires': 'Thu, 01 Jan 2099 00:00:00 +0000'}
+
+        self._send(201 if 'Location' in headers else 200, content, headers)
+
+    def do_DELETE(self):
+
+        self._payload()
+        path = self._path()
+
+        if not path or len(path) != 2 or path[1] not in self.server.transactions:
+            return self._error(
+                404, 'Neo.ClientError.Transaction.TransactionNotFound', 'Not found: {0}'.format(self.path)
+            )
+
+        self.server.transactions.discard(path[1])
+        self._send(200, {'results': [], 'errors': []})
+
+
+class Server(ThreadingHTTPServer):
+    """
+    HTTP server of a stand-in database. Port 0 picks a free port, see `server_port`
+    """
+
+    daemon_threads = True
+
+    def __init__(self, database=None, host='127.0.0.1', port=0, endpoint='db/data'):
+
+        self.database = database or get_database()
+        self.base = '/{0}'.format(endpoint.strip('/'))
+        self.transactions = set()
+        self.ids = itertools.count(1)
+
+        ThreadingHTTPServer.__init__(self, (host, port), Handler)
+
+    def handle_error(self, request, client_address):
+
+        # clients drop the connections of streamed responses they stop reading
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            ThreadingHTTPServer.handle_error(self, request, client_address)
+
+    def start(self):
+        """
+        Serves requests from a background thread
+        :return: the thread
+        """
+
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+
+        return thread
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Stand-in Neo4j server, in memory')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Interface to listen on')
+    parser.add_argument('--port', type=int, default=7474, help='Port to listen on')
+
+    args = parser.parse_args()
+
+    server = Server(host=args.host, port=args.port)
+
+    print('Stand-in server listening on {0}:{1}'.format(args.host, server.server_port))
+
+    server.serve_forever()
@@ -0,0 +1,74 @@
+import os
+import os.path
+import subprocess
+import sys
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+# entry points of the CLI, and the heavy dependencies they load on first use
+MODULES = [
+    'forensics.patterns',
+    'forensics.seed',
+    'requests',
+    'faker'
+]
+
+
+def measure(module):
+    """
+    Imports a module in a fresh interpreter, with python's import time instrumentation (`-X importtime`)
+    :param module: fully qualified module name
+    :return: list of (module, self time, cumulative time) tuples in microseconds, in the order imports finished
+    """
+
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [SRC_DIR, env.get('PYTHONPATH')]))
+
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import {0}'.format(module)],
+        env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True
+    )
+
+    if process.returncode != 0:
+        raise ImportError('Could not import {0}:\n{1}'.format(module, process.stderr.strip().splitlines()[-1]))
+
+    timings = []
+
+    for line in process.stderr.splitlines():
+
+        if not line.startswith('import time:'):
+            continue
+
+        tokens = line[len('import time:'):].split('|')
+
+        try:
+            timings.append((tokens[2].strip(), int(tokens[0]), int(tokens[1])))
+        except ValueError:
+            # header
+            continue
+
+    return timings
+
+
+def report(modules=None, top=10):
+    """
+    Prints the import cost of each module, and the most expensive modules it pulls in
+    :param modules: module names. Defaults to the CLI's entry points and heavy dependencies
+    :param top: number of modules to list, by self time
+    :return:
+    """
+
+    for module in modules or MODULES:
+
+        try:
+            timings = measure(module)
+        except ImportError as exc:
+            print('\n{0}: {1}'.format(module, exc))
+            continue
+
+        cumulative = dict((name, total) for name, _, total in timings)
+
+        print('\n{0}: {1:.2f}ms, {2} modules imported'.format(module, cumulative.get(module, 0)/1000, len(timings)))
+
+        for name, own, total in sorted(timings, key=lambda timing: timing[1], reverse=True)[:top]:
+            print('\t{0:<50} self {1:>9.2f}ms  cumulative {2:>9.2f}ms'.format(name.strip(), own/1000, total/1000))
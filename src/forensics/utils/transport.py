@@ -0,0 +1,551 @@
+"""
+Transports that carry transactions to the database, selected with the `transport` option of the `neo4j` section in
+config.ini:
+
+    http: the transactional HTTP endpoint, through the `requests` package
+    bolt: the binary Bolt protocol, through the official driver (the `neo4j` package, an optional dependency)
+    local: an in-process stand-in database, for tests, see `forensics.utils.standin`
+
+A transport opens connections. Each connection runs one transaction at a time: statements are appended with their
+parameters, and `execute` and `commit` return the rows of each pending statement's result. `stream` runs a statement,
+and returns the names of its result's columns, and an iterator of its rows, read as they're consumed. Failed
+transactions raise `TransactionError`, with the server's error codes in its message
+"""
+
+import contextlib
+import json
+import urllib.parse
+
+from forensics.utils import lazy, results
+
+# client stacks are only imported by the transport that uses them
+requests = lazy.module('requests')
+http_exceptions = lazy.module('requests.exceptions')
+adapters = lazy.module('requests.adapters')
+driver = lazy.module('neo4j')
+standin = lazy.module('forensics.utils.standin')
+
+TRANSPORTS = ['http', 'bolt', 'local']
+
+BOLT_PORT = 7687
+
+# code of the errors of a server the driver can't reach, a transient error, as the server's own code for a database
+# that's unavailable
+UNAVAILABLE = 'Neo.TransientError.General.DatabaseUnavailable'
+
+# bytes read at a time from a streamed HTTP response
+CHUNK_SIZE = 64*1024
+
+HEADERS = {
+    'Accept': 'application/json; charset=UTF-8',
+    'Content-Type': 'application/json',
+    'X-Stream': 'true'
+}
+
+
+class TransactionError(Exception):
+    """
+    Failed transaction. The message has a `code:` line, and the error message, for each of the server's errors
+    """
+    pass
+
+
+def _message(errors):
+
+    return '\n'.join('{0}:\n{1}'.format(error['code'], error['message']) for error in errors)
+
+
+class HttpTransaction(object):
+    """
+    Transaction on the transactional HTTP endpoint. The first request opens it, and the server answers with its URL;
+    statements still pending are committed in the same request as the commit. Streamed statements are posted to the
+    transaction on their own, and their response is parsed as it arrives
+    """
+
+    def __init__(self, session, url, auth):
+        """
+        :param session: requests session, whose keep-alive connections are reused
+        :param url: URL of the transactional endpoint, e.g. http://localhost:7474/db/data/transaction
+        :param auth: (username, password)
+        """
+
+        self.session = session
+        self.begin = url
+        self.auth = auth
+        self.url = None
+        self.pending = []
+        self._stream = None
+
+    def _post(self, url, statements, stream=False):
+
+        payload = {
+            'statements': [
+                {'statement': statement, 'parameters': params, 'resultDataContents': ['row']}
+                for statement, params in statements
+            ]
+        }
+
+        try:
+            return self.session.post(url, data=json.dumps(payload), headers=HEADERS, auth=self.auth, stream=stream)
+        except http_exceptions.RequestException as exc:
+            # the server drops a transaction it can't reach the client of
+            self.url = None
+            raise TransactionError(str(exc)) from exc
+
+    def _location(self, response):
+
+        # the server may name itself by another address than the one it's reached at, so only the path is kept
+        location = response.headers.get('Location')
+
+        if location is not None:
+            self.url = urllib.parse.urljoin(self.begin, urllib.parse.urlparse(location).path)
+
+    def _content(self, response):
+
+        try:
+            content = response.json()
+        except ValueError:
+            content = {}
+
+        if content.get('errors') or response.status_code not in (200, 201):
+
+            # the server rolls a transaction back on any error
+            self.url = None
+
+            raise TransactionError(
+                _message(content.get('errors') or []) or 'HTTP status {0}'.format(response.status_code)
+            )
+
+        return content
+
+    def _request(self, url, statements):
+        """
+        :return: list of the rows of each statement's result
+        """
+
+        response = self._post(url, statements)
+        content = self._content(response)
+
+        self._location(response)
+
+        return [[row['row'] for row in result['data']] for result in content['results']]
+
+    def _drain(self):
+
+        # the rest of a streamed response is read, so that the connection can be reused, and errors aren't missed
+        if self._stream is not None:
+
+            stream, self._stream = self._stream, None
+
+            for _ in stream:
+                pass
+
+    def append(self, statement, params):
+        self.pending.append((statement, params))
+
+    def execute(self):
+
+        self._drain()
+
+        pending, self.pending = self.pending, []
+
+        return self._request(self.url or self.begin, pending)
+
+    def commit(self):
+
+        self._drain()
+
+        pending, self.pending = self.pending, []
+        url, self.url = self.url or self.begin, None
+
+        return self._request(url + '/commit', pending)
+
+    def rollback(self):
+
+        self.pending = []
+
+        if self._stream is not None:
+            # drops the connection of a streamed response that hasn't been read whole
+            stream, self._stream = self._stream, None
+            stream.close()
+
+        if self.url is None:
+            return
+
+        url, self.url = self.url, None
+
+        try:
+            response = self.session.delete(url, headers=HEADERS, auth=self.auth)
+        except http_exceptions.RequestException as exc:
+            raise TransactionError(str(exc)) from exc
+
+        self._content(response)
+
+    def stream(self, statement, params):
+
+        # the transaction is opened first, with the statements appended so far, so the streamed one runs in it
+        if self.url is None or self.pending:
+            self.execute()
+        else:
+            self._drain()
+
+        response = self._post(self.url, [(statement, params)], stream=True)
+
+        parser = results.RowParser()
+        chunks = response.iter_content(CHUNK_SIZE)
+        rows = []
+
+        try:
+
+            if response.status_code not in (200, 201):
+                self.url = None
+                raise TransactionError('HTTP status {0}'.format(response.status_code))
+
+            # the response is read up to the result's columns
+            while parser.columns is None:
+
+                chunk = next(chunks, None)
+
+                if chunk is None:
+                    # no result: the statement failed, and the server rolled the transaction back
+                    self.url = None
+                    raise TransactionError(_message(parser.close()))
+
+                rows.extend(parser.feed(chunk))
+
+        except BaseException:
+            response.close()
+            raise
+
+        self._stream = self._rows(response, parser, chunks, rows)
+
+        return parser.columns, self._stream
+
+    def _rows(self, response, parser, chunks, rows):
+
+        try:
+
+            for row in rows:
+                yield row
+
+            for chunk in chunks:
+                for row in parser.feed(chunk):
+                    yield row
+
+            errors = parser.close()
+
+        finally:
+            response.close()
+
+        if errors:
+            self.url = None
+            raise TransactionError(_message(errors))
+
+
+class HttpConnection(object):
+
+    def __init__(self, session, url, auth):
+
+        self.session = session
+        self.url = url
+        self.auth = auth
+
+    def transaction(self):
+        return HttpTransaction(self.session, self.url, self.auth)
+
+    def finish(self, tx):
+        pass
+
+    def close(self):
+        pass
+
+
+class HttpTransport(object):
+    """
+    The transactional HTTP endpoint, through `requests`. Connections share the transport's session, and its keep-alive
+    HTTP connections
+    """
+
+    name = 'http'
+
+    def __init__(self, settings):
+
+        self.settings = settings
+        self.session = None
+
+    def uri(self):
+        """
+        :return: URI of the database
+        """
+
+        return "{0}://{1}:{2}/{3}/".format(
+            self.settings["protocol"], self.settings["host"], int(self.settings["port"]), self.settings["endpoint"]
+        )
+
+    def _get_session(self):
+
+        if self.session is None:
+            self.session = requests.Session()
+
+        return self.session
+
+    def connect(self):
+
+        auth = (self.settings["username"], self.settings["password"])
+
+        return HttpConnection(self._get_session(), self.uri() + 'transaction', auth)
+
+    def resize(self, size):
+
+        # the session's connection pool is sized to ours, so that concurrent transactions don't open and discard
+        # connections
+        adapter = adapters.HTTPAdapter(pool_connections=1, pool_maxsize=size)
+
+        for prefix in ['http://', 'https://']:
+            self._get_session().mount(prefix, adapter)
+
+    def close(self):
+
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+
+
+class BoltTransaction(object):
+
+    def __init__(self, session):
+
+        self.session = session
+        self.tx = None
+        self.pending = []
+        self._result = None
+
+    @contextlib.contextmanager
+    def _errors(self):
+
+        try:
+            yield
+        except driver.exceptions.Neo4jError as exc:
+            # the driver discards a transaction that failed
+            self.tx = None
+            raise TransactionError('{0}:\n{1}'.format(exc.code, exc.message)) from exc
+        except (driver.exceptions.ServiceUnavailable, driver.exceptions.SessionExpired) as exc:
+            # the connection was lost, or the server can't serve the session, as happens while a cluster changes
+            # leaders: the transaction is gone, and can be replayed once the driver reconnects
+            self.tx = None
+            raise TransactionError('{0}:\n{1}'.format(UNAVAILABLE, exc)) from exc
+
+    def _begin(self):
+
+        # records left of a streamed result are discarded, rather than buffered by the driver
+        if self._result is not None:
+            result, self._result = self._result, None
+            result.consume()
+
+        if self.tx is None:
+            self.tx = self.session.begin_transaction()
+
+    def append(self, statement, params):
+        self.pending.append((statement, params))
+
+    def execute(self):
+
+        with self._errors():
+
+            self._begin()
+
+            pending, self.pending = self.pending, []
+
+            return [[list(record) for record in self.tx.run(statement, params)] for statement, params in pending]
+
+    def commit(self):
+
+        results = self.execute()
+
+        with self._errors():
+            self.tx.commit()
+            self.tx = None
+
+        return results
+
+    def rollback(self):
+
+        self.pending = []
+        self._result = None
+
+        if self.tx is not None:
+            with self._errors():
+                tx, self.tx = self.tx, None
+                tx.rollback()
+
+    def stream(self, statement, params):
+
+        with self._errors():
+            self._begin()
+            self._result = self.tx.run(statement, params)
+
+            return list(self._result.keys()), self._records(self._result)
+
+    def _records(self, result):
+
+        # the driver pulls `fetch_size` records at a time from the server, as they're consumed
+        with self._errors():
+            for record in result:
+                yield list(record)
+
+
+class BoltConnection(object):
+
+    def __init__(self, session):
+        self.session = session
+
+    def transaction(self):
+        return BoltTransaction(self.session)
+
+    def finish(self, tx):
+        pass
+
+    def close(self):
+        self.session.close()
+
+
+class BoltTransport(object):
+    """
+    The official driver, over Bolt. Connections are driver sessions, which borrow the driver's own connections while
+    a transaction runs. Statements are sent as they are, with `{param}` parameters, so the server must accept that
+    syntax (Neo4j 3.x)
+    """
+
+    name = 'bolt'
+
+    def __init__(self, settings):
+
+        self.settings = settings
+        self.size = None
+        self._driver = None
+
+    def uri(self):
+        """
+        :return: URI of the database
+        """
+
+        return 'bolt://{0}:{1}'.format(self.settings['host'], int(self.settings.get('bolt_port', BOLT_PORT)))
+
+    def _get_driver(self):
+
+        if self._driver is None:
+
+            uri = self.uri()
+            kwargs = {} if self.size is None else {'max_connection_pool_size': self.size}
+
+            self._driver = driver.GraphDatabase.driver(
+                uri, auth=(self.settings['username'], self.settings['password']), **kwargs
+            )
+
+        return self._driver
+
+    def connect(self):
+
+        fetch_size = int(self.settings.get('fetch_size', results.FETCH_SIZE))
+
+        return BoltConnection(self._get_driver().session(fetch_size=fetch_size))
+
+    def resize(self, size):
+
+        # the driver's pool is sized once, when it's created
+        self.size = size
+
+    def close(self):
+
+        if self._driver is not None:
+            self._driver.close()
+            self._driver = None
+
+
+class LocalTransaction(object):
+    """
+    Transaction on the stand-in database. Statements take effect as they run, and aren't undone by a rollback
+    """
+
+    def __init__(self, database):
+
+        self.database = database
+        self.pending = []
+
+    def append(self, statement, params):
+        self.pending.append((statement, params))
+
+    def execute(self):
+
+        pending, self.pending = self.pending, []
+
+        return self.database.run(pending)
+
+    def commit(self):
+        return self.execute()
+
+    def rollback(self):
+        self.pending = []
+
+    def stream(self, statement, params):
+        return standin.columns(statement), iter(self.database.run([(statement, params)])[0])
+
+
+class LocalConnection(object):
+
+    def __init__(self, database):
+        self.database = database
+
+    def transaction(self):
+        return LocalTransaction(self.database)
+
+    def finish(self, tx):
+        pass
+
+    def close(self):
+        pass
+
+
+class LocalTransport(object):
+    """
+    The process' stand-in database, in memory. Nothing goes over the network
+    """
+
+    name = 'local'
+
+    def __init__(self, settings):
+        self.settings = settings
+
+    def uri(self):
+        """
+        :return: URI of the database: the process' own
+        """
+
+        return 'local:'
+
+    def connect(self):
+        return LocalConnection(standin.get_database())
+
+    def resize(self, size):
+        pass
+
+    def close(self):
+        pass
+
+
+def get_transport(settings):
+    """
+    :param settings: connection settings, the `neo4j` section of config.ini
+    :return: the transport named by the `transport` option, http by default
+    """
+
+    name = settings.get('transport', 'http')
+
+    if name == 'http':
+        return HttpTransport(settings)
+    elif name == 'bolt':
+        return BoltTransport(settings)
+    elif name == 'local':
+        return LocalTransport(settings)
+    else:
+        raise ValueError('Unknown transport: {0}. Expected one of {1}'.format(name, ', '.join(TRANSPORTS)))
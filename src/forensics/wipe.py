@@ -0,0 +1,293 @@
+"""
+Emptying the database: batched DETACH DELETE, or dropping and recreating the store of a throwaway server
+"""
+
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from forensics.utils import config, neo4j, standin
+
+# labels of the seeded nodes, deleted in separate passes when wiping in parallel
+LABELS = ['Person', 'PhoneNumber', 'Flight', 'City', 'Country', 'Company']
+
+BATCH_SIZE = 10000
+MIN_BATCH_SIZE = 500
+MAX_BATCH_SIZE = 200000
+
+# target duration of each delete transaction, in seconds
+TARGET_LATENCY = 1.
+
+# attempts of a round that fails with a transient error, e.g. a deadlock between parallel passes
+RETRIES = 5
+
+# seconds between progress reports
+PROGRESS_INTERVAL = 5.
+
+DROP_TIMEOUT = 120
+
+
+class BatchSize(object):
+    """
+    Number of nodes deleted per transaction, adapted to how long transactions take. Transactions that take longer
+    than the target latency shrink the batch, and faster ones grow it, by at most a factor of 2 at a time
+    """
+
+    def __init__(self, size=BATCH_SIZE, latency=TARGET_LATENCY, minimum=MIN_BATCH_SIZE, maximum=MAX_BATCH_SIZE):
+
+        self.size = size
+        self.latency = latency
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def update(self, elapsed):
+        """
+        :param elapsed: duration of the last transaction, in seconds
+        :return: the next batch size
+        """
+
+        factor = min(max(self.latency/max(elapsed, 1e-3), .5), 2.)
+
+        self.size = int(min(max(self.size*factor, self.minimum), self.maximum))
+
+        return self.size
+
+    def shrink(self):
+
+        self.size = max(self.size // 2, self.minimum)
+
+        return self.size
+
+
+class Progress(object):
+    """
+    Deleted node counts, reported at most every `interval` seconds
+    """
+
+    def __init__(self, total, interval=PROGRESS_INTERVAL):
+
+        self.total = total
+        self.interval = interval
+        self.deleted = 0
+        self.start = time.time()
+        self._reported = self.start
+        self._lock = threading.Lock()
+
+    def add(self, label, deleted, size):
+
+        with self._lock:
+
+            self.deleted += deleted
+            now = time.time()
+
+            if now - self._reported >= self.interval:
+                self._reported = now
+                self.report(label or 'all', size)
+
+    def report(self, label=None, size=None):
+
+        elapsed = max(time.time() - self.start, 1e-3)
+
+        print('\tDeleted {0} of {1} nodes ({2:.0f}%) in {3:.1f}s, {4:.0f} nodes/s{5}'.format(
+            self.deleted, self.total, 100.*self.deleted/max(self.total, 1), elapsed, self.deleted/elapsed,
+            '' if size is None else ', {0} in batches of {1}'.format(label, size)
+        ))
+
+
+def _match(label):
+
+    return 'MATCH (n :`{0}`)'.format(label) if label else 'MATCH (n)'
+
+
+def _statement(label):
+
+    return neo4j.statement('wipe.delete.{0}'.format(label or '*'), [
+        _match(label),
+        'WITH n',
+        'LIMIT {{limit}}',
+        'DETACH DELETE n',
+        'RETURN count(*)'
+    ])
+
+
+def _count_statement(label):
+
+    return neo4j.statement('wipe.count.{0}'.format(label or '*'), [_match(label), 'RETURN count(n)'])
+
+
+# statements of each label, and of all nodes, registered on import, so that a stand-in server knows them too
+DELETE = dict((label, _statement(label)) for label in LABELS + [None])
+COUNT = dict((label, _count_statement(label)) for label in LABELS + [None])
+
+
+def count(label=None):
+    """
+    :param label: node label. All nodes, if not given
+    :return: number of nodes
+    """
+
+    statement = COUNT.get(label) or _count_statement(label)
+
+    with neo4j.Transaction() as tx:
+        return tx.execute(neo4j.Query(statement))[0][0]
+
+
+def delete(label=None, progress=None, batch_size=None):
+    """
+    Deletes nodes, and their relationships, a batch per transaction, until none are left
+    :param label: node label. All nodes, if not given
+    :param progress: Progress
+    :param batch_size: BatchSize
+    :return: number of nodes deleted
+    """
+
+    batch_size = batch_size or BatchSize()
+    statement = DELETE.get(label) or _statement(label)
+    deleted = 0
+    failures = 0
+
+    while True:
+
+        start = time.time()
+
+        try:
+            with neo4j.Transaction() as tx:
+                c = tx.execute(neo4j.Query(statement, {'limit': batch_size.size}))[0][0]
+        except neo4j.TransactionError as exc:
+
+            failures += 1
+
+            if not neo4j.is_transient(exc) or failures > RETRIES:
+                raise
+
+            # smaller transactions hold fewer locks
+            batch_size.shrink()
+            continue
+
+        failures = 0
+        deleted += c
+
+        if progress is not None:
+            progress.add(label, c, batch_size.size)
+
+        if c < batch_size.size:
+            return deleted
+
+        batch_size.update(time.time() - start)
+
+
+def delete_all(workers=1, interval=PROGRESS_INTERVAL):
+    """
+    Deletes every node and relationship, in batches. With more than one worker, each label is deleted by its own
+    pass, `workers` passes at a time, followed by a pass over any nodes left
+    :param workers: number of concurrent passes
+    :param interval: seconds between progress reports
+    :return: number of nodes deleted
+    """
+
+    progress = Progress(count(), interval=interval)
+
+    if workers > 1:
+
+        neo4j.get_pool().reserve(workers)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(delete, label, progress) for label in LABELS]
+
+            for future in futures:
+                future.result()
+
+    delete(None, progress)
+
+    progress.report()
+
+    return progress.deleted
+
+
+def wait_for_server(timeout=DROP_TIMEOUT, empty=False):
+    """
+    Waits for the database to answer queries
+    :param timeout: seconds
+    :param empty: also wait for the store to be empty, e.g. for a server being restarted with a new store to replace
+    the old one, which can still answer queries for a while
+    :return:
+    """
+
+    deadline = time.time() + timeout
+
+    while True:
+
+        try:
+            if count() == 0 or not empty:
+                return
+        except Exception:
+            if time.time() >= deadline:
+                raise
+
+        if time.time() >= deadline:
+            raise TimeoutError('The store still had nodes after {0}s'.format(timeout))
+
+        time.sleep(1)
+
+
+def drop_store(command, timeout=DROP_TIMEOUT):
+    """
+    Replaces the database with an empty one, by running a command that drops and recreates the store of a throwaway
+    server, e.g. restarting a disposable container. Nothing is deleted through queries.
+    Once the command has run, the old server may not have gone down yet, so it waits for a server with an empty store
+    :param command: shell command
+    :param timeout: seconds to wait for the server, once the command has run
+    :return:
+    """
+
+    start = time.time()
+
+    try:
+        nodes = count()
+    except Exception:
+        # the server isn't up: the command may be what starts it
+        nodes = None
+
+    if nodes == 0:
+        # an empty store can't be told apart from its replacement, and there's nothing to drop
+        print('\tThe store is already empty')
+        return
+
+    subprocess.run(command, shell=True, check=True)
+
+    wait_for_server(timeout, empty=True)
+
+    print('\tDropped and recreated the store in {0:.1f}s'.format(time.time() - start))
+
+
+def wipe(mode=None, workers=None):
+    """
+    Empties the database
+    :param mode: `delete`, to delete every node in batches, or `drop`, to run the `drop_command` option of the `wipe`
+    section in config.ini (or to empty the stand-in database of the `local` transport). Defaults to the `mode` option
+    :param workers: number of concurrent delete passes. Defaults to the `workers` option
+    :return:
+    """
+
+    if mode is None:
+        mode = config.get('wipe', 'mode', type=str, fallback='delete')
+
+    if workers is None:
+        workers = config.get('wipe', 'workers', type=int, fallback=1)
+
+    if mode == 'drop' and neo4j.get_pool().transport.name == 'local':
+        # the stand-in database is emptied in place
+        standin.get_database().drop()
+    elif mode == 'drop':
+
+        command = config.get('wipe', 'drop_command', type=str, fallback='')
+
+        if not command:
+            raise config.ConfigurationError('Dropping the store needs the `drop_command` option of the `wipe` section')
+
+        drop_store(command)
+    elif mode == 'delete':
+        delete_all(workers=workers)
+    else:
+        raise ValueError('Unknown wipe mode: {0}'.format(mode))
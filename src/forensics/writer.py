@@ -0,0 +1,497 @@
+import itertools
+import json
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from forensics import entities
+from forensics.utils import config, neo4j
+
+BATCH_SIZE = 5000
+
+# number of groups of batches buffered per worker, before the producer waits
+QUEUE_SIZE = 2
+
+# bounds of the adaptive batch size
+MIN_BATCH_SIZE = 100
+MAX_BATCH_SIZE = 100000
+
+# requests slower than this, in seconds, or larger than this, in bytes, shrink the batch size
+TARGET_LATENCY = 2.
+MAX_PAYLOAD = 16 * 2**20
+
+# batch size growth while throughput keeps improving, and the drop in throughput tolerated before backing off
+GROWTH = 1.5
+TOLERANCE = .05
+
+# number of requests sent at once, across all workers
+MAX_IN_FLIGHT = 8
+
+_sizers = {}
+_in_flight = None
+_lock = threading.Lock()
+
+
+class BatchSizer(object):
+    """
+    Number of records sent per request, for an entity type. While writing, requests that are too slow, or too large,
+    shrink the batch size; otherwise, it grows for as long as throughput keeps improving, and backs off a step once it
+    gets worse. Fixed-size sizers never change
+    """
+
+    def __init__(self, name, size=BATCH_SIZE, adaptive=True, minimum=MIN_BATCH_SIZE, maximum=MAX_BATCH_SIZE,
+                 latency=TARGET_LATENCY, payload=MAX_PAYLOAD):
+
+        self.name = name
+        self.size = size
+        self.adaptive = adaptive
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency = latency
+        self.payload = payload
+
+        self.initial = size
+        self.smallest = size
+        self.largest = size
+        self.requests = 0
+        self.elapsed = 0.
+        self.best = 0.
+
+        self._lock = threading.Lock()
+
+    def observe(self, records, elapsed, payload):
+        """
+        :param records: number of records in the request
+        :param elapsed: duration of the request, in seconds
+        :param payload: approximate size of the request, in bytes
+        :return: the next batch size
+        """
+
+        with self._lock:
+
+            self.requests += 1
+            self.elapsed += elapsed
+
+            if not self.adaptive:
+                return self.size
+
+            if elapsed > self.latency or payload > self.payload:
+                factor = min(self.latency/max(elapsed, 1e-3), self.payload/max(payload, 1), .75)
+                self.size = max(int(self.size*max(factor, .25)), self.minimum)
+                self.best = 0.
+
+            # partial batches, e.g. the end of a dataset, say little about throughput
+            elif records >= self.size // 2:
+
+                throughput = records/max(elapsed, 1e-3)
+
+                if throughput >= self.best*(1 - TOLERANCE):
+                    self.best = max(self.best, throughput)
+                    self.size = min(int(self.size*GROWTH), self.maximum)
+                else:
+                    self.size = max(int(self.size/GROWTH), self.minimum)
+                    self.best = throughput
+
+            self.smallest = min(self.smallest, self.size)
+            self.largest = max(self.largest, self.size)
+
+            return self.size
+
+    def report(self):
+
+        print('\t{0} batch size: {1} records per request ({2} adaptive, started at {3}, ranged {4}-{5}), '
+              '{6} requests, {7:.2f}ms on average'.format(
+                  self.name, self.size, 'was' if self.adaptive else 'not', self.initial, self.smallest,
+                  self.largest, self.requests, self.elapsed/max(self.requests, 1)*1000
+              ))
+
+
+def get_sizer(entity, limit=None):
+    """
+    :param entity: entity type
+    :param limit: fixed batch size. Defaults to the `batch_size` option in config.ini. Without one, the batch size
+    is adapted, and carried over between datasets of the same type
+    :return: BatchSizer
+    """
+
+    if limit is None:
+        limit = config.get('seed', 'batch_size', type=int, fallback=None)
+
+    if limit is not None:
+        return BatchSizer(entity.__name__, size=limit, adaptive=False)
+
+    with _lock:
+
+        if entity not in _sizers:
+            _sizers[entity] = BatchSizer(entity.__name__)
+
+        return _sizers[entity]
+
+
+def in_flight():
+    """
+    :return: semaphore bounding the number of requests in flight, across workers. Set by the `max_in_flight` option
+    in config.ini
+    """
+
+    global _in_flight
+
+    with _lock:
+
+        if _in_flight is None:
+            _in_flight = threading.BoundedSemaphore(
+                config.get('seed', 'max_in_flight', type=int, fallback=MAX_IN_FLIGHT)
+            )
+
+        return _in_flight
+
+
+def payload_size(query):
+    """
+    :param query: query with a `rows` list parameter, or a single record's parameters
+    :return: approximate size of the query, in bytes, extrapolated from its first row
+    """
+
+    rows = query.params.get('rows')
+
+    if rows:
+        return len(query.statement) + len(json.dumps(rows[0]))*len(rows)
+
+    return len(query.statement) + len(json.dumps(query.params))
+
+
+def batches(iterable, size):
+    """
+    Splits an iterable into lists of at most `size` elements, e.g. a list of entities into chunks
+    :param iterable:
+    :param size:
+    :return: generator of lists
+    """
+
+    iterator = iter(iterable)
+    batch = list(itertools.islice(iterator, size))
+
+    while batch:
+        yield batch
+        batch = list(itertools.islice(iterator, size))
+
+
+def rebatch(chunks, size):
+    """
+    :param chunks: iterable of batches, or lists of entities
+    :param size: maximum number of records per batch, or BatchSizer
+    :return: generator of batches of at most `size` records
+    """
+
+    for chunk in chunks:
+
+        batch = entities.as_batch(chunk)
+        limit = size.size if isinstance(size, BatchSizer) else size
+
+        if len(batch) <= limit:
+            yield batch
+            continue
+
+        start = 0
+
+        while start < len(batch):
+
+            yield batch.take(slice(start, start + limit))
+
+            start += limit
+            limit = size.size if isinstance(size, BatchSizer) else size
+
+
+def groups(chunks, sizer):
+    """
+    :param chunks: iterable of batches, or lists of entities
+    :param sizer: BatchSizer
+    :return: generator of lists of batches, each with the sizer's current batch size in records, but the last
+    """
+
+    group = []
+    c = 0
+
+    for chunk in chunks:
+
+        batch = entities.as_batch(chunk)
+        start = 0
+
+        while start < len(batch):
+
+            n = min(len(batch) - start, max(sizer.size - c, 1))
+
+            group.append(batch if n == len(batch) else batch.take(slice(start, start + n)))
+            c += n
+            start += n
+
+            if c >= sizer.size:
+                yield group
+                group = []
+                c = 0
+
+    if group:
+        yield group
+
+
+class Partition(object):
+    """
+    Bounded queue of groups of batches, consumed by a single worker.
+    Iterating over it yields groups, until the partition is closed
+    """
+
+    def __init__(self, size=QUEUE_SIZE):
+
+        self.queue = queue.Queue(maxsize=size)
+        self.exhausted = False
+
+    def put(self, group):
+        self.queue.put(group)
+
+    def close(self):
+        self.queue.put(None)
+
+    def __iter__(self):
+
+        for group in iter(self.queue.get, None):
+            yield group
+
+        self.exhausted = True
+
+    def drain(self):
+
+        if not self.exhausted:
+            for _ in self:
+                pass
+
+
+def _rows(query):
+
+    rows = query.params.get('rows')
+
+    return rows if isinstance(rows, list) else [query.params]
+
+
+def _write(groups, bulk, sizer, failed):
+    """
+    :param groups: iterable of lists of batches. Each group is committed in one request, retried if it fails with
+    a transient error, and split until the rows that fail are isolated, if it keeps failing
+    :param bulk:
+    :param sizer: BatchSizer, told how long each request took
+    :param failed: list the rows that couldn't be written are added to, with their error
+    :return: number of records written
+    """
+
+    c = 0
+    semaphore = in_flight()
+
+    for group in groups:
+
+        queries = []
+
+        for batch in group:
+
+            if bulk:
+                queries.append(batch.cypher())
+            else:
+                queries.extend(instance.cypher() for instance in batch)
+
+        payload = sum(payload_size(query) for query in queries)
+        records = sum(len(batch) for batch in group)
+
+        with semaphore:
+            start = time.time()
+            failures = neo4j.write_batch(queries)
+            sizer.observe(records, time.time() - start, payload)
+
+        for query, exc in failures:
+            rows = _rows(query)
+            failed.extend((row, exc) for row in rows)
+            records -= len(rows)
+
+        c += records
+
+    return c
+
+
+def _error(exc):
+    """
+    :return: the server's error code and message, rather than the HTTP status the client reports first
+    """
+
+    lines = [line.strip() for line in str(exc).splitlines() if line.strip()]
+
+    for i, line in enumerate(lines):
+        if line.startswith('Neo.'):
+            return ' '.join(lines[i:i + 2])
+
+    return lines[0] if lines else repr(exc)
+
+
+def report_failures(failed, limit=10):
+    """
+    :param failed: list of (row, exception) tuples
+    :param limit: number of rows to print
+    :return:
+    """
+
+    if not failed:
+        return
+
+    print('\tCould not write {0} records:'.format(len(failed)))
+
+    for row, exc in failed[:limit]:
+        print('\t\t{0}: {1}'.format(row, _error(exc)))
+
+    if len(failed) > limit:
+        print('\t\t...')
+
+
+def _write_partition(partition, bulk, sizer, failed):
+
+    try:
+        return _write(partition, bulk, sizer, failed)
+    except Exception:
+        # keep consuming, so the producer is never blocked on a failed worker
+        partition.drain()
+        raise
+
+
+def _write_parallel(chunks, bulk, sizer, workers, failed):
+
+    # every worker holds a connection until its partition is written
+    neo4j.get_pool().reserve(workers)
+
+    partitions = [Partition() for _ in range(workers)]
+    groups = [[] for _ in range(workers)]
+    counts = [0]*workers
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+
+        futures = [executor.submit(_write_partition, p, bulk, sizer, failed) for p in partitions]
+
+        try:
+            for batch in rebatch(chunks, sizer):
+
+                keys = batch.partitions(workers)
+
+                for i in range(workers):
+
+                    indices = np.flatnonzero(keys == i)
+
+                    if not len(indices):
+                        continue
+
+                    groups[i].append(batch.take(indices))
+                    counts[i] += len(indices)
+
+                    if counts[i] >= sizer.size:
+                        partitions[i].put(groups[i])
+                        groups[i] = []
+                        counts[i] = 0
+        finally:
+            for p, group in zip(partitions, groups):
+                if group:
+                    p.put(group)
+                p.close()
+
+        return sum(future.result() for future in futures)
+
+
+def write(dataset, bulk=True, limit=None, workers=1):
+    """
+    Writes a dataset of records of the same type to the database, a batch of records per request.
+    In bulk mode, each batch is sent as a single `UNWIND` statement, with the batch's rows as one list parameter.
+    Otherwise, each entity is sent as its own statement, using the entity's `cypher()`.
+
+    Unless `limit` is given, the number of records per request is tuned while writing, per entity type, from the
+    latency, size and throughput of the requests (see BatchSizer). At most `max_in_flight` requests (see config.ini)
+    are sent at once; workers wait for their turn, and the producer waits for the workers.
+
+    Each request is committed as its own transaction. Transient errors, e.g. deadlocks, are retried, and requests
+    that keep failing are split until the rows that fail are isolated; those are reported, and the rest written.
+
+    With more than one worker, records are partitioned by their partition key, i.e. the key of the node each record
+    is about, e.g. the person of a flight, and each partition is written by its own worker, so that records of the
+    same node aren't written by concurrent transactions. Other nodes that records MERGE, e.g. numbers called, or
+    cities, countries and companies, are shared across partitions: concurrent transactions can still wait on their
+    locks, and only the uniqueness constraints created by seeding keep them from creating duplicates
+    :param dataset: iterable of chunks of records: batches, e.g. CallBatch, or lists of entities, e.g. PhoneCall
+    :param bulk: use the entity type's bulk statement
+    :param limit: fixed number of records per request. Defaults to the `batch_size` option in config.ini, if any
+    :param workers: number of concurrent transactions
+    :return: number of records written, and list of (row, exception) tuples, for the rows that couldn't be written
+    """
+
+    start = time.time()*1000
+
+    # the entity type, and so the batch size, is known from the first chunk
+    chunks = iter(dataset)
+    first = next(chunks, None)
+
+    if first is None:
+        return 0, []
+
+    first = entities.as_batch(first)
+    chunks = itertools.chain([first], chunks)
+    sizer = get_sizer(first.entity, limit)
+
+    failed = []
+
+    if workers > 1:
+        c = _write_parallel(chunks, bulk, sizer, workers, failed)
+    else:
+        c = _write(groups(chunks, sizer), bulk, sizer, failed)
+
+    end = time.time()*1000
+
+    print(
+        '\tWrote {0} records in {1:.2f}ms ({2:.0f} records/s, {3} mode, {4} worker(s))'.format(
+            c, end-start, c/max(end-start, 1)*1000, 'bulk' if bulk else 'per-statement', workers
+        )
+    )
+
+    sizer.report()
+    report_failures(failed)
+
+    return c, failed
+
+
+def write_stages(stages, bulk=True, limit=None, workers=1):
+    """
+    Writes groups of datasets in order. Datasets within the same stage don't depend on each other,
+    and are written concurrently
+    :param stages: list of stages, each a list of (name, dataset) tuples, where datasets are iterables of chunks
+    :param bulk:
+    :param limit:
+    :param workers: number of concurrent transactions per dataset
+    :return: dict of the (row, exception) tuples of the rows that couldn't be written, per dataset name
+    """
+
+    failed = {}
+
+    neo4j.get_pool().reserve(max(len(stage) for stage in stages) * workers)
+
+    for stage in stages:
+
+        print('Seeding', ', '.join(name for name, _ in stage))
+
+        if len(stage) == 1:
+            name, dataset = stage[0]
+            _, failed[name] = write(dataset, bulk=bulk, limit=limit, workers=workers)
+            continue
+
+        with ThreadPoolExecutor(max_workers=len(stage)) as executor:
+
+            futures = [
+                (name, executor.submit(write, dataset, bulk=bulk, limit=limit, workers=workers))
+                for name, dataset in stage
+            ]
+
+            for name, future in futures:
+                _, failed[name] = future.result()
+
+    return failed
@@ -0,0 +1,89 @@
+"""
+Tests run on the `local` transport: queries go to the process' stand-in database (`forensics.utils.standin`), which
+each test gets empty
+"""
+
+import os.path
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from forensics.utils import cache, config, neo4j, standin  # noqa: E402
+
+CONFIG = """
+[neo4j]
+transport=local
+pool_size=4
+fetch_size=100
+
+[seed]
+workers=1
+processes=1
+manifest={path}/manifest.npz
+
+[cache]
+size=16
+path={path}/cache
+disk_size=16
+
+[wipe]
+mode=delete
+workers=1
+"""
+
+
+@pytest.fixture(autouse=True)
+def database(tmp_path, monkeypatch):
+    """
+    :return: the stand-in database queries go to, empty, with a config.ini of its own in a temporary directory
+    """
+
+    path = tmp_path / 'config.ini'
+    path.write_text(CONFIG.format(path=tmp_path))
+
+    monkeypatch.setattr(config, 'CONFIG_FILE', str(path))
+    monkeypatch.setattr(standin, '_database', None)
+    monkeypatch.setattr(cache, '_cache', None)
+
+    # retries of transient errors don't wait
+    monkeypatch.setattr(neo4j, 'backoff', lambda attempt: 0)
+
+    neo4j.use_transport('local')
+
+    return standin.get_database()
+
+
+@pytest.fixture
+def server(database):
+    """
+    :return: the stand-in database, served over HTTP
+    """
+
+    server = standin.Server(database)
+    server.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def over_http(server):
+    """
+    Sends the process' queries to the stand-in database over HTTP, rather than in process
+    :return: the server
+    """
+
+    for option, value in [('host', '127.0.0.1'), ('port', server.server_port), ('protocol', 'http'),
+                          ('endpoint', 'db/data'), ('username', 'neo4j'), ('password', 'password')]:
+        config.save('neo4j', option, value)
+
+    neo4j.use_transport('http')
+
+    yield server
+
+    # the transport's connections are closed with it
+    neo4j.use_transport('local')
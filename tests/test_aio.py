@@ -0,0 +1,70 @@
+import threading
+import time
+
+import pytest
+
+from forensics.utils import aio, cache, neo4j
+
+DEADLOCK = 'Neo.TransientError.Transaction.DeadlockDetected'
+
+
+def test_transactions_are_committed_in_order(over_http, database):
+
+    results = aio.run_transactions([
+        [neo4j.Query(cache.BUMP, {'generation': 'a'}), neo4j.Query(cache.GENERATION)],
+        [neo4j.Query(cache.GENERATION)]
+    ], concurrency=1)
+
+    assert results == [[[['a']], [['a']]], [[['a']]]]
+    assert over_http.transactions == set()
+
+
+def test_transient_errors_are_retried(over_http, database):
+
+    database.fail(DEADLOCK, times=2)
+
+    assert aio.run_transactions([[neo4j.Query(cache.BUMP, {'generation': 'a'})]]) == [[[['a']]]]
+    assert cache.generation() == 'a'
+
+
+def test_other_errors_are_raised(over_http, database):
+
+    database.fail('Neo.ClientError.Statement.SyntaxError')
+
+    with pytest.raises(neo4j.TransactionError, match='SyntaxError'):
+        aio.run_transactions([[neo4j.Query(cache.GENERATION)]])
+
+    database.fail(DEADLOCK, times=3)
+
+    with pytest.raises(neo4j.TransactionError, match='DeadlockDetected'):
+        aio.run_transactions([[neo4j.Query(cache.GENERATION)]], retries=2)
+
+
+def test_transactions_overlap_up_to_the_concurrency(over_http, database, monkeypatch):
+
+    run = database.run
+    lock = threading.Lock()
+    counts = {'running': 0, 'peak': 0}
+
+    def slow(statements):
+
+        with lock:
+            counts['running'] += 1
+            counts['peak'] = max(counts['peak'], counts['running'])
+
+        # long enough for the other requests to arrive
+        time.sleep(.05)
+
+        with lock:
+            counts['running'] -= 1
+
+        return run(statements)
+
+    monkeypatch.setattr(database, 'run', slow)
+
+    start = time.time()
+    results = aio.run_transactions([[neo4j.Query(cache.GENERATION)] for _ in range(12)], concurrency=4)
+
+    assert len(results) == 12
+    assert counts['peak'] == 4
+    assert time.time() - start < 12*.05
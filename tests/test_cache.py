@@ -0,0 +1,132 @@
+import os
+
+from forensics import patterns
+from forensics.utils import cache, neo4j
+
+QUERY = neo4j.Query(patterns.THREE, {'repNumber': '+911-123-987-468', 'weekday': 2})
+
+
+def _run(results):
+
+    return [list(record) for record in results.stream(QUERY)]
+
+
+def test_results_without_a_generation_are_not_cached():
+
+    results = cache.get_cache()
+
+    assert cache.generation() is None
+    assert results.key(QUERY) is None
+
+    _run(results)
+    _run(results)
+
+    assert (results.hits, results.stored) == (0, 0)
+
+
+def test_a_new_generation_invalidates_results():
+
+    results = cache.get_cache()
+
+    cache.bump()
+    key = results.key(QUERY)
+
+    _run(results)
+    _run(results)
+    assert (results.hits, results.misses) == (1, 1)
+
+    cache.bump()
+    assert results.key(QUERY) != key
+
+    _run(results)
+    assert (results.hits, results.misses) == (1, 2)
+
+
+def test_results_of_the_local_database_stay_in_memory():
+
+    results = cache.get_cache()
+
+    cache.bump()
+    _run(results)
+
+    assert results.stored == 1
+    assert os.listdir(results.path) == []
+
+
+def test_results_on_disk_are_reused_until_the_generation_changes(monkeypatch):
+
+    # as for a database on a server
+    monkeypatch.setattr(cache.ResultCache, '_persistent', lambda self: True)
+
+    cache.bump()
+    _run(cache.get_cache())
+
+    results = cache.ResultCache(path=cache.get_cache().path)
+    _run(results)
+    assert (results.disk_hits, results.misses) == (1, 0)
+
+    cache.bump()
+    _run(results)
+    assert (results.disk_hits, results.misses) == (1, 1)
+
+
+def _queries(n):
+
+    return [neo4j.Query(patterns.THREE, {'repNumber': '+911-123-987-468', 'weekday': i}) for i in range(n)]
+
+
+def test_results_read_in_part_are_not_cached():
+
+    results = cache.get_cache()
+
+    cache.bump()
+    cursor = results.stream(neo4j.Query(cache.GENERATION))
+    cursor.fetchone()
+
+    assert results.stored == 0
+
+    cursor.fetchall()
+    assert results.stored == 1
+
+
+def test_least_recently_used_results_are_evicted():
+
+    results = cache.ResultCache(size=2)
+    first, second, third = _queries(3)
+
+    cache.bump()
+
+    for query in [first, second, first, third]:
+        list(results.stream(query))
+
+    # the second was used less recently than the first
+    assert results.evictions == 1
+    assert results.get(results.key(first)) is not None
+    assert results.get(results.key(second)) is None
+
+
+def test_results_on_disk_are_trimmed(monkeypatch, tmp_path):
+
+    monkeypatch.setattr(cache.ResultCache, '_persistent', lambda self: True)
+
+    results = cache.ResultCache(size=1, path=str(tmp_path / 'results'), disk_size=2)
+
+    cache.bump()
+
+    for query in _queries(4):
+        list(results.stream(query))
+
+    assert len(os.listdir(results.path)) == 2
+    assert results.disk_evictions == 2
+
+
+def test_disabled_caches_run_every_query():
+
+    results = cache.get_cache()
+    results.enabled = False
+
+    cache.bump()
+    _run(results)
+    _run(results)
+
+    assert (results.hits, results.misses, results.stored) == (0, 0, 0)
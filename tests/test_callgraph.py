@@ -0,0 +1,62 @@
+import pytest
+
+from forensics import callgraph, patterns, seed
+from forensics.utils import cache
+
+
+@pytest.fixture
+def seeded(database):
+
+    seed.seed(scale=.2, rng_seed=11)
+
+    return database
+
+
+def _rows(capsys, pattern, snapshot=None):
+    """
+    :return: sorted rows the pattern printed, run on the snapshot, or on the database if not given
+    """
+
+    capsys.readouterr()
+    pattern(snapshot)
+
+    lines = capsys.readouterr().out.splitlines()
+
+    # the header is printed before the rows, and the snapshot's summary before both
+    return sorted(line for line in lines if line.startswith('\t') and 'Evaluated for' not in line)
+
+
+@pytest.mark.parametrize('pattern', [patterns.three, patterns.four, patterns.five])
+def test_snapshots_match_the_database(seeded, capsys, tmp_path, pattern):
+
+    path = str(tmp_path / 'callgraph.npz')
+    callgraph.CallGraph.export().save(path)
+
+    expected = _rows(capsys, pattern)
+
+    assert _rows(capsys, pattern, callgraph.CallGraph.open(path)) == expected
+
+    # the pattern found something, besides the header
+    assert len(expected) > 1
+
+
+def test_snapshots_of_other_datasets_are_refused(seeded, tmp_path):
+
+    path = str(tmp_path / 'callgraph.npz')
+    callgraph.CallGraph.export().save(path)
+
+    assert len(callgraph.CallGraph.open(path)) > 0
+
+    seed.seed(scale=.2, rng_seed=12)
+
+    with pytest.raises(ValueError, match='Export a new one'):
+        callgraph.CallGraph.open(path)
+
+    # any load moves the dataset on, even one of the same data
+    callgraph.CallGraph.export().save(path)
+    cache.bump()
+
+    with pytest.raises(ValueError):
+        callgraph.CallGraph.open(path)
+
+    assert len(callgraph.CallGraph.open(path, check=False)) > 0
@@ -0,0 +1,63 @@
+import json
+import os.path
+
+import numpy as np
+import pytest
+
+from forensics import columnar, seed
+
+
+def _records(data):
+
+    return dict((name, [record for batch in data[name] for record in batch.as_dicts()]) for name in columnar.DATASETS)
+
+
+@pytest.fixture
+def dump(tmp_path):
+    """
+    :return: directory of a columnar dump of a small dataset, and the dataset's records
+    """
+
+    rows = columnar.write_dataset(seed.stream_data(scale=.05, chunk_size=300, seed=11), str(tmp_path))
+
+    return str(tmp_path), rows, _records(seed.stream_data(scale=.05, chunk_size=300, seed=11))
+
+
+def test_round_trip(dump):
+
+    path, rows, records = dump
+    dataset = columnar.ColumnarDataset(path)
+
+    assert dict((name, dataset.rows(name)) for name in columnar.DATASETS) == rows
+    assert _records(dataset.data(size=128)) == records
+
+
+def test_columns_are_memory_mapped(dump):
+
+    path, rows, _ = dump
+    dataset = columnar.ColumnarDataset(path)
+
+    timestamps = dataset.column('calls', 'timestamp')
+
+    assert isinstance(timestamps, np.memmap)
+    assert len(timestamps) == rows['calls']
+
+    # a batch is a view of the mapped columns
+    assert np.shares_memory(dataset.batch('calls', 10, 20).timestamp, timestamps)
+
+
+def test_other_versions_are_refused(dump):
+
+    path, _, _ = dump
+    manifest = os.path.join(path, columnar.MANIFEST)
+
+    with open(manifest) as fp:
+        content = json.load(fp)
+
+    content['version'] = columnar.VERSION - 1
+
+    with open(manifest, 'w') as fp:
+        json.dump(content, fp)
+
+    with pytest.raises(ValueError):
+        columnar.ColumnarDataset(path)
@@ -0,0 +1,136 @@
+from forensics import delta, entities, seed
+
+
+def _people(*names):
+
+    return entities.as_batch([
+        entities.Person(id=str(i), name=name, sex='F', number='+1-{0}'.format(i)) for i, name in enumerate(names)
+    ])
+
+
+def test_select_only_returns_new_or_changed_records(tmp_path):
+
+    path = str(tmp_path / 'manifest.npz')
+
+    manifest = delta.Manifest(path)
+    assert list(manifest.select('people', _people('Ann', 'Bob', 'Cy'))) == [0, 1, 2]
+
+    # records are only in the manifest once it's saved
+    assert len(manifest) == 0
+    manifest.save()
+    assert len(manifest) == 3
+
+    manifest = delta.Manifest(path)
+    assert len(manifest) == 3
+    assert list(manifest.select('people', _people('Ann', 'Bea', 'Cy', 'Dee'))) == [1, 3]
+
+
+def test_the_latest_fingerprint_of_a_record_is_kept(tmp_path):
+
+    manifest = delta.Manifest(str(tmp_path / 'manifest.npz'))
+
+    manifest.select('people', _people('Ann'))
+    manifest.select('people', _people('Bea'))
+    manifest.save()
+
+    assert len(manifest) == 1
+    assert list(manifest.select('people', _people('Bea'))) == []
+    assert list(manifest.select('people', _people('Ann'))) == [0]
+
+
+def test_discarded_records_are_selected_again(tmp_path):
+
+    path = str(tmp_path / 'manifest.npz')
+    batch = _people('Ann', 'Bob', 'Cy')
+
+    manifest = delta.Manifest(path)
+    manifest.select('people', batch)
+    manifest.discard('people', [batch.rows()[1]])
+    manifest.save()
+
+    manifest = delta.Manifest(path)
+    assert list(manifest.select('people', batch)) == [1]
+
+
+def test_select_yields_the_selected_records(tmp_path):
+
+    manifest = delta.Manifest(str(tmp_path / 'manifest.npz'))
+    manifest.select('people', _people('Ann', 'Bob'))
+    manifest.save()
+
+    counter = delta.Counter()
+    batches = list(delta.select('people', [_people('Ann', 'Bea')], manifest, counter))
+
+    assert [person.name for batch in batches for person in batch] == ['Bea']
+    assert (counter.seen, counter.selected) == (2, 1)
+
+
+def _calls(*calls, **dictionaries):
+
+    return entities.CallBatch.from_entities([
+        entities.PhoneCall(id=id, source=source, target=target, weekday=1, hour=2, timestamp=3.5)
+        for id, source, target in calls
+    ], **dictionaries)
+
+
+def test_fingerprints_are_of_the_records_not_the_batch():
+
+    keys, values = delta.fingerprints(_people('Ann', 'Bob', 'Christopher'))
+
+    # the same records in other batches, with strings of other lengths, and other dictionaries
+    assert list(delta.fingerprints(_people('Ann', 'Bo'))[0][:1]) == list(keys[:1])
+    assert list(delta.fingerprints(_people('Ann'))[1]) == list(values[:1])
+
+    numbers = entities.Dictionary(['+9', '+2', '+1'])
+    calls = delta.fingerprints(_calls((1, '+1', '+2'), (2, '+2', '+1')))
+    shared = delta.fingerprints(_calls((1, '+1', '+2'), (2, '+2', '+1'), numbers=numbers))
+
+    assert list(calls[0]) == list(shared[0])
+    assert list(calls[1]) == list(shared[1])
+
+    # numbers of the same call the other way round, or a changed field, are other fingerprints
+    assert len(set(calls[0])) == 2
+    assert list(delta.fingerprints(_people('Anne'))[1]) != list(values[:1])
+
+
+def test_discarded_calls_are_selected_again(tmp_path):
+
+    batch = _calls((1, '+1', '+2'), (2, '+2', '+1'), (3, '+1', '+3'))
+
+    manifest = delta.Manifest(str(tmp_path / 'manifest.npz'))
+    manifest.select('calls', batch)
+    manifest.discard('calls', [batch.rows()[2]])
+    manifest.save()
+
+    assert list(manifest.select('calls', batch)) == [2]
+
+
+def test_manifests_of_other_versions_are_started_over(tmp_path, monkeypatch):
+
+    path = str(tmp_path / 'manifest.npz')
+
+    manifest = delta.Manifest(path)
+    manifest.select('people', _people('Ann'))
+    manifest.save()
+
+    monkeypatch.setattr(delta, 'VERSION', delta.VERSION + 1)
+
+    assert len(delta.Manifest(path)) == 0
+
+
+def test_full_seeds_only_keep_a_manifest_if_asked(tmp_path):
+
+    path = tmp_path / 'manifest.npz'
+
+    seed.seed(scale=.05, rng_seed=3)
+    assert not path.exists()
+
+    seed.seed(scale=.05, rng_seed=3, keep_manifest=True)
+    assert len(delta.Manifest(str(path))) > 0
+
+    # with a manifest already, full seeds keep it up to date
+    seed.seed(scale=.05, rng_seed=4)
+    assert len(delta.Manifest(str(path))) > 0
+
+    seed.seed(scale=.05, rng_seed=4, keep_manifest=False)
+    assert not path.exists()
@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+
+from forensics import generator, seed
+
+
+def test_flight_numbers_are_unique():
+
+    numbers = generator.flight_numbers(np.arange(0, 10**5), offset=123)
+
+    assert len(set(numbers)) == 10**5
+    assert all(len(number) == 11 for number in numbers[:100])
+
+    with pytest.raises(ValueError):
+        generator.flight_numbers([generator.FLIGHT_NUMBERS])
+
+
+def test_flight_numbers_are_unique_across_shards():
+
+    data = seed.stream_data(scale=.5, chunk_size=700, seed=7)
+    numbers = [number for batch in data['flights'] for number in batch.number]
+
+    assert len(numbers) > 5000
+    assert len(set(numbers)) == len(numbers)
@@ -0,0 +1,51 @@
+import io
+import json
+
+import pytest
+
+from forensics import loader, seed
+from forensics.entities import Person, PersonBatch
+
+RECORDS = [
+    {'id': '1', 'name': 'Ann {the} "first"', 'sex': 'F', 'number': '+1-1'},
+    {'id': '2', 'name': 'Bob \\ }{ \\"', 'sex': 'M', 'number': '+1-2'},
+    {'id': '3', 'name': 'Cy', 'sex': 'M', 'number': '+1-3'}
+]
+
+
+def _dumps():
+
+    dumped = io.StringIO()
+    seed.dump_json(dumped, [PersonBatch.from_entities([Person(**record) for record in RECORDS])])
+
+    return [
+        json.dumps(RECORDS),
+        json.dumps(RECORDS, indent=4),
+        json.dumps(RECORDS, separators=(',', ':')),
+        dumped.getvalue()
+    ]
+
+
+@pytest.mark.parametrize('block_size', [1, 3, 7, 4096])
+def test_json_arrays_of_any_layout_are_split_into_records(block_size):
+
+    for text in _dumps():
+
+        records = list(loader.json_records(io.StringIO(text), block_size=block_size))
+
+        assert [json.loads(record) for record in records] == RECORDS
+
+
+def test_parsed_records():
+
+    batch = loader.parse('people', list(loader.json_records(io.StringIO(json.dumps(RECORDS, indent=2)))))
+
+    assert batch.as_dicts() == RECORDS
+
+
+def test_truncated_arrays_are_refused():
+
+    with pytest.raises(ValueError):
+        list(loader.json_records(io.StringIO(json.dumps(RECORDS, indent=2)[:-20]), block_size=5))
+
+    assert list(loader.json_records(io.StringIO('[]'))) == []
@@ -0,0 +1,61 @@
+import collections
+
+import pytest
+
+from forensics import patterns, seed
+from forensics.utils import standin
+
+
+def _graph(database):
+    """
+    :return: the nodes, and relationships, of the database, by their labels, types, keys and properties. The
+    generation of the dataset is left out: each load has its own
+    """
+
+    nodes = set()
+    relationships = collections.Counter()
+
+    def key(node):
+        return node.label, node.props[standin.KEYS[node.label]]
+
+    for label, by_key in database.graph.nodes.items():
+
+        if label == 'Dataset':
+            continue
+
+        for node in by_key.values():
+
+            nodes.add((key(node), tuple(sorted(node.props.items()))))
+
+            for type, outgoing in node.outgoing.items():
+                for relationship in outgoing.values():
+                    props = tuple(sorted(relationship.props.items()))
+                    relationships[(type, key(node), key(relationship.end), props)] += 1
+
+    return nodes, relationships
+
+
+def test_memory_graphs_match_seeded_ones(database):
+
+    seed.seed(scale=.1, rng_seed=5)
+    seeded = _graph(database)
+
+    seed.seed_memory(scale=.1, rng_seed=5)
+
+    assert len(seeded[0]) > 0
+    assert _graph(database) == seeded
+
+
+@pytest.mark.parametrize('pattern', [patterns.one, patterns.two, patterns.three, patterns.four, patterns.five])
+def test_patterns_match_on_memory_graphs(database, capsys, pattern):
+
+    seed.seed(scale=.2, rng_seed=11)
+    capsys.readouterr()
+    pattern()
+    seeded = [line for line in capsys.readouterr().out.splitlines() if line.startswith('\t')]
+
+    seed.seed_memory(scale=.2, rng_seed=11)
+    capsys.readouterr()
+    pattern()
+
+    assert [line for line in capsys.readouterr().out.splitlines() if line.startswith('\t')] == seeded
@@ -0,0 +1,163 @@
+import datetime
+import json
+import time
+
+import numpy as np
+import pytest
+
+from forensics.utils import results
+
+ROWS = [['Zoë', 1, {'city': 'São Paulo'}], ['"]}', 2.5, None], ['中文', -3, []]]
+
+
+def _response(rows, errors=()):
+
+    return json.dumps({
+        'results': [{'columns': ['name', 'count', 'data'], 'data': [{'row': row, 'rest': row} for row in rows]}],
+        'errors': list(errors)
+    }, ensure_ascii=False).encode('utf-8')
+
+
+def _parse(data, size):
+    """
+    :return: rows, and errors, of the response, fed `size` bytes at a time
+    """
+
+    parser = results.RowParser()
+    rows = []
+
+    for i in range(0, len(data), size):
+        rows.extend(parser.feed(data[i:i + size]))
+
+    return parser, rows, parser.close()
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 5, 16, 10**6])
+def test_rows_split_across_chunks_are_parsed(size):
+
+    # chunks end within records, strings, and the bytes of multi-byte characters
+    parser, rows, errors = _parse(_response(ROWS), size)
+
+    assert parser.columns == ['name', 'count', 'data']
+    assert rows == ROWS
+    assert errors == []
+
+
+def test_rows_are_parsed_as_they_arrive():
+
+    data = _response(ROWS)
+    end = data.index(b'"rest"', data.index(b'S\xc3\xa3o'))
+
+    parser = results.RowParser()
+
+    # the first record is whole before the second begins
+    assert parser.feed(data[:end]) == []
+    assert parser.feed(data[end:data.index(b'{"row"', end)]) == ROWS[:1]
+    assert parser.feed(data[data.index(b'{"row"', end):]) == ROWS[1:]
+
+
+@pytest.mark.parametrize('size', [1, 7, 10**6])
+def test_errors_are_read_on_close(size):
+
+    error = {'code': 'Neo.ClientError.Statement.SyntaxError', 'message': 'Invalid input'}
+
+    _, rows, errors = _parse(_response(ROWS[:1], [error]), size)
+
+    assert rows == ROWS[:1]
+    assert errors == [error]
+
+    # a statement that failed before returning results
+    _, rows, errors = _parse(json.dumps({'results': [], 'errors': [error]}).encode('utf-8'), size)
+
+    assert rows == []
+    assert errors == [error]
+
+
+def test_cursors_read_records_as_they_are_consumed():
+
+    read = []
+
+    def records():
+        for i in range(10):
+            read.append(i)
+            yield [i, 'n{0}'.format(i)]
+
+    closed = []
+    cursor = results.Cursor(records(), fetch_size=4, columns=['id', 'count(*)'], close=lambda: closed.append(True))
+
+    record = cursor.fetchone()
+
+    assert (record.id, record._1) == (0, 'n0')
+    assert read == [0]
+
+    assert [r.id for r in cursor.fetchmany()] == [1, 2, 3, 4]
+    assert [r.id for r in cursor.fetchmany(2)] == [5, 6]
+    assert read == list(range(7))
+    assert cursor.count == 7
+
+    cursor.close()
+
+    assert closed == [True]
+    assert cursor.fetchall() == []
+    assert cursor.fetchone() is None
+
+
+@pytest.fixture
+def timezone(monkeypatch):
+    """
+    Local time of a zone with daylight saving time
+    """
+
+    monkeypatch.setenv('TZ', 'Europe/Lisbon')
+    monkeypatch.setattr(results, '_offsets', {})
+    time.tzset()
+
+    yield
+
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_timestamps_are_decoded_to_local_times(timezone):
+
+    # around the switch to summer time, and back, and before the epoch
+    timestamps = [1396141199.5, 1396141200., 1414285200., 1414288800., 1414292400., -86400.25, 0.]
+
+    columns = results.decode(['id', 'timestamp'], [[i, t] for i, t in enumerate(timestamps)], {
+        'id': np.int32, 'timestamp': results.TIMESTAMP
+    })
+
+    assert columns['id'].dtype == np.int32
+    assert columns['timestamp'].dtype == np.dtype('datetime64[s]')
+    assert columns['timestamp'].tolist() == [datetime.datetime.fromtimestamp(t).replace(microsecond=0)
+                                             for t in timestamps]
+    assert columns.dates('timestamp')[:2] == ['2014-03-30', '2014-03-30']
+
+
+def test_columns_are_taken_and_read_back():
+
+    rows = [[1, 'a', 2.5], [2, 'b', None], [3, 'c', .5]]
+    columns = results.decode(['id', 'name', 'score'], rows)
+
+    assert len(columns) == 3
+    assert columns.keys() == ['id', 'name', 'score']
+    assert 'name' in columns and 'other' not in columns
+    assert list(columns.rows()) == rows
+
+    taken = columns.take(columns['id'] != 2)
+
+    assert list(taken.rows()) == [rows[0], rows[2]]
+    assert len(results.decode(['id', 'timestamp'], [], {'timestamp': results.TIMESTAMP})) == 0
+
+
+def test_cursors_fetch_columns():
+
+    cursor = results.Cursor(iter([[i, 1e9 + i] for i in range(5)]), columns=['id', 'timestamp'],
+                            types={'timestamp': results.TIMESTAMP})
+
+    first = cursor.fetch_columns(3)
+
+    assert first['id'].tolist() == [0, 1, 2]
+    assert first['timestamp'].dtype == np.dtype('datetime64[s]')
+    assert len(cursor.fetch_columns()) == 2
+    assert cursor.count == 5
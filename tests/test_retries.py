@@ -0,0 +1,141 @@
+import pytest
+
+from forensics import entities, writer
+from forensics.utils import cache, neo4j, standin
+
+DEADLOCK = 'Neo.TransientError.Transaction.DeadlockDetected'
+
+# the tests' database fixture doesn't wait between retries
+BACKOFF = neo4j.backoff
+
+ROWS = neo4j.statement('tests.rows.bulk', [
+    'UNWIND {{rows}} AS row',
+    'MERGE (:`Test` {{id: row.id}})'
+])
+
+
+def test_transient_errors_are_told_apart():
+
+    assert neo4j.is_transient(neo4j.TransactionError('{0}: Deadlock'.format(DEADLOCK)))
+    assert not neo4j.is_transient(neo4j.TransactionError('Neo.ClientError.Statement.SyntaxError: Invalid input'))
+
+
+def test_backoff_is_jittered_up_to_an_exponential_bound():
+
+    waits = [[BACKOFF(attempt, base=.1, cap=1.) for _ in range(200)] for attempt in range(6)]
+
+    for attempt, w in enumerate(waits):
+        assert 0 <= min(w) and max(w) <= min(1., .1*2**attempt)
+
+    # not in lockstep
+    assert len(set(waits[0])) > 1
+    assert max(waits[5]) > .5
+
+
+def test_transient_error_replays_the_transaction(database):
+
+    with neo4j.BatchTransaction() as tx:
+
+        tx.append(neo4j.Query(cache.BUMP, {'generation': 'a'}))
+        assert tx.execute() == [[['a']]]
+
+        database.fail(DEADLOCK)
+
+        # the new transaction replays the statement executed before the failure, and only returns the pending one's rows
+        tx.append(neo4j.Query(cache.GENERATION))
+        assert tx.execute() == [[['a']]]
+
+    assert database.statements == 4
+    assert cache.generation() == 'a'
+
+
+def test_other_errors_are_not_retried(database):
+
+    database.fail('Neo.ClientError.Statement.SyntaxError')
+
+    with pytest.raises(neo4j.TransactionError):
+        with neo4j.BatchTransaction() as tx:
+            tx.append(neo4j.Query(cache.GENERATION))
+
+    assert database.statements == 1
+
+
+def test_transient_errors_are_retried_up_to_retries(database):
+
+    database.fail(DEADLOCK, times=3)
+
+    with pytest.raises(neo4j.TransactionError):
+        with neo4j.BatchTransaction(retries=2) as tx:
+            tx.append(neo4j.Query(cache.GENERATION))
+
+    assert database.statements == 3
+
+
+def _rows(database, bad):
+    """
+    Handles `tests.rows`, failing the rows whose id is in `bad`
+    :return: set of the ids of the rows written
+    """
+
+    written = set()
+
+    def handler(row):
+
+        if row['id'] in bad:
+            raise standin.StatementError('Neo.ClientError.Schema.ConstraintValidationFailed', 'Bad row')
+
+        written.add(row['id'])
+
+        return []
+
+    database.handlers['tests.rows'] = handler
+
+    return written
+
+
+def test_write_batch_bisects_to_the_rows_that_fail(database):
+
+    written = _rows(database, bad={3, 7})
+    queries = [
+        neo4j.Query(ROWS, {'rows': [{'id': i} for i in range(0, 5)]}),
+        neo4j.Query(ROWS, {'rows': [{'id': i} for i in range(5, 10)]})
+    ]
+
+    failed = neo4j.write_batch(queries, retries=0)
+
+    assert sorted(query.params['rows'][0]['id'] for query, _ in failed) == [3, 7]
+    assert all(len(query.params['rows']) == 1 for query, _ in failed)
+    assert written == {0, 1, 2, 4, 5, 6, 8, 9}
+
+
+def test_write_batch_retries_transient_errors_whole(database):
+
+    written = _rows(database, bad=set())
+    database.fail(DEADLOCK)
+
+    assert neo4j.write_batch([neo4j.Query(ROWS, {'rows': [{'id': i} for i in range(0, 4)]})]) == []
+    assert written == {0, 1, 2, 3}
+    assert database.statements == 2
+
+
+def test_writers_report_the_rows_they_could_not_write(database):
+
+    calls = [
+        entities.PhoneCall(id=i, source='+1', target='+2', weekday=1, hour=2, timestamp=3.) for i in range(20)
+    ]
+    handler = database.handlers['phone_call']
+
+    def phone_call(row):
+
+        if row['callId'] == 13:
+            raise standin.StatementError('Neo.ClientError.Schema.ConstraintValidationFailed', 'Bad row')
+
+        return handler(row)
+
+    database.handlers['phone_call'] = phone_call
+
+    written, failed = writer.write([calls], limit=8)
+
+    assert written == 19
+    assert [row['callId'] for row, _ in failed] == [13]
+    assert database.graph.count('PhoneNumber') == 2
@@ -0,0 +1,178 @@
+import bisect
+import calendar
+import collections
+import datetime
+import time
+
+from forensics import entities, patterns, rollups, seed, writer
+from forensics.utils import aio, periods
+
+
+def _flights(database):
+    """
+    :return: Counter of the flights of each person, to each country, per month, counted from the flights themselves
+    """
+
+    boundaries = rollups.boundaries()
+    counts = collections.Counter()
+
+    for id, person in database.graph.label('Person').items():
+        for took in person.outgoing['TOOK'].values():
+            for to in took.end.outgoing['TO'].values():
+                for located in to.end.outgoing['IN'].values():
+
+                    month = boundaries[bisect.bisect_right(boundaries, took.end.props['timestamp']) - 1]
+                    counts[(id, located.end.props['name'], month)] += 1
+
+    return counts
+
+
+def _rollups(database):
+
+    counts = collections.Counter()
+
+    for id, person in database.graph.label('Person').items():
+        for rollup in person.outgoing['FLEW_TO'].values():
+            counts[(id, rollup.end.props['name'], rollup.props['month'])] += rollup.props['flights']
+
+    return counts
+
+
+def test_rollups_match_the_flights(database):
+
+    seed.seed(scale=.1, rng_seed=7)
+
+    expected = _flights(database)
+
+    assert sum(expected.values()) > 0
+    assert _rollups(database) == expected
+
+    # an incremental load only rebuilds the rollups of the people it could have changed
+    seed.seed(scale=.05, rng_seed=8, incremental=True)
+
+    assert _rollups(database) == _flights(database)
+
+
+def test_missing_rollups_are_built(database):
+
+    seed.seed(scale=.1, rng_seed=7)
+
+    expected = _rollups(database)
+
+    for person in database.graph.label('Person').values():
+        for rollup in list(person.outgoing['FLEW_TO'].values()):
+            database.graph.remove(rollup)
+
+    assert rollups.ensure() > 0
+    assert _rollups(database) == expected
+    assert rollups.ensure() == 0
+
+
+def test_rollups_are_rebuilt_concurrently_over_http(database, request, monkeypatch):
+
+    seed.seed(scale=.1, rng_seed=7)
+
+    expected = _rollups(database)
+
+    for person in database.graph.label('Person').values():
+        for rollup in list(person.outgoing['FLEW_TO'].values()):
+            database.graph.remove(rollup)
+
+    request.getfixturevalue('over_http')
+
+    run_transactions = aio.run_transactions
+    calls = []
+
+    def spy(transactions, concurrency):
+        calls.append((len(transactions), concurrency))
+        return run_transactions(transactions, concurrency=concurrency)
+
+    monkeypatch.setattr(aio, 'run_transactions', spy)
+
+    # everyone that took a flight, in batches of 10
+    people = len(set(id for id, _, _ in expected))
+
+    assert people > 10
+    assert rollups.refresh(batch_size=10, concurrency=3) == people
+    assert calls == [((people + 9) // 10, 3)]
+    assert _rollups(database) == expected
+
+
+def _location(flight, type):
+
+    city = list(flight.outgoing[type].values())[0].end
+    country = list(city.outgoing['IN'].values())[0].end
+
+    return {'city': city.props['name'], 'country': country.props['name']}
+
+
+def test_rollups_of_people_a_flight_was_taken_from_are_rebuilt(database):
+
+    seed.seed(scale=.1, rng_seed=7)
+
+    people = sorted(database.graph.label('Person'))
+    flights = []
+
+    # flights taken by someone else, as an incremental load would change them
+    for number, flight in sorted(database.graph.label('Flight').items())[:20]:
+
+        took = list(flight.incoming['TOOK'].values())[0]
+
+        flights.append(entities.Flight(
+            number=number,
+            timestamp=flight.props['timestamp'],
+            departure=_location(flight, 'FROM'),
+            destination=_location(flight, 'TO'),
+            person=people[(people.index(took.start.props['id']) + 1) % len(people)]
+        ))
+
+    tracker = rollups.Tracker()
+    statements = database.statements
+
+    # the tracker reads the batches' columns, without querying the database
+    batches = list(tracker.track([flights]))
+
+    assert database.statements == statements
+    assert len(tracker) == 20
+
+    writer.write(batches)
+
+    assert any(person.props.get('staleRollups') for person in database.graph.label('Person').values())
+
+    rollups.refresh(rollups.affected(tracker))
+
+    assert _rollups(database) == _flights(database)
+    assert not any(person.props.get('staleRollups') for person in database.graph.label('Person').values())
+
+
+def test_rollups_of_local_months_are_rebuilt(database):
+
+    seed.seed(scale=.1, rng_seed=7)
+
+    expected = _rollups(database)
+
+    # as built in a time zone an hour behind UTC
+    for person in database.graph.label('Person').values():
+        for rollup in person.outgoing['FLEW_TO'].values():
+            rollup.props['month'] += 3600
+
+    assert rollups.ensure() > 0
+    assert _rollups(database) == expected
+    assert rollups.ensure() == 0
+
+
+def test_months_are_in_utc(monkeypatch):
+
+    monkeypatch.setenv('TZ', 'America/New_York')
+    time.tzset()
+
+    try:
+        boundaries = periods.months(datetime.datetime(2014, 11, 15), datetime.datetime(2015, 1, 31))
+        start, end, _ = next(patterns.by_period(iter(()), boundaries))
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+
+    assert boundaries == [calendar.timegm((year, month, 1, 0, 0, 0)) for year, month in
+                          [(2014, 11), (2014, 12), (2015, 1), (2015, 2)]]
+    assert (start.isoformat(), end.isoformat()) == ('2014-11-01T00:00:00+00:00', '2014-12-01T00:00:00+00:00')
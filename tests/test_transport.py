@@ -0,0 +1,146 @@
+import pytest
+
+from forensics.utils import cache, neo4j, transport
+
+UNKNOWN = 'MATCH (n :`Unknown`) RETURN n'
+
+
+@pytest.fixture
+def local():
+    """
+    :return: connection of the local transport
+    """
+
+    return transport.get_transport({'transport': 'local'}).connect()
+
+
+@pytest.fixture
+def http(server, monkeypatch):
+    """
+    :return: connection of the http transport, to the stand-in server
+    """
+
+    # responses are read a few bytes at a time, so rows and errors are split across chunks
+    monkeypatch.setattr(transport, 'CHUNK_SIZE', 7)
+
+    http = transport.get_transport({
+        'transport': 'http',
+        'protocol': 'http',
+        'host': '127.0.0.1',
+        'port': str(server.server_port),
+        'endpoint': 'db/data',
+        'username': 'neo4j',
+        'password': 'password'
+    })
+
+    yield http.connect()
+
+    http.close()
+
+
+def test_unknown_transports_are_refused():
+
+    with pytest.raises(ValueError):
+        transport.get_transport({'transport': 'pigeon'})
+
+    with pytest.raises(ValueError):
+        neo4j.use_transport('pigeon')
+
+
+def test_every_statement_has_a_handler(database):
+
+    for name, text in neo4j.STATEMENTS.items():
+        if not name.startswith('tests.'):
+            assert database._handler(text) is not None, name
+
+
+def test_local_transactions_return_the_rows_of_each_statement(local):
+
+    tx = local.transaction()
+    tx.append(cache.BUMP, {'generation': 'a'})
+    tx.append(cache.GENERATION, None)
+
+    assert tx.execute() == [[['a']], [['a']]]
+
+    columns, rows = tx.stream(cache.GENERATION, {})
+    assert (columns, list(rows)) == (['generation'], [['a']])
+
+    tx.append(cache.BUMP, {'generation': 'b'})
+    tx.rollback()
+    assert tx.commit() == []
+    assert cache.generation() == 'a'
+
+
+def test_local_errors_are_transaction_errors(local, database):
+
+    tx = local.transaction()
+    tx.append(UNKNOWN, {})
+
+    with pytest.raises(neo4j.TransactionError, match='Neo.ClientError.Statement.SyntaxError'):
+        tx.execute()
+
+    database.fail('Neo.TransientError.Transaction.DeadlockDetected')
+    tx.append(cache.GENERATION, {})
+
+    with pytest.raises(neo4j.TransactionError) as exc:
+        tx.execute()
+
+    assert neo4j.is_transient(exc.value)
+
+
+def test_http_streams_in_the_transaction(http, database):
+
+    tx = http.transaction()
+    tx.append(cache.BUMP, {'generation': 'a'})
+
+    # the streamed statement runs in the transaction opened by the appended one
+    columns, rows = tx.stream(cache.GENERATION, {})
+
+    assert columns == ['generation']
+    assert list(rows) == [['a']]
+
+    tx.append(cache.GENERATION, {})
+    assert tx.commit() == [[['a']]]
+    assert tx.url is None
+
+
+def test_http_streams_errors(http):
+
+    tx = http.transaction()
+    tx.execute()
+
+    with pytest.raises(neo4j.TransactionError, match='Neo.ClientError.Statement.SyntaxError'):
+        tx.stream(UNKNOWN, {})
+
+    # the server rolled the transaction back
+    assert tx.url is None
+
+
+def test_http_streams_rows_split_across_chunks(http, database):
+
+    for i in range(0, 50):
+        database.graph.merge_relationship(
+            'TOOK', database.graph.merge_node('Person', str(i)), database.graph.merge_node('Flight', 'F{0}'.format(i))
+        )
+
+    tx = http.transaction()
+    columns, rows = tx.stream(neo4j.STATEMENTS['rollups.people'], {})
+
+    assert columns == ['id']
+    assert sorted(row[0] for row in rows) == sorted(str(i) for i in range(0, 50))
+
+    tx.commit()
+
+
+def test_http_rollback_ends_the_transaction(http, server):
+
+    tx = http.transaction()
+    tx.append(cache.BUMP, {'generation': 'a'})
+    tx.execute()
+
+    assert len(server.transactions) == 1
+
+    tx.rollback()
+
+    assert tx.url is None
+    assert server.transactions == set()
@@ -0,0 +1,94 @@
+import pytest
+
+from forensics import seed, wipe
+from forensics.utils import neo4j
+
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_delete_all_empties_the_database(database, workers):
+
+    seed.seed(scale=.05, rng_seed=3)
+
+    nodes = database.graph.count()
+
+    assert nodes > 0
+    assert wipe.delete_all(workers=workers) == nodes
+    assert database.graph.count() == 0
+
+
+def test_deletes_are_batched(database, monkeypatch):
+
+    seed.seed(scale=.05, rng_seed=3)
+
+    nodes = database.graph.count()
+    statements = database.statements
+
+    batch_size = wipe.BatchSize
+    monkeypatch.setattr(wipe, 'BatchSize', lambda: batch_size(size=50, minimum=50, maximum=50))
+
+    assert wipe.delete_all() == nodes
+    assert database.graph.count() == 0
+
+    # a count, then one delete per batch, and the last one finds fewer nodes than the batch size
+    assert database.statements - statements == 1 + nodes // 50 + 1
+
+
+class BatchSize(wipe.BatchSize):
+
+    def __init__(self, *args, **kwargs):
+
+        super(BatchSize, self).__init__(*args, **kwargs)
+        self.sizes = [self.size]
+
+    def shrink(self):
+
+        self.sizes.append(super(BatchSize, self).shrink())
+
+        return self.size
+
+
+def test_transient_errors_are_retried_with_smaller_batches(database):
+
+    seed.seed(scale=.05, rng_seed=3)
+
+    nodes = database.graph.count()
+
+    database.fail('Neo.TransientError.Transaction.DeadlockDetected', times=2)
+
+    batch_size = BatchSize(size=1000, minimum=300)
+
+    assert wipe.delete(batch_size=batch_size) == nodes
+    assert database.graph.count() == 0
+    assert batch_size.sizes == [1000, 500, 300]
+
+
+def test_other_errors_are_raised(database):
+
+    database.fail('Neo.ClientError.Statement.SyntaxError')
+
+    with pytest.raises(neo4j.TransactionError):
+        wipe.delete()
+
+
+def test_persistent_transient_errors_are_raised(database):
+
+    database.fail('Neo.TransientError.Transaction.DeadlockDetected', times=wipe.RETRIES + 1)
+
+    with pytest.raises(neo4j.TransactionError):
+        wipe.delete()
+
+
+def test_wipe_drops_the_stand_in(database):
+
+    seed.seed(scale=.05, rng_seed=3)
+
+    wipe.wipe(mode='drop')
+
+    assert database.graph.count() == 0
+    assert wipe.count() == 0
+
+
+def test_unknown_modes_are_refused():
+
+    with pytest.raises(ValueError):
+        wipe.wipe(mode='truncate')
@@ -0,0 +1,158 @@
+import collections
+
+import pytest
+
+from forensics import entities, writer
+
+
+@pytest.fixture(autouse=True)
+def sizers(monkeypatch):
+
+    # batch sizes adapted by a test aren't carried over to the next
+    monkeypatch.setattr(writer, '_sizers', {})
+
+
+def _calls(n, numbers=20):
+
+    return entities.as_batch([
+        entities.PhoneCall(
+            id=i, source='+1-{0}'.format(i % numbers), target='+2-{0}'.format(i % 7), weekday=i % 7, hour=i % 24,
+            timestamp=1400000000 + i
+        ) for i in range(0, n)
+    ])
+
+
+def _calls_in(database):
+
+    return sorted(
+        relationship.props['id'] for number in database.graph.label('PhoneNumber').values()
+        for relationship in number.outgoing['CONTACTED'].values()
+    )
+
+
+def test_partitions_are_written_by_one_worker_each(database, monkeypatch):
+
+    workers = collections.defaultdict(set)
+    write = writer._write
+
+    def recording(groups, bulk, sizer, failed):
+
+        def recorded():
+            for group in groups:
+                for batch in group:
+                    for row in batch.rows():
+                        workers[row['number1']].add(id(groups))
+                yield group
+
+        return write(recorded(), bulk, sizer, failed)
+
+    monkeypatch.setattr(writer, '_write', recording)
+
+    batch = _calls(1000)
+    c, failed = writer.write([batch], limit=50, workers=4)
+
+    assert (c, failed) == (1000, [])
+    assert _calls_in(database) == list(range(0, 1000))
+
+    # records of the same number go to the same worker, whichever batch they're in
+    assert all(len(partition) == 1 for partition in workers.values())
+
+    by_partition = collections.defaultdict(set)
+
+    for number, partition in workers.items():
+        by_partition[entities.partition(number, 4)].update(partition)
+
+    assert all(len(partition) == 1 for partition in by_partition.values())
+
+
+def test_parallel_writes_match_a_single_writer(database):
+
+    writer.write([_calls(500)], limit=40, workers=1)
+    single = _calls_in(database)
+
+    database.drop()
+
+    writer.write([_calls(250), _calls(500).take(slice(250, 500))], limit=40, workers=3)
+
+    assert _calls_in(database) == single
+
+
+def test_stages_are_written_in_order(database):
+
+    people = entities.as_batch([
+        entities.Person(id=str(i), name='P', sex='F', number='+1-{0}'.format(i)) for i in range(0, 5)
+    ])
+
+    failed = writer.write_stages([[('people', [people])], [('calls', [_calls(100)]), ('repeated calls', [_calls(10)])]])
+
+    assert failed == {'people': [], 'calls': [], 'repeated calls': []}
+    assert all(number in database.graph.label('PhoneNumber') for number in people.number)
+    assert len(database.graph.label('Person')) == 5
+    assert _calls_in(database) == list(range(0, 100))
+
+
+def test_batch_sizes_grow_while_throughput_improves():
+
+    sizer = writer.BatchSizer('Test', size=1000, maximum=3000)
+
+    # requests of the same duration, whatever their size, are faster per record as batches grow
+    sizes = [sizer.observe(sizer.size, .1, 1000) for _ in range(5)]
+
+    assert sizes == [1500, 2250, 3000, 3000, 3000]
+    assert (sizer.smallest, sizer.largest, sizer.requests) == (1000, 3000, 5)
+
+
+def test_batch_sizes_back_off_once_throughput_drops():
+
+    sizer = writer.BatchSizer('Test', size=1000)
+
+    sizer.observe(1000, .1, 1000)
+
+    # a drop within the tolerance still grows the batch
+    assert sizer.observe(1500, .15/(1 - writer.TOLERANCE/2), 1000) == 2250
+    assert sizer.observe(2250, 1., 1000) == 1500
+
+
+def test_slow_or_large_requests_shrink_batches():
+
+    sizer = writer.BatchSizer('Test', size=1000, minimum=100, latency=1., payload=10**6)
+
+    assert sizer.observe(1000, 2., 1000) == 500
+    assert sizer.observe(500, .1, 4*10**6) == 125
+
+    # by at most three quarters at a time, and not below the minimum
+    assert sizer.observe(125, 100., 1000) == 100
+    assert sizer.smallest == 100
+
+
+def test_partial_batches_leave_the_batch_size():
+
+    sizer = writer.BatchSizer('Test', size=1000)
+
+    assert sizer.observe(10, .1, 1000) == 1000
+    assert sizer.best == 0.
+
+
+def test_fixed_batch_sizes_never_change():
+
+    sizer = writer.get_sizer(entities.PhoneCall, limit=700)
+
+    assert sizer.observe(700, 100., 10**9) == 700
+    assert sizer.observe(700, .001, 1) == 700
+    assert (sizer.smallest, sizer.largest, sizer.requests) == (700, 700, 2)
+
+    # and aren't carried over between datasets, unlike adaptive ones
+    assert writer.get_sizer(entities.PhoneCall, limit=700) is not sizer
+    assert writer.get_sizer(entities.PhoneCall) is writer.get_sizer(entities.PhoneCall)
+
+
+def test_written_batches_follow_the_batch_size():
+
+    sizer = writer.get_sizer(entities.PhoneCall)
+    sizer.size = 7
+    sizer.adaptive = False
+
+    batch = _calls(50)
+    groups = list(writer.groups([batch.take(slice(0, 20)), batch.take(slice(20, 50))], sizer))
+
+    assert [sum(len(b) for b in group) for group in groups] == [7]*7 + [1]